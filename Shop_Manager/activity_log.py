@@ -0,0 +1,205 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import db
+
+# ------------------ ACTIVITY LOG WRITER ------------------
+# log() only appends the event (stamped with the time it happened) to an
+# in-memory queue. A background thread writes queued events in batches, one
+# executemany and one commit per FLUSH_ROWS events or FLUSH_SECONDS,
+# whichever comes first, and drains the queue at exit. Mutating requests
+# therefore no longer pay for a second write transaction. record() is the
+# in-transaction alternative: the event is written by the caller's own
+# transaction and commits or rolls back with it.
+# SHOP_ACTIVITY_LOG=sync restores the old behaviour: one commit per event.
+# Until configure() is called (a script that never ran create_app), events
+# are written at once through a plain connection to app.DB_PATH.
+MODE = os.environ.get('SHOP_ACTIVITY_LOG', 'async')
+FLUSH_ROWS = int(os.environ.get('SHOP_ACTIVITY_FLUSH_ROWS', '200'))
+FLUSH_SECONDS = float(os.environ.get('SHOP_ACTIVITY_FLUSH_SECONDS', '0.5'))
+RETRY_DELAY = 0.2  # seconds before retrying a batch that hit a locked database
+
+INSERT_SQL = "INSERT INTO activities (action, details, date) VALUES (?, ?, ?)"
+
+_queue = queue.Queue()
+_connect = None
+_writer = None
+_writer_pid = None
+_lock = threading.Lock()
+_stop = threading.Event()
+_metrics = {'logged': 0, 'written': 0, 'batches': 0, 'errors': 0, 'max_queue_depth': 0,
+            'last_batch_rows': 0, 'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def configure(connect):
+    """
+    `connect()` returns a connection of the log's own whose close() releases
+    it, never the request's (app.get_connection with request_scoped=False).
+    """
+    global _connect
+    _connect = connect
+
+
+def _connection():
+    if _connect is not None:
+        return _connect()
+    import app  # not at the top: app imports this module
+    return sqlite3.connect(app.DB_PATH, timeout=db.BUSY_TIMEOUT)
+
+
+def record(conn, action, details):
+    """Write the event inside the caller's open transaction (the caller commits)."""
+    conn.execute(INSERT_SQL, (action, details, _now()))
+
+
+def record_many(conn, events):
+    """record() for a batch of (action, details) events: one executemany, same timestamp."""
+    now = _now()
+    conn.executemany(INSERT_SQL, [(action, details, now) for action, details in events])
+
+
+def write_now(action, details):
+    """Write one event in its own transaction (the pre-queue behaviour)."""
+    conn = _connection()
+    try:
+        conn.execute(INSERT_SQL, (action, details, _now()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def log(action, details):
+    """Queue an event for the background writer (or write it at once when MODE is 'sync')."""
+    if MODE == 'sync' or _connect is None:
+        write_now(action, details)
+        return
+    _ensure_writer()
+    _queue.put((action, details, _now()))
+    depth = _queue.qsize()
+    with _lock:
+        _metrics['logged'] += 1
+        if depth > _metrics['max_queue_depth']:
+            _metrics['max_queue_depth'] = depth
+
+
+def _ensure_writer():
+    # Started lazily, and again in a forked worker process (threads do not survive fork)
+    global _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+        return
+    with _lock:
+        if _writer is not None and _writer_pid == os.getpid() and _writer.is_alive():
+            return
+        _stop.clear()
+        _writer = threading.Thread(target=_run, name='shop-activity-log', daemon=True)
+        _writer_pid = os.getpid()
+        _writer.start()
+
+
+def _write_batch(batch):
+    start = time.perf_counter()
+    conn = _connection()
+    try:
+        conn.executemany(INSERT_SQL, batch)
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+    elapsed = (time.perf_counter() - start) * 1000
+    with _lock:
+        _metrics['written'] += len(batch)
+        _metrics['batches'] += 1
+        _metrics['last_batch_rows'] = len(batch)
+        _metrics['last_flush_ms'] = elapsed
+        _metrics['total_flush_ms'] += elapsed
+        _metrics['max_flush_ms'] = max(_metrics['max_flush_ms'], elapsed)
+
+
+def _run():
+    batch = []
+    while True:
+        if not batch:
+            try:
+                batch.append(_queue.get(timeout=FLUSH_SECONDS))
+            except queue.Empty:
+                if _stop.is_set():
+                    return
+                continue
+        # Collect until the batch is full or FLUSH_SECONDS after its first event
+        deadline = time.monotonic() + FLUSH_SECONDS
+        while len(batch) < FLUSH_ROWS and not _stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        while len(batch) < FLUSH_ROWS:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            _write_batch(batch)
+            batch = []
+        except sqlite3.Error as e:
+            # Keep the batch and retry; events are only lost if the process dies
+            with _lock:
+                _metrics['errors'] += 1
+            print("⚠️ activity log flush failed:", e)
+            time.sleep(RETRY_DELAY)
+
+
+def flush(timeout=10):
+    """Block until every event queued so far is written (or `timeout` seconds pass)."""
+    deadline = time.monotonic() + timeout
+    with _lock:
+        target = _metrics['logged']
+    while time.monotonic() < deadline:
+        with _lock:
+            if _metrics['written'] >= target:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def stop(timeout=10):
+    """Write everything still queued and stop the writer thread (registered with atexit)."""
+    global _writer
+    if _writer is None or _writer_pid != os.getpid():
+        return
+    flush(timeout)
+    _stop.set()
+    _writer.join(timeout)
+    _writer = None
+
+
+atexit.register(stop)
+
+
+def stats():
+    with _lock:
+        metrics = dict(_metrics)
+    metrics.update({
+        'mode': MODE,
+        'queue_depth': _queue.qsize(),
+        'avg_flush_ms': metrics['total_flush_ms'] / metrics['batches'] if metrics['batches'] else 0.0,
+        'flush_rows': FLUSH_ROWS,
+        'flush_seconds': FLUSH_SECONDS,
+    })
+    del metrics['total_flush_ms']
+    return metrics
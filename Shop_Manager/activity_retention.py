@@ -0,0 +1,152 @@
+import argparse
+import csv
+import gzip
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+# ------------------ ACTIVITY RETENTION ------------------
+# activity_daily_counts holds per-day, per-action event counts, maintained
+# by a trigger on every insert into activities (migration 9), so /statistics
+# charts years of history from a small rollup table. archive() moves whole
+# months older than the retention window out of the live table into gzipped
+# CSV files (one per month, recorded in activity_archives) and deletes them
+# in the same transaction that records the archive. Counts are not
+# decremented when rows are archived.
+RETENTION_DAYS = int(os.environ.get('SHOP_ACTIVITY_RETENTION_DAYS', '90'))
+ARCHIVE_DIR = os.environ.get('SHOP_ACTIVITY_ARCHIVE_DIR')  # default: <database dir>/archive
+
+ARCHIVE_COLUMNS = ['id', 'date', 'action', 'details']
+
+def action_counts(conn, since=None):
+    """[(action, count)] over the whole history (or since a 'YYYY-MM-DD' day), most frequent first."""
+    where, params = ('WHERE day >= ?', (since,)) if since else ('', ())
+    return conn.execute(f'''
+        SELECT action, SUM(count) FROM activity_daily_counts {where}
+        GROUP BY action ORDER BY SUM(count) DESC
+    ''', params).fetchall()
+
+
+def retention_cutoff(keep_days=None, today=None):
+    """
+    First day that stays live: the start of the month containing
+    today - keep_days, so only whole months are archived.
+    """
+    keep_days = RETENTION_DAYS if keep_days is None else keep_days
+    oldest_kept = (today or date.today()) - timedelta(days=keep_days)
+    return oldest_kept.replace(day=1)
+
+
+def default_archive_dir(db_path):
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archive')
+
+
+def _archive_path(conn, archive_dir, month, first_id):
+    path = os.path.join(archive_dir, f'activities-{month}.csv.gz')
+    # A file no archive row points to is left over from an interrupted run: overwrite it
+    recorded = conn.execute('SELECT 1 FROM activity_archives WHERE path = ?', (path,)).fetchone()
+    if recorded:
+        path = os.path.join(archive_dir, f'activities-{month}-{first_id}.csv.gz')
+    return path
+
+
+def _write_month(path, rows):
+    """Stream rows (e.g. a cursor) into path via a temp file, so a partial file never has the final name."""
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_COLUMNS)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def archive(conn, archive_dir, keep_days=None, today=None, dry_run=False):
+    """
+    Move activities older than the retention cutoff into monthly .csv.gz
+    files under `archive_dir`. Each month is written to disk first, then
+    recorded and deleted from the live table in one transaction, so an
+    interrupted run never loses rows and a re-run simply redoes the month.
+    Returns [{'month', 'path', 'rows', 'first_id', 'last_id'}].
+    """
+    cutoff = retention_cutoff(keep_days, today).strftime('%Y-%m-%d')
+    months = [row[0] for row in conn.execute('''
+        SELECT DISTINCT substr(date, 1, 7) FROM activities WHERE date < ? ORDER BY 1
+    ''', (cutoff,))]
+    if not dry_run:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    archived = []
+    for month in months:
+        start, end = f'{month}-01', min(_next_month(month), cutoff)
+        count, first_id, last_id = conn.execute('''
+            SELECT COUNT(*), MIN(id), MAX(id) FROM activities WHERE date >= ? AND date < ?
+        ''', (start, end)).fetchone()
+        if not count:
+            continue
+        path = _archive_path(conn, archive_dir, month, first_id)
+        archived.append({'month': month, 'path': path, 'rows': count, 'first_id': first_id, 'last_id': last_id})
+        if dry_run:
+            continue
+
+        _write_month(path, conn.execute('''
+            SELECT id, date, action, details FROM activities
+            WHERE date >= ? AND date < ? AND id <= ? ORDER BY id
+        ''', (start, end, last_id)))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                INSERT INTO activity_archives (month, path, rows, first_id, last_id, created)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (month, path, count, first_id, last_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.execute('DELETE FROM activities WHERE date >= ? AND date < ? AND id <= ?', (start, end, last_id))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return archived
+
+
+def _next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f'{year + mon // 12:04d}-{mon % 12 + 1:02d}-01'
+
+
+def read_archive(path):
+    """Yield archived rows as dicts (for audits or re-imports)."""
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def list_archives(conn):
+    return conn.execute('SELECT month, path, rows, first_id, last_id, created FROM activity_archives ORDER BY id'
+                        ).fetchall()
+
+
+# python activity_retention.py [--keep-days N] [--archive-dir DIR] [--dry-run] [--list] [path/to/shop.db]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive old activity log rows into monthly .csv.gz files.')
+    parser.add_argument('db_path', nargs='?')
+    parser.add_argument('--keep-days', type=int, default=RETENTION_DAYS,
+                        help=f'days of history to keep live (default {RETENTION_DAYS}, SHOP_ACTIVITY_RETENTION_DAYS)')
+    parser.add_argument('--archive-dir', help='where archive files go (default <database dir>/archive)')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be archived')
+    parser.add_argument('--list', action='store_true', help='list existing archives')
+    args = parser.parse_args()
+    if args.db_path is None:
+        from app import DB_PATH as db_path
+    else:
+        db_path = args.db_path
+
+    conn = sqlite3.connect(db_path, timeout=5, isolation_level=None)
+    if args.list:
+        for month, path, rows, first_id, last_id, created in list_archives(conn):
+            print(f"{month}  {rows:>8} rows  ids {first_id}-{last_id}  {created}  {path}")
+    else:
+        results = archive(conn, args.archive_dir or default_archive_dir(db_path), args.keep_days,
+                          dry_run=args.dry_run)
+        for result in results:
+            print(f"{'would archive' if args.dry_run else 'archived'} {result['month']}: "
+                  f"{result['rows']} rows -> {result['path']}")
+        if not results:
+            print(f"nothing older than {retention_cutoff(args.keep_days)} to archive")
+    conn.close()
@@ -1,41 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, flash, jsonify, g, has_app_context
+from flask import Response, stream_with_context
 import sqlite3
 import os
-import pandas as pd
-from datetime import datetime, timedelta
-from flask import send_file
-import io
-import csv
+from datetime import timedelta
 import json
+import tempfile
 import time   # <-- added
-from datetime import datetime, date
-from flask import render_template
-
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = "supersecretkey"
-
-# Database path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'Database', 'shop.db')
-
-# --- Ensure expiry_data table exists ---
-def init_expiry_table():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS expiry_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_name TEXT UNIQUE,
-            expiry_date TEXT,
-            expiry_status TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Initialize expiry_data table
-init_expiry_table()
-
+import db
+import jobs
+from migrations import migrate, startup_lock
+from sale_engine import SaleError, record_checkout, record_sale
+from upload_engine import import_file
+import item_search
+import response_cache
+import activity_log
+import families
+import metrics
+import profiling
+from exports import stream_export
+from expiry import expired_count, expiring_within, expiry_listing, form_expiry_dates, save_expiry_dates
+from item_listing import list_items, listing_args, listing_query
+import replenishment
+from price_history import HISTORY_PAGE_SIZE, price_as_of, price_history, price_summaries, to_ts
+from reports import day_window, sales_timeseries, statistics_report, to_day
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+bp = Blueprint('shop', __name__)
+
+# Database path (SHOP_DB_PATH overrides it, e.g. for benchmarks on a scratch copy)
+DB_PATH = os.environ.get('SHOP_DB_PATH') or os.path.join(os.path.dirname(__file__), 'Database', 'shop.db')
+
+
+# Uploads are spooled here until their background import job finishes
+UPLOAD_DIR = os.path.join(os.path.dirname(DB_PATH), 'uploads')
 
 # Allowed file types
 ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
@@ -44,31 +41,54 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # ------------------ CONNECTION HELPER (FIX #1) ------------------
-def get_connection(retries: int = 5, retry_delay: float = 0.15):
+def get_connection(retries: int = 5, retry_delay: float = 0.15, request_scoped: bool = True):
     """
-    Return a new sqlite3 connection with retries on 'database is locked'.
-    Uses check_same_thread=False so connections can be used in different threads
-    (safe here because we create short-lived connections).
+    Return a pooled sqlite3 connection (WAL mode, tuned pragmas - see db.py).
+    Inside a request every call returns the same connection, kept on `g` and
+    released by the teardown hook, so conn.close() in the routes is harmless.
+    Outside a request conn.close() hands the connection back to the pool.
+    With SHOP_DB_POOL=0 the connection is a fresh one, closed where a pooled
+    one would be released. request_scoped=False always returns a connection of its own (its commit
+    cannot commit the request's transaction); the caller must close() it.
+    Retries only matter when a new connection has to switch the file to WAL
+    while another process holds a lock.
     """
+    if request_scoped and has_app_context() and 'db_conn' in g:
+        return g.db_conn
+
     last_exc = None
     for attempt in range(retries):
         try:
-            # timeout gives SQLite a little more time to acquire locks
-            conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
-            return conn
+            conn = db.acquire(DB_PATH)
+            break
         except sqlite3.OperationalError as e:
             last_exc = e
             if 'locked' in str(e).lower():
+                metrics.incr('db_lock_retries')
+                metrics.incr('db_lock_wait_seconds', retry_delay)
                 time.sleep(retry_delay)
                 continue
             raise
-    # If we exhaust retries, raise the last exception
-    raise sqlite3.OperationalError(f"Could not get DB connection after {retries} retries: {last_exc}")
+    else:
+        # If we exhaust retries, raise the last exception
+        metrics.incr('db_lock_failures')
+        raise sqlite3.OperationalError(f"Could not get DB connection after {retries} retries: {last_exc}")
+
+    # Statement counts and timings for /metrics (once per pooled connection)
+    metrics.instrument(conn)
+    if request_scoped and has_app_context():
+        conn.pinned = True
+        g.db_conn = conn
+    return conn
+
+def release_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db.release(conn)
 
 # ------------------ DATABASE INITIALIZATION ------------------
-def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = get_connection()
+def create_base_tables(conn):
+    """The original tables; indexes and everything since are migrations (see migrations.py)."""
     c = conn.cursor()
 
     # Items Table
@@ -108,14 +128,7 @@ def init_db():
         )
     ''')
 
-    # Expiry Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS expiry (
-            item TEXT PRIMARY KEY,
-            expiry_date TEXT,
-            expiry_status TEXT
-        )
-    ''')
+    # The expiry table (keyed by item_id) is created by migration 8, see migrations.py
 
     # Activities (Event Log) Table
     c.execute('''
@@ -128,57 +141,56 @@ def init_db():
     ''')
 
     conn.commit()
+
+def init_db():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = get_connection()
+    create_base_tables(conn)
+    # Indexes and later schema changes are versioned via PRAGMA user_version
+    migrate(conn)
     conn.close()
 
-# Logging helper (now uses get_connection)
+# Logging helper: queues the event for the batched background writer (see activity_log.py),
+# which writes through connections of its own. While the request's connection has a
+# transaction open, the event joins that transaction instead: a commit of the log
+# must not commit the route's half-done work, and a separate writer would wait on its lock.
 def log_activity(action, details):
-    conn = None
     try:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO activities (action, details, date) VALUES (?, ?, ?)",
-                  (action, details, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
+        conn = g.get('db_conn') if has_app_context() else None
+        if conn is not None and conn.in_transaction:
+            activity_log.record(conn, action, details)
+        else:
+            activity_log.log(action, details)
     except Exception as e:
         # Don't crash the main operation if logging fails — print for debugging
         print("⚠️ log_activity failed:", e)
-    finally:
-        if conn:
-            conn.close()
 
 # ------------------ DASHBOARD ------------------
-@app.route('/')
+@bp.route('/')
 def index():
     conn = get_connection()
     c = conn.cursor()
 
-    # Fetch items
-    c.execute('SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount FROM items')
-    items = c.fetchall()
-
     # --- Dashboard Stats ---
-    # Total items in stock
-    c.execute('SELECT COUNT(*) FROM items')
-    total_items = c.fetchone()[0]
+    # (the dashboard template shows no item table, so no item rows are fetched here)
+    # Item count and stock value come from the trigger-maintained summary row (see summary.py)
+    c.execute('SELECT total_items, total_stock_value FROM shop_summary WHERE id = 1')
+    total_items, total_stock_value_raw = c.fetchone() or (0, 0)
 
     # Total sales today
-    today = datetime.now().strftime("%Y-%m-%d")
-    c.execute('SELECT SUM(total_amount) FROM sales WHERE date(date) = ?', (today,))
-    total_sales_today = c.fetchone()[0] or 0
+    today = day_window()
+    c.execute('SELECT total_amount FROM daily_sales WHERE day = ?', (today[0][:10],))
+    row = c.fetchone()
+    total_sales_today = row[0] if row else 0
 
     # New stock added today
-    c.execute('SELECT COUNT(*) FROM items WHERE date(date_added) = ?', (today,))
+    c.execute('SELECT COUNT(*) FROM items WHERE date_added >= ? AND date_added < ?', today)
     new_stock_today = c.fetchone()[0]
 
-    # Expired products
-    c.execute('SELECT COUNT(*) FROM expiry WHERE expiry_status = "Expired"')
-    expired_row = c.fetchone()
-    expired_products = expired_row[0] if expired_row and expired_row[0] is not None else 0
+    # Expired products (status derived from expiry_date, index range count)
+    expired_products = expired_count(conn)
 
-    # Total stock value (sum of all total_stock_amount)
-    c.execute('SELECT SUM(total_stock_amount) FROM items')
-    total_stock_value_raw = c.fetchone()[0] or 0
-    # Format with commas and Ksh prefix
+    # Total stock value: format with commas and Ksh prefix
     total_stock_value = f"Ksh {int(total_stock_value_raw):,}"
 
     # Recent logs (latest 10)
@@ -186,21 +198,15 @@ def index():
     recent_logs_rows = c.fetchall()
     recent_logs = [{'date': r[0], 'action': r[1], 'details': r[2]} for r in recent_logs_rows]
 
-    # Sales trend data for the chart: last 7 days totals
-    sales_dates = []
-    sales_values = []
-    for i in range(6, -1, -1):
-        day = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        c.execute('SELECT SUM(total_amount) FROM sales WHERE date(date) = ?', (day,))
-        val = c.fetchone()[0] or 0
-        sales_dates.append(day)
-        sales_values.append(val)
+    # Sales trend data for the chart: last 7 days totals (one grouped query)
+    trend = sales_timeseries(conn, to_day() - timedelta(days=6), to_day())
+    sales_dates = [point['bucket'] for point in trend]
+    sales_values = [point['total'] for point in trend]
 
     conn.close()
 
     return render_template(
         'index.html',
-        items=items,
         total_items=total_items,
         total_sales_today=total_sales_today,
         new_stock_today=new_stock_today,
@@ -212,13 +218,19 @@ def index():
     )
 
 
-@app.route('/api/items')
+@bp.route('/api/items')
 def api_items():
+    """
+    One page of items: ?sort=id|item&dir=asc|desc&limit=&q=&in_stock=1&cursor=
+    Pass the returned next_cursor back as ?cursor= for the following page.
+    """
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount FROM items')
-    rows = c.fetchall()
-    conn.close()
+    try:
+        rows, next_cursor = list_items(conn, **listing_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
     data = [
         {
             'id': row[0],
@@ -229,10 +241,40 @@ def api_items():
             'total_stock_amount': row[5]
         } for row in rows
     ]
-    return jsonify(data)
+    return jsonify({'items': data, 'next_cursor': next_cursor})
+
+@bp.route('/api/items/<int:item_id>/price-history')
+def api_price_history(item_id):
+    """
+    An item's price changes, newest first, with its summary, e.g.
+    /api/items/5/price-history?from=2025-01-01&to=2025-06-30&limit=50
+    Pass the returned next_cursor back as ?cursor= for older changes; add
+    ?as_of=YYYY-MM-DD[ HH:MM:SS] for the price the item had at that moment.
+    """
+    conn = get_connection()
+    try:
+        row = conn.execute('SELECT item, price_per_pc_or_kg FROM items WHERE id = ?', (item_id,)).fetchone()
+        if row is None:
+            return jsonify({'error': f'Item {item_id} not found'}), 404
+        history, next_cursor = price_history(conn, item_id,
+                                             first_day=request.args.get('from') or None,
+                                             last_day=request.args.get('to') or None,
+                                             cursor=request.args.get('cursor') or None,
+                                             limit=request.args.get('limit', HISTORY_PAGE_SIZE, type=int))
+        summary = price_summaries(conn, [item_id]).get(item_id) or {'item_id': item_id, 'changes': 0}
+        result = {'item_id': item_id, 'item': row[0], 'current_price': row[1], 'summary': summary,
+                  'history': history, 'next_cursor': next_cursor}
+        if request.args.get('as_of'):
+            result['as_of'] = to_ts(request.args['as_of'])
+            result['price_as_of'] = price_as_of(conn, item_id, result['as_of'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    return jsonify(result)
 
 # ------------------ ITEM MANAGEMENT ------------------
-@app.route('/add', methods=['POST'])
+@bp.route('/add', methods=['POST'])
 def add_item():
     item = request.form['item']
     description = request.form.get('description', '')
@@ -240,13 +282,13 @@ def add_item():
         price = float(request.form['price_per_pc_or_kg'])
     except (ValueError, KeyError):
         flash('Invalid price value')
-        return redirect(url_for('index'))
+        return redirect(url_for('shop.index'))
 
     try:
         quantity = float(request.form['total_quantity_available'])
     except (ValueError, KeyError):
         flash('Invalid quantity value')
-        return redirect(url_for('index'))
+        return redirect(url_for('shop.index'))
 
     total_amount = price * quantity
 
@@ -256,14 +298,17 @@ def add_item():
         INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
         VALUES (?, ?, ?, ?, ?)
     ''', (item, description, price, quantity, total_amount))
+    # Logged in the same transaction: no second commit, and the dashboard shows it at once
+    activity_log.record(conn, "ADD ITEM",
+                        f'Item "{item}" added — qty: {quantity}, price: {price:.2f}, total: {total_amount:.2f}')
+    families.refresh(conn, commit=False)
     conn.commit()
     conn.close()
 
-    log_activity("ADD ITEM", f'Item "{item}" added — qty: {quantity}, price: {price:.2f}, total: {total_amount:.2f}')
     flash(f'Item "{item}" added successfully!')
-    return redirect(url_for('index'))
+    return redirect(url_for('shop.index'))
 
-@app.route('/delete/<int:item_id>')
+@bp.route('/delete/<int:item_id>')
 def delete_item(item_id):
     conn = get_connection()
     c = conn.cursor()
@@ -271,14 +316,14 @@ def delete_item(item_id):
     row = c.fetchone()
     item_name = row[0] if row else f'ID {item_id}'
     c.execute('DELETE FROM items WHERE id = ?', (item_id,))
+    activity_log.record(conn, "DELETE ITEM", f'Item "{item_name}" (id:{item_id}) deleted.')
     conn.commit()
     conn.close()
 
-    log_activity("DELETE ITEM", f'Item "{item_name}" (id:{item_id}) deleted.')
     flash('Item deleted successfully!')
-    return redirect(url_for('index'))
+    return redirect(url_for('shop.index'))
 
-@app.route('/edit/<int:item_id>')
+@bp.route('/edit/<int:item_id>')
 def edit_item(item_id):
     conn = get_connection()
     c = conn.cursor()
@@ -287,7 +332,7 @@ def edit_item(item_id):
     conn.close()
     return render_template('edit.html', item=item)
 
-@app.route('/update/<int:item_id>', methods=['POST'])
+@bp.route('/update/<int:item_id>', methods=['POST'])
 def update_item(item_id):
     item_name = request.form.get('item', '').strip()
     description = request.form.get('description', '').strip()
@@ -297,14 +342,14 @@ def update_item(item_id):
         new_price = float(request.form['price_per_pc_or_kg'])
     except (ValueError, KeyError):
         flash('⚠️ Invalid price value')
-        return redirect(url_for('index'))
+        return redirect(url_for('shop.index'))
 
     # Validate quantity
     try:
         quantity = float(request.form['total_quantity_available'])
     except (ValueError, KeyError):
         flash('⚠️ Invalid quantity value')
-        return redirect(url_for('index'))
+        return redirect(url_for('shop.index'))
 
     total_amount = new_price * quantity
 
@@ -318,7 +363,7 @@ def update_item(item_id):
         row = c.fetchone()
         if not row:
             flash('❌ Item not found.')
-            return redirect(url_for('index'))
+            return redirect(url_for('shop.index'))
 
         old_price = float(row[0])
         old_item_name = row[1]
@@ -329,8 +374,8 @@ def update_item(item_id):
                 INSERT INTO price_variations (item_id, old_price, new_price, change_date)
                 VALUES (?, ?, ?, datetime('now'))
             ''', (item_id, old_price, new_price))
-            # Logging uses its own connection (get_connection)
-            log_activity("PRICE CHANGE", f'{old_item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
+            activity_log.record(conn, "PRICE CHANGE",
+                                f'{old_item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
 
         # Update the main item
         c.execute('''
@@ -338,26 +383,37 @@ def update_item(item_id):
             SET item=?, description=?, price_per_pc_or_kg=?, total_quantity_available=?, total_stock_amount=?
             WHERE id=?
         ''', (item_name, description, new_price, quantity, total_amount, item_id))
+        activity_log.record(conn, "UPDATE ITEM",
+                            f'Item "{item_name}" (id:{item_id}) updated — qty: {quantity}, price: {new_price:.2f}')
+        families.refresh(conn, commit=False)  # in case the item was renamed
 
         conn.commit()
     finally:
         conn.close()
 
-    log_activity("UPDATE ITEM", f'Item "{item_name}" (id:{item_id}) updated — qty: {quantity}, price: {new_price:.2f}')
     flash(f'✅ Item "{item_name}" updated successfully{" (price variation recorded)" if old_price != new_price else ""}!')
-    return redirect(url_for('index'))
+    return redirect(url_for('shop.index'))
 
 # ------------------ PRICE LIST ------------------
-@app.route('/price-list')
-def price_list():
+def render_listing(template):
+    """Render the first page of a listing; the template lazy-loads the rest from /api/items."""
+    params = listing_args(request.args)
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount FROM items')
-    items = c.fetchall()
-    conn.close()
-    return render_template('price_list.html', items=items)
+    try:
+        items, next_cursor = list_items(conn, **params)
+    except ValueError as e:
+        flash(f'⚠️ {e}')
+        return redirect(request.path)
+    finally:
+        conn.close()
+    return render_template(template, items=items, next_cursor=next_cursor, listing=params,
+                           listing_query=listing_query(params))
+
+@bp.route('/price-list')
+def price_list():
+    return render_listing('price_list.html')
 
-@app.route('/upload', methods=['GET', 'POST'])
+@bp.route('/upload', methods=['GET', 'POST'])
 def upload_file():
     if request.method == 'POST':
         file = request.files.get('file')
@@ -366,368 +422,289 @@ def upload_file():
             return redirect(request.url)
 
         if file and allowed_file(file.filename):
+            # Spool the upload to disk and import it in the background (see upload_job)
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            suffix = '.' + file.filename.rsplit('.', 1)[1].lower()
+            fd, spool_path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_DIR)
+            os.close(fd)
             try:
-                # Read file into dataframe
-                if file.filename.lower().endswith('.csv'):
-                    df = pd.read_csv(file)
-                else:
-                    df = pd.read_excel(file)
-
-                required_columns = ['ITEM', 'DESCRIPTION', 'PRICE_PER_PC_OR_KG', 'TOTAL_QUANTITY_AVAILABLE']
-                if not all(col in df.columns for col in required_columns):
-                    flash(f'Missing required columns. Required: {required_columns}')
-                    return redirect(request.url)
-
-                df['TOTAL_STOCK_AMOUNT'] = df['PRICE_PER_PC_OR_KG'] * df['TOTAL_QUANTITY_AVAILABLE']
-
-                inserted = 0
-                updated = 0
-
-                # Use single connection for all operations
-                with get_connection() as conn:
-                    c = conn.cursor()
-
-                    def log_conn_activity(action, details):
-                        """Log activity using the existing connection to prevent locking."""
-                        try:
-                            c.execute(
-                                "INSERT INTO activities (action, details, date) VALUES (?, ?, ?)",
-                                (action, details, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                            )
-                        except Exception as e:
-                            print("⚠️ log_activity failed:", e)
-
-                    for _, row in df.iterrows():
-                        item_name = str(row['ITEM']).strip()
-                        description = str(row.get('DESCRIPTION', '')).strip()
-                        new_price = float(row['PRICE_PER_PC_OR_KG'])
-                        qty = float(row['TOTAL_QUANTITY_AVAILABLE'])
-                        total_amt = float(row['TOTAL_STOCK_AMOUNT'])
-
-                        # Check if item exists
-                        c.execute('SELECT id, price_per_pc_or_kg FROM items WHERE item = ?', (item_name,))
-                        existing = c.fetchone()
-
-                        if existing:
-                            item_id, old_price = existing
-                            if old_price != new_price:
-                                c.execute('''
-                                    INSERT INTO price_variations (item_id, old_price, new_price)
-                                    VALUES (?, ?, ?)
-                                ''', (item_id, old_price, new_price))
-                                log_conn_activity("PRICE CHANGE", f'{item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
-
-                            # Update item
-                            c.execute('''
-                                UPDATE items
-                                SET description=?, price_per_pc_or_kg=?, total_quantity_available=?, total_stock_amount=?, date_added=CURRENT_TIMESTAMP
-                                WHERE id=?
-                            ''', (description, new_price, qty, total_amt, item_id))
-                            updated += 1
-                            log_conn_activity("UPDATE ITEM (UPLOAD)", f'Updated "{item_name}" — qty: {qty}, price: {new_price:.2f}')
-                        else:
-                            # Insert new item
-                            c.execute('''
-                                INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
-                                VALUES (?, ?, ?, ?, ?)
-                            ''', (item_name, description, new_price, qty, total_amt))
-                            inserted += 1
-                            log_conn_activity("ADD ITEM (UPLOAD)", f'Inserted "{item_name}" — qty: {qty}, price: {new_price:.2f}')
-
-                    conn.commit()
-
-                flash(f'File uploaded successfully! {inserted} new, {updated} updated.')
-                return redirect(url_for('index'))
-
+                file.save(spool_path)
+                job_id = jobs.enqueue(get_connection(), 'upload', {'path': spool_path, 'filename': file.filename})
             except Exception as e:
+                os.remove(spool_path)
                 flash(f'Error processing file: {e}')
                 print("⚠️ Upload failed:", e)
                 return redirect(request.url)
 
-    return render_template('upload.html')
+            flash(f'File received — importing in the background (job {job_id}).')
+            return redirect(url_for('shop.upload_file', job=job_id))
+
+    return render_template('upload.html', job_id=request.args.get('job', type=int))
 
-@app.route('/search')
+@jobs.handler('upload')
+def upload_job(conn, params, progress):
+    """Chunked, set-based upsert; each chunk commits on its own (see upload_engine.py)."""
+    try:
+        # The spool path is unique to this upload, and the same when a restarted job resumes it
+        result = import_file(conn, params['path'], filename=params['filename'], owner=params['path'],
+                             progress=lambda status: progress({'rows_done': status['rows_done'],
+                                                               'chunks_done': status['chunks_done']}))
+    finally:
+        if os.path.exists(params['path']):
+            os.remove(params['path'])
+    families.refresh(conn)  # product families of the newly inserted items
+    return result
+
+@jobs.handler('statistics')
+def statistics_job(conn, params, progress):
+    return statistics_report(conn)
+
+@jobs.handler('reorder')
+def reorder_job(conn, params, progress):
+    return replenishment.refresh(conn)
+
+@bp.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    job = jobs.get_job(get_connection(), job_id)
+    if job is None:
+        return jsonify({'error': f'Job {job_id} not found'}), 404
+    return jsonify(job)
+
+@bp.route('/search')
 def search():
     query = request.args.get('query', '').strip()  # Get the search input
     if not query:
         flash("Please enter a search term!")
-        return redirect(url_for('sales'))  # Or wherever you want to redirect if empty
+        return redirect(url_for('shop.sales'))  # Or wherever you want to redirect if empty
 
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount
-        FROM items
-        WHERE item LIKE ? OR description LIKE ?
-    """, (f'%{query}%', f'%{query}%'))
-    results = c.fetchall()
+    results = item_search.search_items(conn, query)  # ranked FTS5 prefix search
     conn.close()
 
     return render_template('sales.html', items=results)
 
-@app.route('/api/search-items')
+@bp.route('/api/search-items')
 def search_items():
     query = request.args.get('q', '').strip()
     conn = get_connection()
-    c = conn.cursor()
     if query:
-        c.execute("SELECT id, item, description FROM items WHERE item LIKE ? LIMIT 10", (f"%{query}%",))
+        items = item_search.autocomplete(conn, query, limit=10)
     else:
-        c.execute("SELECT id, item, description FROM items LIMIT 20")
-    items = c.fetchall()
+        items = conn.execute("SELECT id, item, description FROM items LIMIT 20").fetchall()
     conn.close()
     data = [{'id': r[0], 'item': r[1], 'description': r[2]} for r in items]
     return jsonify(data)
 
 
 # ------------------ SALES ------------------
-@app.route('/sales')
+@bp.route('/sales')
 def sales():
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount FROM items')
-    items = c.fetchall()
-    conn.close()
-    return render_template('sales.html', items=items)
+    return render_listing('sales.html')
 
-@app.route('/sell/<int:item_id>', methods=['POST'])
+@bp.route('/sell/<int:item_id>', methods=['POST'])
 def sell_item(item_id):
     try:
         quantity_sold = float(request.form['quantity_sold'])
     except (ValueError, KeyError):
         flash('Invalid quantity entered')
-        return redirect(url_for('sales'))
+        return redirect(url_for('shop.sales'))
 
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT item, total_quantity_available, price_per_pc_or_kg FROM items WHERE id = ?', (item_id,))
-    item = c.fetchone()
+    # Stock check, decrement, sale row and activity log commit together (see sale_engine.py)
+    try:
+        receipt = record_sale(get_connection(), item_id, quantity_sold)
+        flash(f'Sold {quantity_sold} units of "{receipt["item"]}" successfully!')
+    except SaleError as e:
+        flash(f'⚠️ {e}')
+    except sqlite3.OperationalError as e:
+        if 'locked' not in str(e).lower():
+            raise
+        metrics.incr('db_locked_errors')
+        flash('⚠️ Another till is busy — please retry the sale.')
+    return redirect(url_for('shop.sales'))
 
-    if item and quantity_sold <= item[1]:
-        remaining = item[1] - quantity_sold
-        total_amount = quantity_sold * item[2]
-        c.execute('UPDATE items SET total_quantity_available=?, total_stock_amount=? WHERE id=?',
-                  (remaining, remaining * item[2], item_id))
-        c.execute('INSERT INTO sales (item_id, quantity_sold, total_amount) VALUES (?, ?, ?)',
-                  (item_id, quantity_sold, total_amount))
-        conn.commit()
-        sold_item_name = item[0]
-        conn.close()
-        log_activity("SALE", f'Sold {quantity_sold} units of "{sold_item_name}" (id:{item_id}) for {total_amount:.2f} KSH')
-        flash(f'Sold {quantity_sold} units of "{sold_item_name}" successfully!')
-    else:
-        conn.close()
-        flash('Insufficient stock!')
-    return redirect(url_for('sales'))
+@bp.route('/api/checkout', methods=['POST'])
+def api_checkout():
+    """
+    Sell a basket in one transaction. Body:
+    {"lines": [{"item_id": 1, "quantity": 2}, {"item_id": 7, "quantity": 0.5}]}
+    Returns a JSON receipt, 400 for a malformed line (non-integer item_id,
+    non-finite quantity), 409 with per-line problems if any line cannot be sold.
+    """
+    payload = request.get_json(silent=True) or {}
+    # Accept {"lines": [...]} or a bare list of lines
+    raw_lines = payload.get('lines', []) if isinstance(payload, dict) else payload
+    try:
+        lines = [(line['item_id'], line['quantity']) for line in raw_lines]
+    except (TypeError, KeyError):
+        return jsonify({'error': 'Each line needs item_id and quantity'}), 400
 
-@app.route('/sales-today')
+    try:
+        receipt = record_checkout(get_connection(), lines)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except SaleError as e:
+        return jsonify({'error': str(e), 'problems': e.problems}), 409
+    except sqlite3.OperationalError as e:
+        if 'locked' not in str(e).lower():
+            raise
+        metrics.incr('db_locked_errors')
+        return jsonify({'error': 'Another till is busy, please retry'}), 503
+    return jsonify(receipt)
+
+@bp.route('/sales-today')
 def sales_today():
     conn = get_connection()
     c = conn.cursor()
-    today = datetime.now().strftime("%Y-%m-%d")
     c.execute('''
         SELECT i.item, s.quantity_sold, i.price_per_pc_or_kg, s.total_amount
         FROM sales s
         JOIN items i ON s.item_id = i.id
-        WHERE date(s.date) = ?
-    ''', (today,))
+        WHERE s.date >= ? AND s.date < ?
+    ''', day_window())
     sales = c.fetchall()
     total_sales = sum(s[3] for s in sales)
     conn.close()
     return render_template('sales_today.html', sales=sales, total_sales=total_sales)
 
+@bp.route('/api/sales/timeseries')
+def api_sales_timeseries():
+    """
+    Zero-filled sales totals per bucket, e.g.
+    /api/sales/timeseries?from=2025-11-01&to=2025-11-30&bucket=week
+    Defaults to the last 30 days in daily buckets.
+    """
+    try:
+        last_day = to_day(request.args.get('to') or None)
+        first_day = to_day(request.args.get('from') or (last_day - timedelta(days=29)))
+        bucket = request.args.get('bucket', 'day')
+        conn = get_connection()
+        try:
+            series = sales_timeseries(conn, first_day, last_day, bucket)
+        finally:
+            conn.close()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'from': str(first_day), 'to': str(last_day), 'bucket': bucket, 'series': series})
+
 # ------------------ ADDED STOCK ------------------
-@app.route('/added-stock')
+@bp.route('/added-stock')
 def added_stock():
     conn = get_connection()
     c = conn.cursor()
-    today = datetime.now().strftime("%Y-%m-%d")
-    c.execute('SELECT item, description, price_per_pc_or_kg, total_quantity_available FROM items WHERE date(date_added) = ?', (today,))
+    c.execute('SELECT item, description, price_per_pc_or_kg, total_quantity_available FROM items WHERE date_added >= ? AND date_added < ?', day_window())
     items = c.fetchall()
     conn.close()
     return render_template('added_stock.html', items=items)
 
 # ------------------ STATISTICS ------------------
-@app.route('/statistics')
+@bp.route('/statistics')
+@response_cache.cached
 def statistics():
     conn = get_connection()
-    c = conn.cursor()
-
-    # Activity logs (latest 200)
-    c.execute("SELECT date, action, details FROM activities ORDER BY id DESC LIMIT 200")
-    activities_rows = c.fetchall()
-    activities = [{'date': r[0], 'action': r[1], 'details': r[2]} for r in activities_rows]
-
-    # Action counts (for bar chart)
-    c.execute("SELECT action, COUNT(*) FROM activities GROUP BY action ORDER BY COUNT(*) DESC")
-    action_counts_rows = c.fetchall()
-    action_labels = [r[0] for r in action_counts_rows]
-    action_counts = [r[1] for r in action_counts_rows]
-
-    # Sales last 14 days (for line chart)
-    sales_dates = []
-    sales_values = []
-    for i in range(13, -1, -1):
-        day = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        c.execute('SELECT SUM(total_amount) FROM sales WHERE date(date) = ?', (day,))
-        val = c.fetchone()[0] or 0
-        sales_dates.append(day)
-        sales_values.append(val)
-
-    # Top selling items (sum by item)
-    c.execute('''
-        SELECT i.item, SUM(s.quantity_sold) as total_qty, SUM(s.total_amount) as total_sales
-        FROM sales s
-        JOIN items i ON s.item_id = i.id
-        GROUP BY i.item
-        ORDER BY total_sales DESC
-        LIMIT 10
-    ''')
-    top_rows = c.fetchall()
-    top_labels = [r[0] for r in top_rows]
-    top_sales_values = [r[2] for r in top_rows]  # total_sales
-
+    report = statistics_report(conn)
     conn.close()
 
     return render_template(
         'statistics.html',
-        activities=activities,
-        action_labels=json.dumps(action_labels),
-        action_counts=json.dumps(action_counts),
-        sales_dates=json.dumps(sales_dates),
-        sales_values=json.dumps(sales_values),
-        top_labels=json.dumps(top_labels),
-        top_sales_values=json.dumps(top_sales_values)
+        activities=report['activities'],
+        **{key: json.dumps(value) for key, value in report.items() if key != 'activities'}
     )
 
-    # Ensure expiry table exists
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS expiry (
-            item TEXT PRIMARY KEY,
-            expiry_date TEXT,
-            expiry_status TEXT
-        )
-    """)
-
-    today_str = datetime.today().strftime('%Y-%m-%d')
-
-    # Save each item's expiry info
-    for key, value in request.form.items():
-        if key.startswith("expiry_date_"):
-            item_name = key.replace("expiry_date_", "").replace("_", " ")
-            expiry_date = value.strip()
-            
-            # Determine status server-side
-            if not expiry_date:
-                expiry_status = 'N/A'
-            elif expiry_date < today_str:
-                expiry_status = 'Expired'
-            else:
-                expiry_status = 'Valid'
-
-            # Save to DB
-            cursor.execute("""
-                INSERT INTO expiry (item, expiry_date, expiry_status)
-                VALUES (?, ?, ?)
-                ON CONFLICT(item) DO UPDATE SET
-                    expiry_date = excluded.expiry_date,
-                    expiry_status = excluded.expiry_status
-            """, (item_name, expiry_date, expiry_status))
+@bp.route('/api/activity-log')
+def api_activity_log():
+    """Activity log writer metrics (queue depth, batches, flush latency...)."""
+    return jsonify(activity_log.stats())
 
-    conn.commit()
-    conn.close()
+@bp.route('/api/cache')
+def api_cache():
+    """Response cache counters (hits, misses, 304s, evictions...)."""
+    return jsonify(response_cache.stats())
 
-    flash("Expiry data saved successfully!", "success")
-    return redirect(url_for('expiry_status'))
+@bp.route('/metrics')
+def prometheus_metrics():
+    """
+    Request latency, SQL statement and database-lock metrics in the Prometheus
+    text format. Each worker process keeps its own (see metrics.py).
+    """
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/expiry-status')
-def expiry_status():
+@bp.route('/api/metrics')
+def api_metrics():
+    """
+    Per-route latency, statements per request and the statements taking the
+    most time, e.g. /api/metrics?top=5; with the cache and activity-log counters.
+    """
+    summary = metrics.summary(top=request.args.get('top', 10, type=int))
+    summary['cache'] = response_cache.stats()
+    summary['activity_log'] = activity_log.stats()
+    return jsonify(summary)
+
+@bp.route('/api/reports/statistics', methods=['POST'])
+def queue_statistics_report():
+    """Compute the statistics report in the background; poll /api/jobs/<id> for the result."""
+    job_id = jobs.enqueue(get_connection(), 'statistics')
+    return jsonify({'job_id': job_id, 'status_url': url_for('shop.api_job', job_id=job_id)}), 202
+
+# ------------------ REORDER ------------------
+@bp.route('/api/reorder')
+def api_reorder():
+    """
+    Reorder suggestions from the last replenishment run, least cover first, e.g.
+    /api/reorder?limit=50&offset=0; add all=1 for every item, not just those to reorder.
+    """
     conn = get_connection()
-    c = conn.cursor()
-
-    # Ensure expiry table exists
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS expiry (
-            item TEXT PRIMARY KEY,
-            expiry_date TEXT,
-            expiry_status TEXT
-        )
-    """)
-
-    # Fetch all items from items table
-    c.execute("SELECT item FROM items")
-    all_items = [row[0] for row in c.fetchall()]
-
-    # Fetch existing expiry info
-    c.execute("SELECT item, expiry_date, expiry_status FROM expiry")
-    expiry_rows = {row[0]: {'expiry_date': row[1], 'expiry_status': row[2]} for row in c.fetchall()}
-
-    # Prepare items for template
-    items = []
-    for item_name in all_items:
-        items.append({
-            'item': item_name,
-            'expiry_date': expiry_rows.get(item_name, {}).get('expiry_date', ''),
-            'expiry_status': expiry_rows.get(item_name, {}).get('expiry_status', 'N/A')
-        })
-
-    conn.close()
+    try:
+        items = replenishment.suggestions(conn, include_all=request.args.get('all') in ('1', 'true'),
+                                          limit=request.args.get('limit', 100, type=int),
+                                          offset=request.args.get('offset', 0, type=int))
+        needs_reorder, computed_at = replenishment.reorder_status(conn)
+    finally:
+        conn.close()
+    return jsonify({'computed_at': computed_at, 'needs_reorder': needs_reorder, 'count': len(items),
+                    'items': items})
+
+@bp.route('/api/reorder/refresh', methods=['POST'])
+def queue_reorder_refresh():
+    """Recompute the suggestions in the background; poll /api/jobs/<id> for the result."""
+    job_id = jobs.enqueue(get_connection(), 'reorder')
+    return jsonify({'job_id': job_id, 'status_url': url_for('shop.api_job', job_id=job_id)}), 202
+
+# ------------------ EXPIRY ------------------
+@bp.route('/expiry-status')
+@response_cache.cached
+def expiry_status():
+    # One join; statuses are derived from the dates (see expiry.py)
+    items = expiry_listing(get_connection())
     return render_template('expiry_status.html', items=items)
 
-from datetime import datetime
-
-@app.route('/update-expiry', methods=['POST'])
+@bp.route('/update-expiry', methods=['POST'])
 def update_expiry():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Ensure expiry table exists
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS expiry (
-            item TEXT PRIMARY KEY,
-            expiry_date TEXT,
-            expiry_status TEXT
-        )
-    """)
-
-    today = datetime.today().date()
-
-    # Loop through all expiry_date fields from the form
-    for key, value in request.form.items():
-        if key.startswith("expiry_date_"):
-            # Convert back underscores to spaces if needed
-            item_name = key.replace("expiry_date_", "").replace("_", " ")
-            expiry_date = value.strip()
-
-            if expiry_date:
-                exp_date = datetime.strptime(expiry_date, "%Y-%m-%d").date()
-                expiry_status = "Expired" if exp_date <= today else "Valid"
-
-                cursor.execute("""
-                    INSERT INTO expiry (item, expiry_date, expiry_status)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(item) DO UPDATE SET
-                        expiry_date = excluded.expiry_date,
-                        expiry_status = excluded.expiry_status
-                """, (item_name, expiry_date, expiry_status))
-            else:
-                # If no date provided, set status to N/A
-                cursor.execute("""
-                    INSERT INTO expiry (item, expiry_date, expiry_status)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(item) DO UPDATE SET
-                        expiry_date = excluded.expiry_date,
-                        expiry_status = excluded.expiry_status
-                """, (item_name, '', 'N/A'))
-
-    conn.commit()
-    conn.close()
+    try:
+        changed = save_expiry_dates(get_connection(), form_expiry_dates(request.form))
+    except ValueError as e:
+        flash(f'⚠️ {e}')
+        return redirect(url_for('shop.expiry_status'))
 
-    log_activity("UPDATE EXPIRY", "Auto-updated expiry information via form")
+    if changed:
+        log_activity("UPDATE EXPIRY", f"Updated expiry information for {changed} item(s) via form")
     flash("Expiry data updated successfully!", "success")
-    return redirect(url_for('expiry_status'))
+    return redirect(url_for('shop.expiry_status'))
 
-@app.route('/update-item-price', methods=['POST'])
+@bp.route('/api/expiry')
+def api_expiry():
+    """
+    Items expiring within the next N days, soonest first, e.g.
+    /api/expiry?within_days=14 (default 30); add include_expired=1 for expired items too.
+    """
+    try:
+        days = request.args.get('within_days', 30, type=int)
+        items = expiring_within(get_connection(), days,
+                                include_expired=request.args.get('include_expired') in ('1', 'true'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'within_days': days, 'count': len(items), 'items': items})
+
+@bp.route('/update-item-price', methods=['POST'])
 def update_item_price():
     conn = get_connection()
     cursor = conn.cursor()
@@ -750,15 +727,17 @@ def update_item_price():
 
             # Update item table
             cursor.execute('UPDATE items SET price_per_pc_or_kg = ? WHERE id = ?', (new_price, item_id))
-            log_activity("PRICE CHANGE", f'{item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
+            activity_log.record(conn, "PRICE CHANGE",
+                                f'{item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
 
     conn.commit()
     conn.close()
 
     flash("Price updated and variation recorded!", "success")
-    return redirect(url_for('index'))
+    return redirect(url_for('shop.index'))
 
-@app.route('/price-variation')
+@bp.route('/price-variation')
+@response_cache.cached
 def price_variation():
     conn = get_connection()
     c = conn.cursor()
@@ -791,64 +770,40 @@ def price_variation():
 
     return render_template('price_variation.html', data=data)
 
-@app.route('/download-price-variation')
+@bp.route('/download-price-variation')
 def download_price_variation():
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        SELECT i.item, i.description, pv.old_price, pv.new_price, pv.change_date
-        FROM price_variations pv
-        JOIN items i ON pv.item_id = i.id
-        ORDER BY i.item, pv.change_date
-    ''')
-    rows = c.fetchall()
-    conn.close()
+    # Kept for existing links; streams the same CSV as /export/price-variation.csv
+    return export_report('price-variation', 'csv')
 
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ITEM', 'DESCRIPTION', 'OLD PRICE', 'NEW PRICE', 'CHANGE DATE'])
-    writer.writerows(rows)
-    output.seek(0)
-
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='price_variation_report.csv'
-    )
-
-@app.route('/substitutes')
+# ------------------ EXPORTS ------------------
+@bp.route('/export/<report>.<fmt>')
+def export_report(report, fmt):
+    """
+    Stream a report (price-variation, sales, items, activities) as csv or xlsx,
+    e.g. /export/sales.xlsx?from=2025-11-01&to=2025-11-30. Both formats are
+    sent while the rows are read, so the download starts at once (see exports.py).
+    400 for an unknown report or format, or a bad date range.
+    """
+    try:
+        chunks, mimetype, filename = stream_export(get_connection(), report, fmt, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # stream_with_context keeps the request's pooled connection until the last chunk is sent
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/substitutes')
+@response_cache.cached
 def substitutes():
+    # Read-only: the write paths refresh families; items changed outside the app
+    # stay pending until `python families.py` runs
     conn = get_connection()
-    c = conn.cursor()
-
-    # Fetch all items
-    c.execute('SELECT item, total_quantity_available FROM items')
-    rows = c.fetchall()
+    substitutes_data = families.family_summary(conn)
     conn.close()
-
-    from collections import defaultdict
-    import re
-
-    substitutes_data = defaultdict(lambda: {'frequency': 0, 'total_quantity': 0})
-
-    for item, qty in rows:
-        # Convert to uppercase for consistency
-        item_upper = item.upper().strip()
-
-        # Remove color/variant words: take first word(s) before common separators
-        # Adjust this regex to capture "TOSS" from "Toss yellow", "Toss Blue 500g", etc.
-        base_name_match = re.match(r'^([A-Z]+)', re.sub(r'[^A-Za-z\s]', '', item_upper))
-        base_name = base_name_match.group(1) if base_name_match else item_upper
-
-        substitutes_data[base_name]['frequency'] += 1
-        substitutes_data[base_name]['total_quantity'] += qty
-
     return render_template('substitutes.html', data=substitutes_data)
 
 
-@app.route('/delete-price-variation/<int:variation_id>', methods=['POST'])
+@bp.route('/delete-price-variation/<int:variation_id>', methods=['POST'])
 def delete_price_variation(variation_id):
     conn = get_connection()
     c = conn.cursor()
@@ -862,23 +817,79 @@ def delete_price_variation(variation_id):
     ''', (variation_id,))
     deleted_entry = c.fetchone()
 
-    # Delete the entry
+    # Delete the entry (and log it in the same transaction)
     c.execute('DELETE FROM price_variations WHERE id = ?', (variation_id,))
-    conn.commit()
-
     if deleted_entry:
         item_name, old_price, new_price = deleted_entry
         activity_desc = f"Deleted price variation for {item_name}: {old_price} → {new_price}"
-        # Use helper for consistent logging
-        log_activity("PRICE VARIATION DELETED", activity_desc)
-
+        activity_log.record(conn, "PRICE VARIATION DELETED", activity_desc)
+    conn.commit()
     conn.close()
     flash('Price variation entry deleted successfully!')
-    return redirect(url_for('price_variation'))
+    return redirect(url_for('shop.price_variation'))
+
+# ------------------ APP FACTORY ------------------
+# Importing this module only defines the routes: no database access, no
+# threads, and no pandas/openpyxl (those load inside the upload and export
+# paths). create_app() does the one-time work for a process: it creates
+# the schema and applies migrations once per database path, wires up the
+# cache, activity log and job workers, and registers the routes.
+# Production serving goes through wsgi.py (gunicorn.conf.py / waitress);
+# `python app.py` and `flask --app app run` start the development server.
+_initialized_dbs = set()
+
+
+def init_schema():
+    """
+    Create tables and apply any pending migrations (upgrades old shop.db
+    files in place), once per process and database. Processes starting
+    together take turns on the startup lock; only the first has work to do.
+    """
+    if DB_PATH in _initialized_dbs:
+        return
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    with startup_lock(DB_PATH):
+        init_db()
+    _initialized_dbs.add(DB_PATH)
+
+
+def create_app(config=None):
+    """
+    Build the Flask app. `config` keys: DB_PATH, UPLOAD_DIR, SECRET_KEY,
+    START_JOBS (False skips the background job workers, e.g. for scripts).
+    """
+    global DB_PATH, UPLOAD_DIR
+    config = dict(config or {})
+    if config.get('DB_PATH'):
+        DB_PATH = config['DB_PATH']
+        UPLOAD_DIR = config.get('UPLOAD_DIR') or os.path.join(os.path.dirname(DB_PATH), 'uploads')
+    elif config.get('UPLOAD_DIR'):
+        UPLOAD_DIR = config['UPLOAD_DIR']
+
+    app = Flask(__name__, template_folder='Templates')
+    app.secret_key = config.get('SECRET_KEY') or os.environ.get('SHOP_SECRET_KEY') or "supersecretkey"
+    app.config.update({key: value for key, value in config.items() if key.isupper()})
+    # Request timing hooks go first so they run before any other before_request
+    metrics.init_app(app)
+    # Opt-in request profiler and the slow-query log (see profiling.py)
+    profiling.init_app(app, get_connection, os.path.dirname(DB_PATH))
+    app.register_blueprint(bp)
+    app.teardown_appcontext(release_connection)
+
+    init_schema()
+
+    # Cached report pages read the data version through the request's connection
+    response_cache.configure(get_connection)
+    # The activity log writes through connections of its own, never the request's:
+    # its commit must not commit a route's half-done transaction
+    activity_log.configure(lambda: get_connection(request_scoped=False))
+    # Background workers for uploads and reports; resumes jobs left over from a restart
+    if config.get('START_JOBS', True):
+        jobs.start(get_connection)
+    return app
+
 
 # ------------------ RUN APP ------------------
-app = Flask(__name__)
-# … your routes …
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
 
@@ -0,0 +1,2 @@
+# Benchmarks for Shop Manager. Run from the Shop_Manager directory, e.g.
+#   python -m benchmarks.bench_indexes
@@ -0,0 +1,127 @@
+"""
+Activity logging cost on the write path: several threads run sale-shaped
+transactions (stock UPDATE + sales INSERT, one commit) and log each one
+with a different logger:
+
+  connect  - the old log_activity(): fresh connection, one commit per event
+  sync     - activity_log.write_now(): pooled connection, one commit per event
+  async    - activity_log.log(): queued, written in batches by the background thread
+  inline   - activity_log.record(): written inside the sale's own transaction
+
+Prints sales/s per logger and the writer's queue/flush metrics, and checks
+that every event reached the activities table.
+
+    python -m benchmarks.bench_activity_log --threads 8 --sales 500
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import db
+
+
+def create_db(path):
+    import app
+    app.DB_PATH = path
+    app.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
+        VALUES (?, ?, '', 10, 1000000, 10000000)
+    ''', [(i, f'ITEM {i}') for i in range(1, 11)])
+    conn.commit()
+    conn.close()
+
+
+def connect_log(path, action, details):
+    """The pre-queue log_activity()."""
+    conn = sqlite3.connect(path, timeout=5)
+    conn.execute("INSERT INTO activities (action, details, date) VALUES (?, ?, ?)",
+                 (action, details, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    conn.close()
+
+
+def sale(path, item_id, logger):
+    import activity_log
+    conn = db.acquire(path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('''
+            UPDATE items SET total_quantity_available = total_quantity_available - 1,
+                             total_stock_amount = (total_quantity_available - 1) * price_per_pc_or_kg
+            WHERE id = ?
+        ''', (item_id,))
+        conn.execute('INSERT INTO sales (item_id, quantity_sold, total_amount) VALUES (?, 1, 10)', (item_id,))
+        if logger == 'inline':
+            activity_log.record(conn, 'SALE', f'Sold 1 unit of item {item_id}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        db.release(conn)
+
+    if logger == 'connect':
+        connect_log(path, 'SALE', f'Sold 1 unit of item {item_id}')
+    elif logger == 'sync':
+        activity_log.write_now('SALE', f'Sold 1 unit of item {item_id}')
+    elif logger == 'async':
+        activity_log.log('SALE', f'Sold 1 unit of item {item_id}')
+
+
+def run(logger, path, args):
+    import activity_log
+    errors = []
+
+    def till(thread_no):
+        for _ in range(args.sales):
+            try:
+                sale(path, thread_no % 10 + 1, logger)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=till, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    activity_log.flush()
+
+    conn = sqlite3.connect(path)
+    sales = conn.execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+    logged = conn.execute("SELECT COUNT(*) FROM activities WHERE action = 'SALE'").fetchone()[0]
+    conn.close()
+    print(f"{logger:<8} {sales / elapsed:9.1f} sales/s  {len(errors)} lock errors  "
+          f"{logged}/{sales} events logged {'OK' if logged == sales else 'MISSING'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sales', type=int, default=500, help='sales per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'bootstrap.db')
+        import activity_log
+        for logger in ('connect', 'sync', 'async', 'inline'):
+            path = os.path.join(tmp, f'{logger}.db')
+            create_db(path)
+            activity_log.configure(lambda path=path: db.acquire(path))
+            run(logger, path, args)
+        stats = activity_log.stats()
+        print(f"async writer: {stats['batches']} batches, max queue depth {stats['max_queue_depth']}, "
+              f"flush avg {stats['avg_flush_ms']:.2f} ms / max {stats['max_flush_ms']:.2f} ms")
+        activity_log.stop()
+        db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Report pages with and without the response cache: times /statistics,
+/price-variation, /substitutes and /expiry-status on a synthetic shop,
+uncached (every request re-renders), cached (repeat views) and as 304
+revalidations, then prints the cache counters.
+
+    python -m benchmarks.bench_cache --items 20000 --sales 200000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+ROUTES = ['/statistics', '/price-variation', '/substitutes', '/expiry-status']
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--sales', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        import response_cache
+        from benchmarks.synthetic import populate
+
+        flask_app = app.create_app()
+        conn = sqlite3.connect(app.DB_PATH)
+        populate(conn, items=args.items, sales=args.sales)
+        conn.close()
+
+        client = flask_app.test_client()
+        print(f"{'route':<18} {'uncached':>9} {'cached':>9} {'304':>9}  (ms, median)")
+        for route in ROUTES:
+            response_cache.CACHE_ENABLED = False
+            uncached = median_ms(lambda: client.get(route), args.repeat)
+            response_cache.CACHE_ENABLED = True
+            etag = client.get(route).headers['ETag']
+            cached = median_ms(lambda: client.get(route), args.repeat)
+            revalidated = median_ms(lambda: client.get(route, headers={'If-None-Match': etag}), args.repeat)
+            print(f"{route:<18} {uncached:9.2f} {cached:9.2f} {revalidated:9.2f}")
+        print(response_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Concurrent tills benchmark: N threads POSTing /sell/<id> while M threads
+load the dashboard, once with a fresh connection per request (SHOP_DB_POOL=0,
+rollback journal, as before pooling) and once with the pooled WAL connections.
+
+    python -m benchmarks.bench_concurrency --sellers 4 --readers 4 --seconds 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def worker(flask_app, kind, item_count, deadline, results, seed):
+    rng = random.Random(seed)
+    client = flask_app.test_client()
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if kind == 'sell':
+            response = client.post(f'/sell/{rng.randint(1, item_count)}', data={'quantity_sold': '1'})
+        else:
+            response = client.get('/')
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 500:
+            errors += 1
+    results.append((kind, latencies, errors))
+
+
+def run_mode(app_module, db_module, label, pooled, db_path, args):
+    from benchmarks.synthetic import populate
+
+    db_module.close_all()
+    db_module.POOL_ENABLED = pooled
+    flask_app = app_module.create_app({'DB_PATH': db_path})
+    conn = sqlite3.connect(db_path)
+    if not pooled:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    populate(conn, items=args.items, sales=args.sales, variations=100, activities=1000)
+    conn.close()
+
+    results = []
+    deadline = time.perf_counter() + args.seconds
+    threads = [threading.Thread(target=worker, args=(flask_app, 'sell', args.items, deadline, results, i))
+               for i in range(args.sellers)]
+    threads += [threading.Thread(target=worker, args=(flask_app, 'dashboard', args.items, deadline, results, i))
+                for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"\n{label}")
+    for kind in ('sell', 'dashboard'):
+        latencies = [ms for k, lat, _ in results if k == kind for ms in lat]
+        errors = sum(e for k, _, e in results if k == kind)
+        print(f"  {kind:<10} {len(latencies) / args.seconds:8.1f} req/s  "
+              f"p50 {statistics.median(latencies) if latencies else 0:7.1f} ms  "
+              f"p95 {percentile(latencies, 95):7.1f} ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sellers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'legacy.db')
+        os.environ['SHOP_DB_POOL'] = '0'
+        import app
+        import db
+
+        run_mode(app, db, 'connect-per-request (rollback journal)', False, os.path.join(tmp, 'legacy.db'), args)
+        run_mode(app, db, 'pooled connections (WAL)', True, os.path.join(tmp, 'pooled.db'), args)
+        db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Dashboard cost versus history size: renders / for shops with more and more
+sales and checks the trigger-maintained aggregates against a full
+recomputation afterwards. With summary tables the timing should stay flat.
+
+    python -m benchmarks.bench_dashboard --sales 1000,100000,1000000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--sales', default='1000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'bootstrap.db')
+        import app
+        import summary
+        from benchmarks.synthetic import populate
+
+        client = app.create_app().test_client()
+        print(f"{'sales':>10} {'/':>9} {'/statistics':>12} {'populate s':>11}  consistent")
+        for sales in (int(s) for s in args.sales.split(',')):
+            app.DB_PATH = os.path.join(tmp, f'shop_{sales}.db')
+            app.init_db()
+            conn = sqlite3.connect(app.DB_PATH)
+            start = time.perf_counter()
+            populate(conn, items=args.items, sales=sales, variations=0, activities=1000)
+            populate_s = time.perf_counter() - start
+            problems = summary.check(conn)
+            conn.close()
+
+            index_ms = median_ms(lambda: client.get('/'), args.repeat)
+            stats_ms = median_ms(lambda: client.get('/statistics'), args.repeat)
+            print(f"{sales:>10,} {index_ms:9.2f} {stats_ms:12.2f} {populate_s:11.1f}  "
+                  f"{'yes' if not problems else f'NO ({len(problems)} mismatches)'}")
+
+
+if __name__ == '__main__':
+    main()
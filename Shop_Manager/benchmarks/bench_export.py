@@ -0,0 +1,68 @@
+"""
+Export memory and latency: streams the sales and activity reports as CSV
+and XLSX from a synthetic shop and reports time to first chunk, total time
+and peak Python heap (tracemalloc, in a second pass) while streaming. Peak memory should not
+grow with the number of rows.
+
+    python -m benchmarks.bench_export --sales 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+
+def stream(client, url):
+    """(seconds to first chunk, total seconds, bytes) for one streamed download."""
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    total = time.perf_counter() - start
+    return first or total, total, size
+
+
+def measure(client, url):
+    # Timed without tracemalloc (it slows allocation-heavy code a lot), then traced for the peak
+    first, total, size = stream(client, url)
+    tracemalloc.start()
+    stream(client, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--sales', type=int, default=1000000)
+    parser.add_argument('--activities', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        from benchmarks.synthetic import populate
+
+        flask_app = app.create_app()
+        conn = sqlite3.connect(app.DB_PATH)
+        populate(conn, items=args.items, sales=args.sales, variations=1000, activities=args.activities)
+        conn.close()
+
+        client = flask_app.test_client()
+        print(f"{'export':<40} {'first ms':>9} {'total s':>8} {'peak MB':>8} {'size MB':>8}")
+        for url in ['/export/sales.csv?from=2000-01-01', '/export/sales.xlsx?from=2000-01-01',
+                    '/export/activities.csv', '/export/items.xlsx', '/download-price-variation']:
+            first, total, peak, size = measure(client, url)
+            print(f"{url:<40} {first * 1000:9.1f} {total:8.2f} {peak / 2**20:8.1f} {size / 2**20:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Query-plan and latency comparison for the hot route queries, before and
+after the schema migrations.
+
+    python -m benchmarks.bench_indexes --items 20000 --sales 300000
+
+A synthetic database is built in a temp directory, stripped back to a
+legacy (user_version 0, no indexes) shop.db, measured, upgraded in place
+with migrations.migrate(), and measured again.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from reports import day_window
+
+# Reporting queries that must be answered with an index range scan
+RANGE_SCAN_ROUTES = ['/ (sales today)', '/ (new stock today)', '/sales-today', '/added-stock']
+
+
+def route_queries(sample_item):
+    """The SQL each route issues, in the form app.py runs it."""
+    today = day_window()
+    return {
+        '/ (sales today)': ('SELECT SUM(total_amount) FROM sales WHERE date >= ? AND date < ?', today),
+        '/ (new stock today)': ('SELECT COUNT(*) FROM items WHERE date_added >= ? AND date_added < ?', today),
+        '/upload (row lookup)': ('SELECT id, price_per_pc_or_kg FROM items WHERE item = ?', (sample_item,)),
+        '/sales-today': ('''
+            SELECT i.item, s.quantity_sold, i.price_per_pc_or_kg, s.total_amount
+            FROM sales s JOIN items i ON s.item_id = i.id
+            WHERE s.date >= ? AND s.date < ?''', today),
+        '/added-stock': ('''
+            SELECT item, description, price_per_pc_or_kg, total_quantity_available
+            FROM items WHERE date_added >= ? AND date_added < ?''', today),
+        '/statistics (action counts)': (
+            'SELECT action, COUNT(*) FROM activities GROUP BY action ORDER BY COUNT(*) DESC', ()),
+        '/statistics (top items)': ('''
+            SELECT i.item, SUM(s.quantity_sold), SUM(s.total_amount)
+            FROM sales s JOIN items i ON s.item_id = i.id
+            GROUP BY i.item ORDER BY 3 DESC LIMIT 10''', ()),
+        '/price-variation': ('''
+            SELECT pv.id, i.item, i.description, pv.old_price, pv.new_price, pv.change_date
+            FROM price_variations pv JOIN items i ON pv.item_id = i.id
+            ORDER BY i.item, pv.change_date''', ()),
+    }
+
+
+def query_plan(conn, sql, params):
+    return '; '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+
+def time_query(conn, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def measure(conn, queries, repeat):
+    return {name: (query_plan(conn, sql, params), time_query(conn, sql, params, repeat))
+            for name, (sql, params) in queries.items()}
+
+
+def strip_to_legacy(conn):
+    """Drop the migration-managed indexes so the file looks like an old shop.db."""
+    names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'")]
+    for name in names:
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute('DROP TABLE IF EXISTS sqlite_stat1')
+    # Migration 8 folds the old name-keyed expiry table into the item_id-keyed one
+    conn.execute('DROP TRIGGER IF EXISTS trg_items_expiry_delete')
+    conn.execute('DROP TABLE IF EXISTS expiry')
+    conn.execute('CREATE TABLE expiry (item TEXT PRIMARY KEY, expiry_date TEXT, expiry_status TEXT)')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--sales', type=int, default=300000)
+    parser.add_argument('--variations', type=int, default=20000)
+    parser.add_argument('--activities', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        from migrations import migrate
+        app.create_app()  # creates the schema on the scratch database
+        from benchmarks.synthetic import populate
+
+        conn = sqlite3.connect(app.DB_PATH)
+        names = populate(conn, items=args.items, sales=args.sales,
+                         variations=args.variations, activities=args.activities)
+        queries = route_queries(names[len(names) // 2])
+
+        strip_to_legacy(conn)
+        before = measure(conn, queries, args.repeat)
+        start = time.perf_counter()
+        applied = migrate(conn)
+        print(f"Migrated in place to versions {applied} in {time.perf_counter() - start:.2f}s\n")
+        after = measure(conn, queries, args.repeat)
+        conn.close()
+
+    for name in queries:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f"{name}")
+        print(f"  before {ms_before:9.2f} ms  {plan_before}")
+        print(f"  after  {ms_after:9.2f} ms  {plan_after}")
+
+    missing = [name for name in RANGE_SCAN_ROUTES if 'USING' not in after[name][0]]
+    if missing:
+        raise SystemExit(f"\nNo index range scan for: {', '.join(missing)}")
+    print("\nAll date-filtered reporting queries use an index range scan.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Listing page cost versus catalogue size: renders /sales and /price-list and
+fetches a deep /api/items page for shops of different sizes. With keyset
+pagination every number should stay flat as the catalogue grows.
+
+    python -m benchmarks.bench_listing --sizes 500,50000,500000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='500,50000,500000')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'bootstrap.db')
+        import app
+        from benchmarks.synthetic import populate
+        from item_listing import encode_cursor
+
+        client = app.create_app().test_client()
+        print(f"{'items':>9} {'/sales':>9} {'/price-list':>12} {'deep page':>10} {'bytes':>8}  (ms, median)")
+        for size in (int(s) for s in args.sizes.split(',')):
+            app.DB_PATH = os.path.join(tmp, f'shop_{size}.db')
+            app.init_db()
+            conn = sqlite3.connect(app.DB_PATH)
+            populate(conn, items=size, sales=0, variations=0, activities=0)
+            conn.close()
+
+            deep = f'/api/items?sort=item&cursor={encode_cursor("TEA", size // 2)}'
+            sales_ms = median_ms(lambda: client.get('/sales'), args.repeat)
+            price_ms = median_ms(lambda: client.get('/price-list'), args.repeat)
+            deep_ms = median_ms(lambda: client.get(deep), args.repeat)
+            size_bytes = len(client.get('/sales').data)
+            print(f"{size:>9,} {sales_ms:9.2f} {price_ms:12.2f} {deep_ms:10.2f} {size_bytes:8,}")
+
+
+if __name__ == '__main__':
+    main()
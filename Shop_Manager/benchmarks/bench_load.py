@@ -0,0 +1,173 @@
+"""
+Load test through a real HTTP server: client threads hit /, /sales and
+POST /sell/<id> for a fixed time and the script reports requests/s and
+p50/p95/p99 latency per route.
+
+By default it builds a synthetic scratch database and starts the
+production server on it (gunicorn with gunicorn.conf.py, or waitress via
+wsgi.py where gunicorn is not available); --url targets a server that is
+already running instead (its items must exist and have stock).
+
+    python -m benchmarks.bench_load --clients 16 --seconds 20 --workers 2 --threads 4
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --items 500
+"""
+import argparse
+import http.client
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ['/', '/sales', '/sell/<id>']
+SELL_BODY = 'quantity_sold=1'
+SELL_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def create_db(path, items, sales):
+    import app
+    from benchmarks.synthetic import populate
+
+    app.create_app({'DB_PATH': path, 'START_JOBS': False})
+    conn = sqlite3.connect(path)
+    populate(conn, items=items, sales=sales, variations=100, activities=1000)
+    # Plenty of stock so every sale succeeds for the whole run
+    conn.execute('UPDATE items SET total_quantity_available = 1000000')
+    conn.commit()
+    conn.close()
+    import db
+    db.close_all()
+
+
+def start_server(server, db_path, port, args):
+    env = dict(os.environ, SHOP_DB_PATH=db_path, PORT=str(port), SHOP_WEB_HOST='127.0.0.1',
+               SHOP_WEB_WORKERS=str(args.workers), SHOP_WEB_THREADS=str(args.threads))
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    else:
+        command = [sys.executable, 'wsgi.py']
+    # Server output goes to a file next to the database (a pipe nobody reads could fill up and block it)
+    log_path = db_path + '.server.log'
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, encoding='utf-8', errors='replace') as log:
+                raise RuntimeError(f"{server} exited:\n{log.read()}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/cache')
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{server} did not start listening on port {port}")
+
+
+def client(host, port, item_count, deadline, seed):
+    """Issue requests on one keep-alive connection until the deadline; returns {route: ([ms], errors)}."""
+    rng = random.Random(seed)
+    results = {route: ([], 0) for route in ROUTES}
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        route = rng.choice(ROUTES)
+        start = time.perf_counter()
+        try:
+            if route == '/sell/<id>':
+                conn.request('POST', f'/sell/{rng.randint(1, item_count)}', SELL_BODY, SELL_HEADERS)
+            else:
+                conn.request('GET', route)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            ok = False
+        latencies, errors = results[route]
+        if ok:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            results[route] = (latencies, errors + 1)
+    conn.close()
+    return results
+
+
+def run_load(host, port, args):
+    deadline = time.perf_counter() + args.seconds
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        futures = [pool.submit(client, host, port, args.items, deadline, seed) for seed in range(args.clients)]
+        per_client = [future.result() for future in futures]
+
+    print(f"{'route':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    everything = []
+    for route in ROUTES:
+        latencies = [ms for results in per_client for ms in results[route][0]]
+        errors = sum(results[route][1] for results in per_client)
+        everything += latencies
+        print(f"{route:<12} {len(latencies) / args.seconds:8.1f} "
+              f"{statistics.median(latencies) if latencies else 0:8.1f} "
+              f"{percentile(latencies, 95):8.1f} {percentile(latencies, 99):8.1f} {errors:7d}")
+    print(f"{'all':<12} {len(everything) / args.seconds:8.1f} "
+          f"{statistics.median(everything) if everything else 0:8.1f} "
+          f"{percentile(everything, 95):8.1f} {percentile(everything, 99):8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--server', choices=['gunicorn', 'waitress'],
+                        default='waitress' if sys.platform == 'win32' else 'gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client connections')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=50000)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.url:
+        target = urlsplit(args.url)
+        print(f"{args.clients} clients against {args.url} for {args.seconds:.0f}s\n")
+        run_load(target.hostname, target.port or 80, args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'shop.db')
+        create_db(db_path, args.items, args.sales)
+        process = start_server(args.server, db_path, args.port, args)
+        try:
+            shape = f"{args.workers} workers x {args.threads} threads" if args.server == 'gunicorn' \
+                else f"{args.threads} threads"
+            print(f"{args.server} ({shape}), {args.clients} clients, {args.seconds:.0f}s\n")
+            run_load('127.0.0.1', args.port, args)
+        finally:
+            process.terminate()
+            process.wait(30)
+        # Every worker's sales must be reflected in the shared summary tables
+        import summary
+        conn = sqlite3.connect(db_path)
+        print(f"\nintegrity: {conn.execute('PRAGMA integrity_check').fetchone()[0]}, "
+              f"summary mismatches: {len(summary.check(conn))}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
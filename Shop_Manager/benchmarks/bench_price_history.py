@@ -0,0 +1,89 @@
+"""
+Price-as-of lookups: prices N random (item, timestamp) pairs three ways and
+checks they agree:
+
+  replay   - load every price variation and walk each item's changes in Python
+  as_of    - price_history.price_as_of(), one index seek per lookup
+  batch    - price_history.prices_as_of(), all lookups in one statement
+
+Also times the window-function summaries over every item.
+
+    python -m benchmarks.bench_price_history --items 5000 --variations 500000 --lookups 2000
+"""
+import argparse
+import bisect
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def replay(conn, lookups):
+    """The old way: read the whole table and replay it per item."""
+    changes = {}
+    for item_id, change_date, old_price, new_price in conn.execute(
+            'SELECT item_id, change_date, old_price, new_price FROM price_variations ORDER BY change_date, id'):
+        changes.setdefault(item_id, []).append((change_date, old_price, new_price))
+    current = dict(conn.execute('SELECT id, price_per_pc_or_kg FROM items'))
+    prices = []
+    for item_id, ts in lookups:
+        history = changes.get(item_id, [])
+        n = bisect.bisect_right([c[0] for c in history], ts)
+        if n:
+            prices.append(history[n - 1][2])
+        elif history:
+            prices.append(history[0][1])
+        else:
+            prices.append(current.get(item_id))
+    return prices
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--variations', type=int, default=500000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        import price_history
+        from benchmarks.synthetic import populate
+
+        app.create_app({'START_JOBS': False})
+        conn = sqlite3.connect(app.DB_PATH)
+        populate(conn, items=args.items, sales=0, variations=args.variations, activities=0)
+
+        rng = random.Random(1)
+        now = datetime.now()
+        lookups = [(rng.randint(1, args.items),
+                    (now - timedelta(seconds=rng.randint(0, 400 * 86400))).strftime('%Y-%m-%d %H:%M:%S'))
+                   for _ in range(args.lookups)]
+
+        expected, replay_ms = timed(lambda: replay(conn, lookups))
+        single, single_ms = timed(lambda: [price_history.price_as_of(conn, item_id, ts) for item_id, ts in lookups])
+        batch, batch_ms = timed(lambda: price_history.prices_as_of(conn, lookups))
+        summaries, summary_ms = timed(lambda: price_history.price_summaries(conn))
+        conn.close()
+
+    print(f"{args.lookups} lookups over {args.variations} variations of {args.items} items")
+    print(f"  {'replay':<8} {replay_ms:9.1f} ms")
+    print(f"  {'as_of':<8} {single_ms:9.1f} ms  ({single_ms * 1000 / args.lookups:.1f} us per lookup)")
+    print(f"  {'batch':<8} {batch_ms:9.1f} ms")
+    print(f"Summaries for {len(summaries)} items: {summary_ms:.1f} ms")
+    if single != expected or batch != expected:
+        raise SystemExit("Price lookups disagree with the replayed history")
+    print("All three agree.")
+
+
+if __name__ == '__main__':
+    main()
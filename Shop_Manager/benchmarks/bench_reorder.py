@@ -0,0 +1,84 @@
+"""
+Replenishment batch at scale: fills a scratch database with --items items
+and --sales sales spread over two years, times replenishment.refresh()
+(load / compute / write), and checks the vectorized figures for a sample
+of items against a plain day-by-day loop over that item's sales.
+
+    python -m benchmarks.bench_reorder --items 100000 --sales 2000000
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def loop_figures(conn, item_id, end_day, span):
+    """One item's 28-day mean/std and EWMA the slow way: a zero-filled daily series."""
+    days = 730
+    series = [0.0] * days
+    for day, quantity in conn.execute('''
+        SELECT substr(date, 1, 10), SUM(quantity_sold) FROM sales
+        WHERE item_id = ? AND date >= ? AND date < ? GROUP BY 1
+    ''', (item_id, (end_day - timedelta(days=days - 1)).isoformat(), (end_day + timedelta(days=1)).isoformat())):
+        series[(date.fromisoformat(day) - (end_day - timedelta(days=days - 1))).days] = quantity
+    alpha, ewma = 2 / (span + 1), 0.0
+    for quantity in series:
+        ewma = alpha * quantity + (1 - alpha) * ewma
+    window = series[-28:]
+    mean = sum(window) / 28
+    std = math.sqrt(max(sum(q * q for q in window) / 28 - mean * mean, 0))
+    return mean, std, ewma
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--sales', type=int, default=2000000)
+    parser.add_argument('--check', type=int, default=200, help='items to verify against the loop')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        import replenishment
+        from benchmarks.synthetic import populate
+
+        app.create_app({'START_JOBS': False})
+        conn = sqlite3.connect(app.DB_PATH, isolation_level=None)
+        start = time.perf_counter()
+        conn.execute('BEGIN')
+        populate(conn, items=args.items, sales=args.sales, variations=0, activities=0, days=730)
+        print(f"Populated {args.items} items / {args.sales} sales in {time.perf_counter() - start:.1f}s")
+
+        import numpy  # noqa: F401  (import cost is not part of the batch)
+        start = time.perf_counter()
+        stats = replenishment.refresh(conn)
+        total = time.perf_counter() - start
+        print(f"refresh: {total:.2f}s total - load {stats['load_ms']:.0f} ms, compute {stats['compute_ms']:.0f} ms, "
+              f"write {stats['write_ms']:.0f} ms; {stats['sales_days']} item-days with sales, "
+              f"{stats['needs_reorder']} items to reorder")
+
+        end_day = date.fromisoformat(stats['end_day'])
+        rng = random.Random(3)
+        mismatches = 0
+        for item_id in rng.sample(range(1, args.items + 1), min(args.check, args.items)):
+            mean, std, ewma = loop_figures(conn, item_id, end_day, replenishment.EWMA_SPAN)
+            stored = conn.execute('''
+                SELECT avg_daily_28d, demand_std_28d, forecast_daily FROM reorder_suggestions WHERE item_id = ?
+            ''', (item_id,)).fetchone()
+            ewma = ewma if ewma >= replenishment.MIN_FORECAST else 0.0
+            if any(abs(a - b) > 0.001 for a, b in zip(stored, (mean, std, ewma))):
+                mismatches += 1
+        conn.close()
+
+    if mismatches:
+        raise SystemExit(f"{mismatches} of {args.check} sampled items differ from the day-by-day loop")
+    print(f"{args.check} sampled items match the day-by-day loop.")
+
+
+if __name__ == '__main__':
+    main()
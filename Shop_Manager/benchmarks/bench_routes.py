@@ -0,0 +1,343 @@
+"""
+Every route at scale: builds (or copies) a seeded synthetic database,
+drives each route of the app through Flask's test client and records
+p50/p95/p99 latency, SQL statements per request (from metrics.py) and the
+peak RSS of the process. Routes that queue a background job (uploads,
+reports, reorder refresh) also record how long the job took.
+
+Results are written as JSON. Given a --baseline from an earlier run, the
+script fails on a regression, i.e. a route whose p95 grew beyond
+--tolerance (and by more than --slack-ms), a route issuing more statements
+per request, or a higher peak RSS beyond --tolerance.
+
+    python -m benchmarks.bench_routes --scale small --save-baseline baseline.json
+    python -m benchmarks.bench_routes --scale small --baseline baseline.json
+    python -m benchmarks.bench_routes --db bench-data/shop.db --routes /sales,/statistics
+
+The response cache is off unless --cache, so cached pages are measured
+doing their work; a --db is copied first, so runs do not change it.
+Streamed exports query while their body is read, after the request hooks,
+so they report no statements.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.bench_load import percentile
+from benchmarks.synthetic import SCALES
+
+# request(i, ctx) -> keyword arguments for the test client's open(); job: the response names a background job
+Case = namedtuple('Case', 'name method rule request job repeat')
+JOB_TIMEOUT = 600  # seconds
+
+
+def case(name, rule, request, method='GET', job=False, repeat=None):
+    return Case(name, method, rule, request, job, repeat)
+
+
+def upload(path):
+    return lambda i, ctx: {'path': '/upload', 'content_type': 'multipart/form-data',
+                           'data': {'file': (open(ctx[path], 'rb'), os.path.basename(ctx[path]))}}
+
+
+def cases():
+    """One or more requests per route, in an order where every request finds the data it needs."""
+    today = date.today()
+    return [
+        case('GET /', '/', lambda i, ctx: {'path': '/'}),
+        case('GET /api/items', '/api/items', lambda i, ctx: {'path': '/api/items?sort=item&limit=100'}),
+        case('GET /api/items?q=', '/api/items', lambda i, ctx: {'path': '/api/items?q=SUGAR&in_stock=1'}),
+        case('GET /api/items/<id>/price-history', '/api/items/<int:item_id>/price-history',
+             lambda i, ctx: {'path': f"/api/items/{ctx['priced'][i % len(ctx['priced'])]}/price-history"}),
+        case('POST /add', '/add', method='POST',
+             request=lambda i, ctx: {'path': '/add', 'data': {'item': f'BENCH ITEM {i}', 'description': 'Benchmark',
+                                                              'price_per_pc_or_kg': '10',
+                                                              'total_quantity_available': '5'}}),
+        case('GET /edit/<id>', '/edit/<int:item_id>', lambda i, ctx: {'path': f"/edit/{ctx['item'](i)}"}),
+        case('POST /update/<id>', '/update/<int:item_id>', method='POST',
+             request=lambda i, ctx: {'path': f"/update/{ctx['item'](i)}",
+                                     'data': {'item': ctx['names'][ctx['item'](i)], 'description': 'Updated',
+                                              'price_per_pc_or_kg': str(100 + i % 7),
+                                              'total_quantity_available': '1000'}}),
+        case('POST /update-item-price', '/update-item-price', method='POST',
+             request=lambda i, ctx: {'path': '/update-item-price',
+                                     'data': {'item_id': ctx['item'](i), 'new_price': str(200 + i % 5)}}),
+        case('GET /price-list', '/price-list', lambda i, ctx: {'path': '/price-list'}),
+        case('GET /upload', '/upload', lambda i, ctx: {'path': '/upload'}),
+        case('POST /upload (csv)', '/upload', upload('upload_csv'), method='POST', job=True, repeat=1),
+        case('POST /upload (xlsx)', '/upload', upload('upload_xlsx'), method='POST', job=True, repeat=1),
+        case('GET /api/jobs/<id>', '/api/jobs/<int:job_id>',
+             lambda i, ctx: {'path': f"/api/jobs/{ctx['job_id'] or 1}"}),
+        case('GET /search', '/search', lambda i, ctx: {'path': '/search?query=SUGAR'}),
+        case('GET /api/search-items', '/api/search-items', lambda i, ctx: {'path': '/api/search-items?q=SUG'}),
+        case('GET /sales', '/sales', lambda i, ctx: {'path': '/sales'}),
+        case('POST /sell/<id>', '/sell/<int:item_id>', method='POST',
+             request=lambda i, ctx: {'path': f"/sell/{ctx['item'](i)}", 'data': {'quantity_sold': '1'}}),
+        case('POST /api/checkout', '/api/checkout', method='POST',
+             request=lambda i, ctx: {'path': '/api/checkout',
+                                     'json': {'lines': [{'item_id': ctx['item'](i * 3 + n), 'quantity': 1}
+                                                        for n in range(3)]}}),
+        case('GET /sales-today', '/sales-today', lambda i, ctx: {'path': '/sales-today'}),
+        case('GET /api/sales/timeseries', '/api/sales/timeseries',
+             lambda i, ctx: {'path': f'/api/sales/timeseries?from={today - timedelta(days=364)}&bucket=week'}),
+        case('GET /added-stock', '/added-stock', lambda i, ctx: {'path': '/added-stock'}),
+        case('GET /statistics', '/statistics', lambda i, ctx: {'path': '/statistics'}),
+        case('POST /api/reports/statistics', '/api/reports/statistics', method='POST', job=True, repeat=3,
+             request=lambda i, ctx: {'path': '/api/reports/statistics'}),
+        case('GET /api/activity-log', '/api/activity-log', lambda i, ctx: {'path': '/api/activity-log'}),
+        case('GET /api/cache', '/api/cache', lambda i, ctx: {'path': '/api/cache'}),
+        case('GET /metrics', '/metrics', lambda i, ctx: {'path': '/metrics'}),
+        case('GET /api/metrics', '/api/metrics', lambda i, ctx: {'path': '/api/metrics'}),
+        case('POST /api/reorder/refresh', '/api/reorder/refresh', method='POST', job=True, repeat=3,
+             request=lambda i, ctx: {'path': '/api/reorder/refresh'}),
+        case('GET /api/reorder', '/api/reorder', lambda i, ctx: {'path': '/api/reorder?limit=100'}),
+        case('POST /update-expiry', '/update-expiry', method='POST',
+             request=lambda i, ctx: {'path': '/update-expiry',
+                                     'data': {f"expiry_date_{ctx['item'](i * 20 + n)}":
+                                              str(today + timedelta(days=(i + n) % 60)) for n in range(20)}}),
+        case('GET /expiry-status', '/expiry-status', lambda i, ctx: {'path': '/expiry-status'}),
+        case('GET /api/expiry', '/api/expiry', lambda i, ctx: {'path': '/api/expiry?within_days=30'}),
+        case('GET /price-variation', '/price-variation', lambda i, ctx: {'path': '/price-variation'}),
+        case('GET /download-price-variation', '/download-price-variation',
+             lambda i, ctx: {'path': '/download-price-variation'}),
+        case('GET /export/sales.csv', '/export/<report>.<fmt>',
+             lambda i, ctx: {'path': f'/export/sales.csv?from={today - timedelta(days=29)}'}),
+        case('GET /export/items.xlsx', '/export/<report>.<fmt>', lambda i, ctx: {'path': '/export/items.xlsx'}),
+        case('GET /substitutes', '/substitutes', lambda i, ctx: {'path': '/substitutes'}),
+        case('POST /delete-price-variation/<id>', '/delete-price-variation/<int:variation_id>', method='POST',
+             request=lambda i, ctx: {'path': f"/delete-price-variation/{ctx['variations'].pop()}"}),
+        case('GET /delete/<id>', '/delete/<int:item_id>',
+             lambda i, ctx: {'path': f"/delete/{ctx['doomed'].pop()}"}),
+    ]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where it cannot be read)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)  # bytes on macOS, KB elsewhere
+
+
+def context(db_path, data_dir, requests):
+    """Ids the cases draw from; items that get deleted are kept apart from those that are sold or edited."""
+    conn = sqlite3.connect(db_path)
+    items = [row[0] for row in conn.execute('SELECT id FROM items ORDER BY id')]
+    doomed, items = items[-requests:], items[:-requests]
+    names = dict(conn.execute('SELECT id, item FROM items'))
+    priced = [row[0] for row in conn.execute('SELECT DISTINCT item_id FROM price_variations LIMIT 1000')]
+    variations = [row[0] for row in conn.execute('SELECT id FROM price_variations ORDER BY id DESC LIMIT ?',
+                                                 (requests * 2,))]
+    sellable = items[:1000]
+    # Plenty of stock on the items the run sells, so every sale goes through
+    conn.execute('UPDATE items SET total_quantity_available = 1000000 WHERE id <= ?', (sellable[-1],))
+    conn.commit()
+    conn.close()
+    return {
+        'item': lambda i: sellable[(i * 7919) % len(sellable)],
+        'names': names,
+        'priced': priced or sellable,
+        'variations': variations,
+        'doomed': doomed,
+        'job_id': None,
+        'upload_csv': os.path.join(data_dir, 'upload.csv'),
+        'upload_xlsx': os.path.join(data_dir, 'upload.xlsx'),
+    }
+
+
+def table_counts(db_path, data_dir):
+    """The size of the data set, recorded with the results so only like runs are compared."""
+    conn = sqlite3.connect(db_path)
+    counts = {key: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for key, table in (('items', 'items'), ('sales', 'sales'), ('variations', 'price_variations'),
+                                 ('activities', 'activities'))}
+    conn.close()
+    with open(os.path.join(data_dir, 'upload.csv'), encoding='utf-8') as f:
+        counts['upload_rows'] = sum(1 for _ in f) - 1
+    return counts
+
+
+def job_id_of(response):
+    if response.is_json:
+        return (response.get_json() or {}).get('job_id')
+    return int(parse_qs(urlsplit(response.headers.get('Location', '')).query).get('job', ['0'])[0]) or None
+
+
+def wait_for_job(client, job_id):
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise RuntimeError(f'Job {job_id} did not finish within {JOB_TIMEOUT}s')
+
+
+def run_case(client, metrics, current, ctx, args):
+    """Issue the case's requests (at least one, then until --requests or --route-seconds); returns its results."""
+    metrics.reset()
+    rss_before = peak_rss_mb()
+    latencies, job_ms, statuses = [], [], {}
+    repeat = current.repeat or args.requests
+    deadline = time.perf_counter() + args.route_seconds
+    for i in range(repeat):
+        kwargs = current.request(i, ctx)
+        start = time.perf_counter()
+        response = client.open(method=current.method, **kwargs)
+        response.get_data()  # streamed exports are only produced while they are read
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        response.close()
+        if current.job:
+            job_id = job_id_of(response)
+            ctx['job_id'] = job_id
+            job = wait_for_job(client, job_id)
+            if job['status'] != 'done':
+                raise RuntimeError(f"{current.name}: job {job_id} failed: {job['error']}")
+            job_ms.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() > deadline:
+            break
+
+    route = next((r for r in metrics.summary(top=3)['routes']
+                  if r['route'] == current.rule and r['method'] == current.method), {})
+    result = {
+        'requests': len(latencies),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_per_request': route.get('queries_per_request'),
+        'top_statements': [s['statement'] for s in route.get('top_statements', [])],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if rss_before is not None:
+        result['rss_growth_mb'] = round(result['peak_rss_mb'] - rss_before, 1)
+    if job_ms:
+        result['job_p50_ms'] = round(statistics.median(job_ms), 2)
+    return result
+
+
+def compare(results, baseline, args):
+    """Regressions of `results` against `baseline`, as printable lines."""
+    problems = []
+    if baseline.get('scale') != results['scale']:
+        raise SystemExit(f"Baseline was recorded at {baseline.get('scale')}, this run is {results['scale']}")
+    for name, now in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + args.tolerance) and now['p95_ms'] - before['p95_ms'] > args.slack_ms:
+            problems.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if (now['queries_per_request'] or 0) > (before['queries_per_request'] or 0) + 0.5:
+            problems.append(f"{name}: {before['queries_per_request']} -> {now['queries_per_request']} "
+                            f"statements per request")
+    if baseline.get('peak_rss_mb') and results['peak_rss_mb'] and \
+            results['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + args.tolerance):
+        problems.append(f"peak RSS {baseline['peak_rss_mb']} -> {results['peak_rss_mb']} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--db', help='a database made by `python -m benchmarks.synthetic` (with its upload files)')
+    parser.add_argument('--requests', type=int, default=20, help='requests per route')
+    parser.add_argument('--route-seconds', type=float, default=10, help='stop a route early after this long')
+    parser.add_argument('--routes', help='comma-separated substrings; only matching cases run')
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--baseline', help='fail on regressions against this earlier output')
+    parser.add_argument('--save-baseline', help='also write the results here')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 / peak RSS growth (0.25 = 25%%)')
+    parser.add_argument('--slack-ms', type=float, default=5, help='p95 growth below this is never a regression')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'shop.db')
+        # Before anything imports the app modules, which read their settings at import
+        os.environ.update(SHOP_DB_PATH=db_path, SHOP_METRICS='1', SHOP_SLOW_QUERY_MS='0',
+                          SHOP_CACHE='1' if args.cache else '0')
+        start = time.perf_counter()
+        if args.db:
+            source_dir = os.path.dirname(os.path.abspath(args.db))
+            for name in ('upload.csv', 'upload.xlsx'):
+                shutil.copy(os.path.join(source_dir, name), tmp)
+            source = sqlite3.connect(args.db)
+            target = sqlite3.connect(db_path)
+            source.backup(target)  # consistent even with a -wal file next to it
+            source.close()
+            target.close()
+        else:
+            from benchmarks.synthetic import build_db, write_upload_files
+
+            sizes = dict(SCALES[args.scale])
+            upload_rows = sizes.pop('upload_rows')
+            names = build_db(db_path, **sizes)
+            write_upload_files(tmp, upload_rows, names)
+        scale = table_counts(db_path, tmp)
+        print(f"Database ready in {time.perf_counter() - start:.1f}s: {scale}")
+
+        import activity_log
+        import app
+        import db
+        import jobs
+        import metrics
+
+        client = app.create_app({'DB_PATH': db_path}).test_client()
+        ctx = context(db_path, tmp, args.requests)
+        selected = [current for current in cases()
+                    if not args.routes or any(part in current.name for part in args.routes.split(','))]
+        covered = {current.rule for current in cases()}
+        uncovered = sorted(rule.rule for rule in client.application.url_map.iter_rules()
+                           if rule.endpoint != 'static' and rule.rule not in covered)
+        if uncovered:
+            print(f"⚠️ Routes without a benchmark case: {', '.join(uncovered)}")
+
+        results = {'scale': scale, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                   'cache': args.cache, 'routes': {}}
+        print(f"\n{'route':<40} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'job ms':>9}")
+        for current in selected:
+            gc.collect()
+            result = results['routes'][current.name] = run_case(client, metrics, current, ctx, args)
+            job = f"{result['job_p50_ms']:9.1f}" if 'job_p50_ms' in result else f"{'':9}"
+            print(f"{current.name:<40} {result['requests']:4d} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+                  f"{result['p99_ms']:9.1f} {result['queries_per_request'] or 0:8.1f} {job}")
+        results['peak_rss_mb'] = peak_rss_mb()
+        print(f"\npeak RSS: {results['peak_rss_mb']} MB")
+        jobs.shutdown()
+        activity_log.stop()
+        db.close_all()
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), args)
+        if problems:
+            raise SystemExit('Regressions against the baseline:\n  ' + '\n  '.join(problems))
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == '__main__':
+    main()
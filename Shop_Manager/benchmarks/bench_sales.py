@@ -0,0 +1,136 @@
+"""
+Sale engine stress test: many threads sell the same few items until stock
+runs out. Compares the old read-check-write sequence (SELECT, check in
+Python, UPDATE remaining, INSERT sale, commit, separate log connection)
+with sale_engine.record_sale(), and verifies that stock never goes
+negative and that every unit sold is accounted for.
+
+    python -m benchmarks.bench_sales --threads 8 --items 5 --stock 2000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import db
+from sale_engine import SaleError, record_sale
+
+
+def create_db(path, items, stock):
+    os.environ['SHOP_DB_PATH'] = path
+    import app
+    app.DB_PATH = path
+    app.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
+        VALUES (?, ?, '', 10, ?, ?)
+    ''', [(i, f'ITEM {i}', stock, stock * 10) for i in range(1, items + 1)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_sale(path, item_id, quantity):
+    """The pre-engine sell_item() sequence."""
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    try:
+        item = conn.execute('SELECT item, total_quantity_available, price_per_pc_or_kg FROM items WHERE id = ?',
+                            (item_id,)).fetchone()
+        if not (item and quantity <= item[1]):
+            return False
+        remaining = item[1] - quantity
+        conn.execute('UPDATE items SET total_quantity_available=?, total_stock_amount=? WHERE id=?',
+                     (remaining, remaining * item[2], item_id))
+        conn.execute('INSERT INTO sales (item_id, quantity_sold, total_amount) VALUES (?, ?, ?)',
+                     (item_id, quantity, quantity * item[2]))
+        conn.commit()
+    finally:
+        conn.close()
+    log = sqlite3.connect(path, timeout=5)
+    log.execute("INSERT INTO activities (action, details, date) VALUES (?, ?, ?)",
+                ("SALE", f'Sold {quantity} units of "{item[0]}"', datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    log.commit()
+    log.close()
+    return True
+
+
+def engine_sale(path, item_id, quantity):
+    conn = db.acquire(path)
+    try:
+        record_sale(conn, item_id, quantity)
+        return True
+    except SaleError:
+        return False
+    finally:
+        db.release(conn)
+
+
+def run(label, sell, path, args):
+    counts = {'sold': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def till(thread_no):
+        item_id = thread_no % args.items + 1
+        local = {'sold': 0, 'rejected': 0, 'errors': 0}
+        while local['rejected'] < 3:
+            try:
+                local['sold' if sell(path, item_id, args.quantity) else 'rejected'] += 1
+            except sqlite3.OperationalError:
+                local['errors'] += 1
+                if local['errors'] > 1000:
+                    break
+        with lock:
+            for key in counts:
+                counts[key] += local[key]
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=till, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(path)
+    min_stock = conn.execute('SELECT MIN(total_quantity_available) FROM items').fetchone()[0]
+    remaining = conn.execute('SELECT SUM(total_quantity_available) FROM items').fetchone()[0]
+    sold_qty = conn.execute('SELECT COALESCE(SUM(quantity_sold), 0) FROM sales').fetchone()[0]
+    conn.close()
+    expected = args.items * args.stock
+    consistent = min_stock >= 0 and abs(remaining + sold_qty - expected) < 1e-6
+
+    print(f"\n{label}")
+    print(f"  {counts['sold'] / elapsed:8.1f} sales/s  ({counts['sold']} sales in {elapsed:.2f}s, "
+          f"{counts['errors']} lock errors)")
+    print(f"  min stock {min_stock}, units sold {sold_qty} + remaining {remaining} = {remaining + sold_qty} "
+          f"(expected {expected}) -> {'OK' if consistent else 'INCONSISTENT'}")
+    return consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--stock', type=float, default=2000)
+    parser.add_argument('--quantity', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        engine_path = os.path.join(tmp, 'engine.db')
+        create_db(legacy_path, args.items, args.stock)
+        create_db(engine_path, args.items, args.stock)
+
+        run('read-check-write (legacy sell_item)', legacy_sale, legacy_path, args)
+        ok = run('sale_engine.record_sale (conditional UPDATE, BEGIN IMMEDIATE)', engine_sale, engine_path, args)
+        db.close_all()
+
+    if not ok:
+        raise SystemExit('sale engine left stock inconsistent')
+
+
+if __name__ == '__main__':
+    main()
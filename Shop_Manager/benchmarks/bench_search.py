@@ -0,0 +1,60 @@
+"""
+Item search latency: the old LIKE '%q%' queries against the FTS5 prefix
+search in item_search.py, for autocomplete keystrokes and full searches.
+
+    python -m benchmarks.bench_search --items 100000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+# Successive keystrokes of a till operator typing item names, then rarer
+# searches where LIKE has to scan most of the table before finding 10 rows
+KEYSTROKES = ['s', 'su', 'sug', 'suga', 'sugar', 'sugar 1', 'sugar 1k', 'to', 'tos', 'toss bl', 'omo 5',
+              '4242', 'toss blue 4242', 'nothing here']
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SHOP_DB_PATH'] = os.path.join(tmp, 'shop.db')
+        import app
+        import item_search
+        app.create_app()  # creates the schema on the scratch database
+        from benchmarks.synthetic import populate
+
+        conn = sqlite3.connect(app.DB_PATH)
+        populate(conn, items=args.items, sales=0, variations=0, activities=0)
+
+        print(f"{'query':<16} {'LIKE auto':>10} {'FTS auto':>10} {'LIKE full':>10} {'FTS full':>10}  (ms, median)")
+        for text in KEYSTROKES:
+            like_auto = median_ms(lambda: conn.execute(
+                "SELECT id, item, description FROM items WHERE item LIKE ? LIMIT 10", (f"%{text}%",)).fetchall(),
+                args.repeat)
+            fts_auto = median_ms(lambda: item_search.autocomplete(conn, text, limit=10), args.repeat)
+            like_full = median_ms(lambda: conn.execute(
+                "SELECT * FROM items WHERE item LIKE ? OR description LIKE ?",
+                (f'%{text}%', f'%{text}%')).fetchall(), args.repeat)
+            fts_full = median_ms(lambda: item_search.search_items(conn, text), args.repeat)
+            print(f"{text!r:<16} {like_auto:10.2f} {fts_auto:10.2f} {like_full:10.2f} {fts_full:10.2f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold worker start: what a fresh gunicorn/`flask run` process pays before it
+can serve its first request. Each measurement runs in a new interpreter:
+
+  import     - `python -X importtime -c "import app"`: the slowest imports
+               (cumulative us) and whether pandas/numpy/openpyxl got loaded
+  startup    - `import app; app.create_app()` against an up-to-date scratch
+               database, timed inside the child (median of --runs), next to
+               a bare `import flask` for reference
+  routes     - how many URL rules the app returned by create_app() has
+
+    python -m benchmarks.bench_startup --runs 7 --top 12
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_MS = 200
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+STARTUP_CODE = '''
+import time
+start = time.perf_counter()
+import app
+flask_app = app.create_app({'START_JOBS': False})
+elapsed = (time.perf_counter() - start) * 1000
+import sys
+print(elapsed, len(list(flask_app.url_map.iter_rules())), ','.join(m for m in %r if m in sys.modules))
+''' % (HEAVY_MODULES,)
+
+FLASK_CODE = '''
+import time
+start = time.perf_counter()
+import flask
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+def run_child(args, env):
+    result = subprocess.run([sys.executable] + args, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr}")
+    return result
+
+
+def import_times(env):
+    """{module: (self us, cumulative us)} from one `-X importtime` run."""
+    stderr = run_child(['-X', 'importtime', '-c', 'import app'], env).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SHOP_DB_PATH=os.path.join(tmp, 'shop.db'))
+        # The first start creates the schema and runs every migration; later starts find it up to date
+        run_child(['-c', STARTUP_CODE], env)
+
+        times = import_times(env)
+        print("Slowest imports of `import app` (cumulative ms):")
+        for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda t: -t[1][1])[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f}  {name}")
+        heavy = [name for name in HEAVY_MODULES if name in times]
+        print(f"Heavy modules loaded at import: {', '.join(heavy) or 'none'}\n")
+
+        startups, routes, loaded = [], 0, ''
+        for _ in range(args.runs):
+            elapsed, routes, loaded = (run_child(['-c', STARTUP_CODE], env).stdout.split() + [''])[:3]
+            startups.append(float(elapsed))
+        flask_ms = statistics.median(float(run_child(['-c', FLASK_CODE], env).stdout) for _ in range(args.runs))
+
+    startup_ms = statistics.median(startups)
+    print(f"{'import flask':<34} {flask_ms:8.1f} ms (median)")
+    print(f"{'import app + create_app()':<34} {startup_ms:8.1f} ms (median, min {min(startups):.1f})")
+    print(f"{'  of which the app itself':<34} {startup_ms - flask_ms:8.1f} ms")
+    print(f"Routes registered: {routes}; heavy modules after create_app(): {loaded or 'none'}")
+    print(f"{'OK' if startup_ms < TARGET_MS else 'SLOW'}: target is under {TARGET_MS} ms")
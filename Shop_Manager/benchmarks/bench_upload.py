@@ -0,0 +1,114 @@
+"""
+/upload throughput: the old per-row loop (SELECT + optional price-variation
+INSERT + UPDATE/INSERT + activity INSERT per row) against the staged,
+set-based upload_engine, on generated price lists. Files are written to and
+read back from CSV so parsing is included.
+
+    python -m benchmarks.bench_upload --sizes 10000,100000,1000000 --legacy-max 20000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.synthetic import populate, upload_frame
+from upload_engine import apply_upload
+
+
+def fresh_db(path, items):
+    os.environ['SHOP_DB_PATH'] = path
+    import app
+    app.DB_PATH = path
+    app.init_db()
+    conn = sqlite3.connect(path)
+    names = populate(conn, items=items, sales=0, variations=0, activities=0)
+    return conn, names
+
+
+def legacy_upload(conn, df):
+    """The pre-engine upload_file() loop."""
+    df['TOTAL_STOCK_AMOUNT'] = df['PRICE_PER_PC_OR_KG'] * df['TOTAL_QUANTITY_AVAILABLE']
+    c = conn.cursor()
+
+    def log(action, details):
+        c.execute("INSERT INTO activities (action, details, date) VALUES (?, ?, ?)",
+                  (action, details, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    for _, row in df.iterrows():
+        item_name = str(row['ITEM']).strip()
+        description = str(row.get('DESCRIPTION', '')).strip()
+        new_price = float(row['PRICE_PER_PC_OR_KG'])
+        qty = float(row['TOTAL_QUANTITY_AVAILABLE'])
+        total_amt = float(row['TOTAL_STOCK_AMOUNT'])
+        c.execute('SELECT id, price_per_pc_or_kg FROM items WHERE item = ?', (item_name,))
+        existing = c.fetchone()
+        if existing:
+            item_id, old_price = existing
+            if old_price != new_price:
+                c.execute('INSERT INTO price_variations (item_id, old_price, new_price) VALUES (?, ?, ?)',
+                          (item_id, old_price, new_price))
+                log("PRICE CHANGE", f'{item_name} (id:{item_id}) changed price {old_price:.2f} → {new_price:.2f}')
+            c.execute('''
+                UPDATE items
+                SET description=?, price_per_pc_or_kg=?, total_quantity_available=?, total_stock_amount=?,
+                    date_added=CURRENT_TIMESTAMP
+                WHERE id=?
+            ''', (description, new_price, qty, total_amt, item_id))
+            log("UPDATE ITEM (UPLOAD)", f'Updated "{item_name}" — qty: {qty}, price: {new_price:.2f}')
+        else:
+            c.execute('''
+                INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (item_name, description, new_price, qty, total_amt))
+            log("ADD ITEM (UPLOAD)", f'Inserted "{item_name}" — qty: {qty}, price: {new_price:.2f}')
+    conn.commit()
+
+
+def snapshot(conn):
+    return (conn.execute('SELECT item, description, price_per_pc_or_kg, total_quantity_available FROM items '
+                         'ORDER BY id').fetchall(),
+            conn.execute('SELECT COUNT(*) FROM price_variations').fetchone()[0],
+            conn.execute('SELECT action, details FROM activities ORDER BY id').fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--items', type=int, default=20000, help='items already in the shop')
+    parser.add_argument('--legacy-max', type=int, default=20000, help='skip the old loop above this size')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            csv_path = os.path.join(tmp, f'upload_{size}.csv')
+            conn, names = fresh_db(os.path.join(tmp, f'engine_{size}.db'), args.items)
+            upload_frame(size, names).to_csv(csv_path, index=False)
+
+            start = time.perf_counter()
+            result = apply_upload(conn, pd.read_csv(csv_path))
+            engine_seconds = time.perf_counter() - start
+            print(f"\n{size:,} rows: engine {engine_seconds:7.2f}s  ({size / engine_seconds:,.0f} rows/s, "
+                  f"{result['inserted']:,} new, {result['updated']:,} updated, "
+                  f"{result['price_changes']:,} price changes)")
+
+            if size <= args.legacy_max:
+                legacy_conn, _ = fresh_db(os.path.join(tmp, f'legacy_{size}.db'), args.items)
+                start = time.perf_counter()
+                legacy_upload(legacy_conn, pd.read_csv(csv_path))
+                legacy_seconds = time.perf_counter() - start
+                # Files without repeated item names must end in exactly the same state
+                if pd.read_csv(csv_path)['ITEM'].is_unique:
+                    same = snapshot(legacy_conn) == snapshot(conn)
+                    print(f"  items, price variations and activity log identical to the old loop: {same}")
+                print(f"  old loop {legacy_seconds:7.2f}s  ({size / legacy_seconds:,.0f} rows/s)  "
+                      f"-> {legacy_seconds / engine_seconds:.1f}x faster")
+                legacy_conn.close()
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
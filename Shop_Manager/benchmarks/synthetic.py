@@ -0,0 +1,160 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# ------------------ SYNTHETIC DATA ------------------
+WORDS = ['SUGAR', 'SALT', 'RICE', 'FLOUR', 'SOAP', 'TOSS', 'OMO', 'MILK', 'BREAD', 'TEA',
+         'COFFEE', 'OIL', 'BEANS', 'MAIZE', 'PADS', 'JUICE', 'WATER', 'SODA', 'BISCUITS', 'SWEETS']
+VARIANTS = ['', 'YELLOW', 'BLUE', 'RED', 'WHITE', 'BROWN', 'GREEN']
+SIZES = ['250G', '500G', '1KG', '2KG', '500ML', '1L', '']
+ACTIONS = ['SALE', 'PRICE CHANGE', 'UPDATE ITEM', 'ADD ITEM', 'ADD ITEM (UPLOAD)',
+           'UPDATE ITEM (UPLOAD)', 'UPDATE EXPIRY', 'DELETE ITEM']
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Preset sizes for build_db() / `python -m benchmarks.synthetic --scale ...`
+SCALES = {
+    'small': dict(items=1000, sales=100000, variations=10000, activities=20000, upload_rows=1000),
+    'medium': dict(items=100000, sales=1000000, variations=100000, activities=200000, upload_rows=10000),
+    'large': dict(items=1000000, sales=10000000, variations=1000000, activities=1000000, upload_rows=100000),
+}
+
+
+def item_name(i, rng):
+    parts = [rng.choice(WORDS), rng.choice(VARIANTS), rng.choice(SIZES), str(i)]
+    return ' '.join(p for p in parts if p)
+
+
+def random_ts(rng, now, days):
+    return (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime(TS_FORMAT)
+
+
+def populate(conn, items=1000, sales=10000, variations=1000, activities=10000, days=365, seed=42):
+    """
+    Fill an (already created) shop schema with reproducible synthetic rows.
+    Timestamps are spread over the last `days` days.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    c = conn.cursor()
+
+    item_rows = []
+    for i in range(1, items + 1):
+        price = round(rng.uniform(5, 2000), 2)
+        qty = float(rng.randint(0, 500))
+        item_rows.append((i, item_name(i, rng), rng.choice(WORDS).title() + ' product',
+                          price, qty, price * qty, random_ts(rng, now, days)))
+    c.executemany('''
+        INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available,
+                           total_stock_amount, date_added)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', item_rows)
+
+    prices = {row[0]: row[3] for row in item_rows}
+    c.executemany('INSERT INTO sales (item_id, quantity_sold, total_amount, date) VALUES (?, ?, ?, ?)',
+                  ((item_id, qty, qty * prices[item_id], random_ts(rng, now, days))
+                   for item_id, qty in ((rng.randint(1, items), float(rng.randint(1, 10)))
+                                        for _ in range(sales))))
+
+    c.executemany('INSERT INTO price_variations (item_id, old_price, new_price, change_date) VALUES (?, ?, ?, ?)',
+                  ((item_id, prices[item_id], round(prices[item_id] * rng.uniform(0.8, 1.2), 2),
+                    random_ts(rng, now, days))
+                   for item_id in (rng.randint(1, items) for _ in range(variations))))
+
+    c.executemany('INSERT INTO activities (action, details, date) VALUES (?, ?, ?)',
+                  ((action, f'{action} synthetic event', random_ts(rng, now, days))
+                   for action in (rng.choice(ACTIONS) for _ in range(activities))))
+    conn.commit()
+    return [row[1] for row in item_rows]
+
+
+def upload_frame(rows, existing_names=(), seed=7):
+    """
+    A supplier price list DataFrame in the /upload format. About half the rows
+    re-price items from `existing_names`, the rest are new items.
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    existing_names = list(existing_names)
+    rng.shuffle(existing_names)
+    data = []
+    for i in range(rows):
+        if existing_names and i % 2 == 0:
+            # Cycle through a shuffled copy: names only repeat once all were used
+            name = existing_names[(i // 2) % len(existing_names)]
+        else:
+            name = f'NEW {item_name(i, rng)}'
+        data.append((name, rng.choice(WORDS).title() + ' supply', round(rng.uniform(5, 2000), 2),
+                     float(rng.randint(0, 500))))
+    return pd.DataFrame(data, columns=['ITEM', 'DESCRIPTION', 'PRICE_PER_PC_OR_KG', 'TOTAL_QUANTITY_AVAILABLE'])
+
+
+def build_db(path, items=1000, sales=10000, variations=1000, activities=10000, days=365, seed=42):
+    """
+    Create a complete shop database at `path` from scratch: the base tables
+    are filled first and then migrated, so indexes, rollups, the search
+    index and product families are built in bulk from the data instead of
+    row by row by triggers (the same path an old shop.db takes when it is
+    upgraded). Also computes the reorder suggestions. Returns the item names.
+    """
+    import app
+    import families
+    import replenishment
+    from migrations import migrate
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')  # 256 MB while building
+    app.create_base_tables(conn)
+    conn.execute('BEGIN')
+    names = populate(conn, items=items, sales=sales, variations=variations, activities=activities,
+                     days=days, seed=seed)
+    migrate(conn)
+    families.rebuild(conn)
+    replenishment.refresh(conn)
+    conn.close()
+    return names
+
+
+def write_upload_files(directory, rows, existing_names=(), seed=7):
+    """The same supplier price list as upload.csv and upload.xlsx in `directory`; returns both paths."""
+    frame = upload_frame(rows, existing_names, seed=seed)
+    csv_path = os.path.join(directory, 'upload.csv')
+    xlsx_path = os.path.join(directory, 'upload.xlsx')
+    frame.to_csv(csv_path, index=False)
+    frame.to_excel(xlsx_path, index=False)
+    return csv_path, xlsx_path
+
+
+# Build a benchmark database and matching upload files:
+#   python -m benchmarks.synthetic --scale medium --out bench-data
+#   python -m benchmarks.synthetic --items 1000000 --sales 10000000 --out bench-data
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a seeded synthetic shop database and upload files.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--out', required=True, help='directory for shop.db, upload.csv and upload.xlsx')
+    for name in ('items', 'sales', 'variations', 'activities', 'upload_rows'):
+        parser.add_argument('--' + name.replace('_', '-'), type=int, help='overrides the scale preset')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = {key: getattr(args, key) if getattr(args, key) is not None else value
+             for key, value in SCALES[args.scale].items()}
+    os.makedirs(args.out, exist_ok=True)
+    db_path = os.path.join(args.out, 'shop.db')
+    if os.path.exists(db_path):
+        raise SystemExit(f'{db_path} already exists')
+    start = time.perf_counter()
+    upload_rows = sizes.pop('upload_rows')
+    names = build_db(db_path, days=args.days, seed=args.seed, **sizes)
+    print(f"{db_path}: {sizes} in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    for path in write_upload_files(args.out, upload_rows, names, seed=args.seed):
+        print(f"{path}: {upload_rows} rows")
+    print(f"Upload files in {time.perf_counter() - start:.1f}s")
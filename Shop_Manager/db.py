@@ -0,0 +1,117 @@
+import os
+import queue
+import sqlite3
+import threading
+
+# ------------------ CONNECTION POOL ------------------
+# Connections are opened once, tuned with the pragmas below and reused.
+# A bounded LIFO pool per database file works with any server threading
+# model (thread-per-request dev server, gunicorn threads, waitress...).
+# Pools are per process: a worker forked with pooled connections (e.g. a
+# gunicorn master that ran the migrations) drops them and opens its own.
+# Set SHOP_DB_POOL=0 to fall back to a fresh connection with SQLite's default
+# settings, closed when released (in a request: one per request).
+POOL_ENABLED = os.environ.get('SHOP_DB_POOL', '1') != '0'
+POOL_SIZE = int(os.environ.get('SHOP_DB_POOL_SIZE', '8'))
+# seconds SQLite waits for a lock before "database is locked"
+BUSY_TIMEOUT = float(os.environ.get('SHOP_DB_BUSY_TIMEOUT', '5'))
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",        # readers never block the writer (and vice versa)
+    "PRAGMA synchronous=NORMAL",      # safe with WAL, one fsync per checkpoint
+    "PRAGMA cache_size=-20000",       # ~20 MB page cache per connection
+    "PRAGMA mmap_size=268435456",     # map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",       # temp b-trees for ORDER BY/GROUP BY in RAM
+]
+
+_pools = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose close() hands it back to the pool instead of
+    closing it. While pinned to a Flask request (see app.get_connection)
+    close() does nothing; the request teardown releases it. An unpooled
+    connection (SHOP_DB_POOL=0) is closed on release instead.
+    """
+    pinned = False
+    pooled = True
+
+    def close(self):
+        if not self.pinned:
+            release(self)
+
+    def dispose(self):
+        super().close()
+
+
+def _pool_for(db_path):
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Connections inherited across fork must not be used (or closed) in the child
+            _pools, _pools_pid = {}, os.getpid()
+        return _pools.setdefault(db_path, queue.LifoQueue(maxsize=POOL_SIZE))
+
+
+def open_connection(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           factory=PooledConnection)
+    conn.db_path = db_path
+    conn.pid = os.getpid()
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def acquire(db_path):
+    """Take an idle connection for db_path from the pool, or open a new one."""
+    if not POOL_ENABLED:
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False, factory=PooledConnection)
+        conn.db_path, conn.pid, conn.pooled = db_path, os.getpid(), False
+        return conn
+    try:
+        return _pool_for(db_path).get_nowait()
+    except queue.Empty:
+        return open_connection(db_path)
+
+
+def release(conn):
+    """Return a connection to its pool, discarding any uncommitted work."""
+    conn.pinned = False
+    if conn.pid != os.getpid():
+        return  # opened before a fork: leave it to the parent
+    if not conn.pooled:
+        conn.dispose()
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        _pool_for(conn.db_path).put_nowait(conn)
+    except (queue.Full, sqlite3.Error):
+        conn.dispose()
+
+
+def fit_pool(threads):
+    """
+    Grow POOL_SIZE to a server's thread count so every thread keeps a warm
+    connection, unless SHOP_DB_POOL_SIZE sets it. Call it before the
+    process opens its first connection; existing pools keep their size.
+    """
+    global POOL_SIZE
+    if 'SHOP_DB_POOL_SIZE' not in os.environ:
+        POOL_SIZE = max(POOL_SIZE, threads)
+
+
+def close_all():
+    """Close every idle pooled connection (e.g. at shutdown or after tests)."""
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().dispose()
+            except queue.Empty:
+                break
@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+
+# ------------------ EXPIRY ------------------
+# One row per item with a known expiry date, keyed by item_id and indexed
+# on expiry_date (migration 8). The status is never stored: it is derived from the date
+# when queried, so "Expired" counts are always current without a sweep.
+# Items without a row have status 'N/A'. An item counts as expired on its
+# expiry date itself, as the expiry page always showed.
+DAY_FORMAT = '%Y-%m-%d'
+
+STATUS_SQL = '''
+    CASE WHEN e.expiry_date IS NULL THEN 'N/A'
+         WHEN e.expiry_date <= :today THEN 'Expired'
+         ELSE 'Valid' END
+'''
+
+
+def _today(today=None):
+    return (today or date.today()).strftime(DAY_FORMAT)
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' (normalized) for a form value, '' for a blank one; ValueError otherwise."""
+    value = (value or '').strip()
+    if not value:
+        return ''
+    try:
+        return datetime.strptime(value, DAY_FORMAT).strftime(DAY_FORMAT)
+    except ValueError:
+        raise ValueError(f"Invalid expiry date '{value}', expected YYYY-MM-DD")
+
+
+def form_expiry_dates(form):
+    """(item_id, 'YYYY-MM-DD' or '') pairs from the expiry page's expiry_date_<item_id> fields."""
+    dates = []
+    for key, value in form.items():
+        if key.startswith('expiry_date_'):
+            try:
+                item_id = int(key[len('expiry_date_'):])
+            except ValueError:
+                continue
+            dates.append((item_id, parse_day(value)))
+    return dates
+
+
+def save_expiry_dates(conn, dates):
+    """
+    Set or clear expiry dates for (item_id, day) pairs in one transaction:
+    one executemany upsert for the dates and one executemany delete for the
+    blanks. Unchanged rows and unknown item ids are skipped.
+    Returns the number of items whose expiry date changed.
+    """
+    dates = [(item_id, parse_day(day)) for item_id, day in dates]
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        c.executemany('''
+            INSERT INTO expiry (item_id, expiry_date)
+            SELECT :item_id, :day WHERE EXISTS (SELECT 1 FROM items WHERE id = :item_id)
+            ON CONFLICT(item_id) DO UPDATE SET expiry_date = excluded.expiry_date
+            WHERE expiry_date IS NOT excluded.expiry_date
+        ''', [{'item_id': item_id, 'day': day} for item_id, day in dates if day])
+        changed = max(c.rowcount, 0)
+        c.executemany('DELETE FROM expiry WHERE item_id = ?', [(item_id,) for item_id, day in dates if not day])
+        changed += max(c.rowcount, 0)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return changed
+
+
+def expiry_listing(conn, today=None):
+    """Every item with its expiry date ('' if none) and derived status, in item id order."""
+    rows = conn.execute(f'''
+        SELECT i.id, i.item, e.expiry_date, {STATUS_SQL}
+        FROM items i
+        LEFT JOIN expiry e ON e.item_id = i.id
+        ORDER BY i.id
+    ''', {'today': _today(today)}).fetchall()
+    return [{'id': r[0], 'item': r[1], 'expiry_date': r[2] or '', 'expiry_status': r[3]} for r in rows]
+
+
+def expired_count(conn, today=None):
+    return conn.execute('SELECT COUNT(*) FROM expiry WHERE expiry_date <= ?', (_today(today),)).fetchone()[0]
+
+
+def expiring_within(conn, days, include_expired=False, today=None):
+    """
+    Items expiring in the next `days` days (index range scan on
+    idx_expiry_date), soonest first; `include_expired` adds already expired
+    items. Returns [{'item_id', 'item', 'expiry_date', 'days_left', 'status'}].
+    """
+    if days < 0:
+        raise ValueError('within_days must not be negative')
+    today = today or date.today()
+    params = {'today': _today(today), 'until': _today(today + timedelta(days=days))}
+    rows = conn.execute(f'''
+        SELECT e.item_id, i.item, e.expiry_date,
+               CAST(julianday(e.expiry_date) - julianday(:today) AS INTEGER), {STATUS_SQL}
+        FROM expiry e
+        JOIN items i ON i.id = e.item_id
+        WHERE e.expiry_date <= :until {'' if include_expired else 'AND e.expiry_date > :today'}
+        ORDER BY e.expiry_date, e.item_id
+    ''', params).fetchall()
+    return [{'item_id': r[0], 'item': r[1], 'expiry_date': r[2], 'days_left': r[3], 'status': r[4]}
+            for r in rows]
@@ -0,0 +1,253 @@
+import csv
+import io
+import math
+import re
+import zipfile
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from reports import range_window, to_day
+
+# ------------------ STREAMING EXPORTS ------------------
+# Reports are streamed straight from the cursor, FETCH_ROWS rows at a time.
+# CSV goes out chunk by chunk as rows are read, so the download starts at
+# once. XLSX is a zip of XML parts: the sheets are written row by row into
+# a zipfile on an unseekable sink whose compressed bytes are sent after every
+# fetch, so it starts downloading at once too (the workbook and content-type
+# parts, which list the sheets, come last). Either way memory stays flat
+# however many rows the report has.
+FETCH_ROWS = 1000
+XLSX_SHEET_ROWS = 1048575  # Excel's row limit minus the header; longer reports continue on a new sheet
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _date_range(args, default_days=None):
+    """(start, end) timestamps for ?from=&to= days, or None when neither is given and there is no default."""
+    if not args.get('from') and not args.get('to') and default_days is None:
+        return None
+    last_day = to_day(args.get('to') or None)
+    first_day = to_day(args.get('from') or (last_day - timedelta(days=(default_days or 1) - 1)))
+    if first_day > last_day:
+        raise ValueError("'from' must not be after 'to'")
+    return range_window(first_day, last_day)
+
+
+def price_variation_query(args):
+    return '''
+        SELECT i.item, i.description, pv.old_price, pv.new_price, pv.change_date
+        FROM price_variations pv
+        JOIN items i ON pv.item_id = i.id
+        ORDER BY i.item, pv.change_date
+    ''', ()
+
+
+def sales_query(args):
+    # Defaults to the last 30 days; the range is an index range scan on idx_sales_date
+    return '''
+        SELECT s.date, s.item_id, i.item, s.quantity_sold, i.price_per_pc_or_kg, s.total_amount
+        FROM sales s
+        LEFT JOIN items i ON s.item_id = i.id
+        WHERE s.date >= ? AND s.date < ?
+        ORDER BY s.date, s.id
+    ''', _date_range(args, default_days=30)
+
+
+def items_query(args):
+    return '''
+        SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount, date_added
+        FROM items
+        ORDER BY id
+    ''', ()
+
+
+def activities_query(args):
+    window = _date_range(args)
+    if window is None:
+        return 'SELECT date, action, details FROM activities ORDER BY id', ()
+    return 'SELECT date, action, details FROM activities WHERE date >= ? AND date < ? ORDER BY id', window
+
+
+# name -> (query builder taking request args, header row, download file name without extension)
+EXPORTS = {
+    'price-variation': (price_variation_query,
+                        ['ITEM', 'DESCRIPTION', 'OLD PRICE', 'NEW PRICE', 'CHANGE DATE'],
+                        'price_variation_report'),
+    'sales': (sales_query,
+              ['DATE', 'ITEM ID', 'ITEM', 'QUANTITY SOLD', 'UNIT PRICE', 'TOTAL AMOUNT'],
+              'sales_report'),
+    # Same column names as /upload expects, so an export can be edited and re-uploaded
+    'items': (items_query,
+              ['ID', 'ITEM', 'DESCRIPTION', 'PRICE_PER_PC_OR_KG', 'TOTAL_QUANTITY_AVAILABLE', 'TOTAL_STOCK_AMOUNT',
+               'DATE_ADDED'],
+              'items'),
+    'activities': (activities_query,
+                   ['DATE', 'ACTION', 'DETAILS'],
+                   'activity_log'),
+}
+
+
+def export_query(report, args):
+    """(sql, params, header, filename) for a report; raises ValueError for an unknown report or bad range."""
+    if report not in EXPORTS:
+        raise ValueError(f"Unknown report '{report}', expected one of {sorted(EXPORTS)}")
+    build, header, filename = EXPORTS[report]
+    sql, params = build(args)
+    return sql, params, header, filename
+
+
+def iter_rows(conn, sql, params):
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        yield rows
+
+
+def stream_csv(conn, sql, params, header):
+    """Yield the CSV as UTF-8 byte chunks, one chunk per FETCH_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for rows in iter_rows(conn, sql, params):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# ------------------ XLSX PARTS ------------------
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+SHEET_START = (XML_HEADER + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+               '<sheetData>')
+SHEET_END = '</sheetData></worksheet>'
+ROOT_RELS = (XML_HEADER + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+             '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+             'officeDocument" Target="xl/workbook.xml"/></Relationships>')
+ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Sink:
+    """Unseekable file object that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _column(index):
+    name = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+
+def _xlsx_row(number, values, columns):
+    cells = []
+    for column, value in zip(columns, values):
+        ref = f'{column}{number}'
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            text = escape(ILLEGAL_XML_CHARS.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def _workbook_parts(sheet_count):
+    sheets = range(1, sheet_count + 1)
+    content_types = (
+        XML_HEADER + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  for n in sheets)
+        + '</Types>')
+    workbook = (
+        XML_HEADER + '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name="Sheet{n}" sheetId="{n}" r:id="rId{n}"/>' for n in sheets)
+        + '</sheets></workbook>')
+    workbook_rels = (
+        XML_HEADER + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                  f'relationships/worksheet" Target="worksheets/sheet{n}.xml"/>' for n in sheets)
+        + '</Relationships>')
+    return [('[Content_Types].xml', content_types), ('_rels/.rels', ROOT_RELS),
+            ('xl/workbook.xml', workbook), ('xl/_rels/workbook.xml.rels', workbook_rels)]
+
+
+def stream_xlsx(conn, sql, params, header):
+    """
+    Yield an .xlsx workbook as byte chunks while the rows are read: one
+    deflated sheet part per XLSX_SHEET_ROWS rows, each starting with `header`.
+    """
+    columns = [_column(i) for i in range(1, len(header) + 1)]
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+    sheet, sheet_count, sheet_rows = None, 0, 0
+
+    def open_sheet():
+        nonlocal sheet, sheet_count, sheet_rows
+        if sheet is not None:
+            sheet.write(SHEET_END.encode())
+            sheet.close()
+        sheet_count += 1
+        sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+        sheet.write((SHEET_START + _xlsx_row(1, header, columns)).encode())
+        sheet_rows = 0
+
+    open_sheet()
+    yield sink.drain()  # the first bytes go out before the query runs
+    for rows in iter_rows(conn, sql, params):
+        xml = []
+        for row in rows:
+            if sheet_rows >= XLSX_SHEET_ROWS:
+                sheet.write(''.join(xml).encode())
+                xml = []
+                open_sheet()
+            sheet_rows += 1
+            xml.append(_xlsx_row(sheet_rows + 1, row, columns))
+        sheet.write(''.join(xml).encode())
+        data = sink.drain()
+        if data:
+            yield data
+    sheet.write(SHEET_END.encode())
+    sheet.close()
+    for name, xml in _workbook_parts(sheet_count):
+        archive.writestr(name, xml)
+    archive.close()
+    yield sink.drain()
+
+
+def stream_export(conn, report, fmt, args):
+    """
+    (generator of byte chunks, mimetype, download name) for a report.
+    Raises ValueError for an unknown report/format or a bad date range.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {sorted(FORMATS)}")
+    sql, params, header, filename = export_query(report, args)
+    stream = stream_csv if fmt == 'csv' else stream_xlsx
+    return stream(conn, sql, params, header), FORMATS[fmt], f'{filename}.{fmt}'
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+from response_cache import bump_version
+
+# ------------------ PRODUCT FAMILIES ------------------
+# /substitutes groups items into families by a normalized base name, e.g.
+# "TOSS BLUE 20G" and "Toss yellow 500g" -> "TOSS". Each item's family is
+# stored in item_families (migration 10). Triggers on items only mark a
+# row pending (family NULL) when an item is added or renamed. refresh()
+# then computes just the pending rows with precompiled patterns, inside
+# the write path's own transaction, so the page is one GROUP BY. rebuild()
+# recomputes every family with vectorized pandas string operations. Run it
+# after changing the rules. Both bump the data version, so the cached /substitutes page
+# is rendered again.
+DEFAULT_RULES = {
+    # Whole words dropped before picking the base name (colours, variants, units)
+    'strip_words': ['YELLOW', 'BLUE', 'RED', 'GREEN', 'WHITE', 'BLACK', 'BROWN', 'PINK', 'PURPLE', 'ORANGE',
+                    'GREY', 'GRAY', 'GOLD', 'SILVER',
+                    'G', 'GM', 'GMS', 'KG', 'KGS', 'MG', 'ML', 'L', 'LT', 'LTR', 'LTRS', 'LITRE', 'LITRES',
+                    'LITER', 'LITERS', 'PC', 'PCS', 'PIECES'],
+    # Tokens containing a digit are sizes or counts ("500G", "1KG", "260MM", "2")
+    'strip_size_tokens': True,
+    # How many leading words of what is left make up the family name
+    'family_words': 1,
+}
+# JSON file overriding any of the keys above
+RULES_FILE = os.environ.get('SHOP_FAMILY_RULES')
+
+
+def compile_rules(config=None):
+    """Precompile the normalization patterns for a rules dict (defaults + overrides)."""
+    config = dict(DEFAULT_RULES, **(config or {}))
+    words = '|'.join(re.escape(word.upper()) for word in sorted(config['strip_words'], key=len, reverse=True))
+    return {
+        'size_tokens': re.compile(r'(?<!\S)\S*\d\S*(?!\S)' if config['strip_size_tokens'] else r'(?!x)x'),
+        'strip_words': re.compile(rf'\b(?:{words})\b' if words else r'(?!x)x'),
+        'non_letters': re.compile(r'[^A-Z\s]'),
+        'leading_words': re.compile(rf'^\s*([A-Z]+(?:\s+[A-Z]+){{0,{max(int(config["family_words"]), 1) - 1}}})'),
+    }
+
+
+def load_rules(path=RULES_FILE):
+    if not path:
+        return compile_rules()
+    with open(path, encoding='utf-8') as f:
+        return compile_rules(json.load(f))
+
+
+RULES = load_rules()
+
+
+def family_of(name, rules=None):
+    """Normalized family name for one item name."""
+    rules = rules or RULES
+    text = (name or '').upper().strip()
+    stripped = rules['size_tokens'].sub(' ', text)
+    stripped = rules['strip_words'].sub(' ', stripped)
+    stripped = rules['non_letters'].sub('', stripped)
+    match = rules['leading_words'].match(stripped)
+    # Nothing left (e.g. the name is only a size): the name itself is the family
+    return ' '.join(match.group(1).split()) if match else text
+
+
+def families_of(names, rules=None):
+    """family_of() for a pandas Series of names, vectorized (same result row for row)."""
+    rules = rules or RULES
+    text = names.fillna('').astype(str).str.upper().str.strip()
+    stripped = (text.str.replace(rules['size_tokens'], ' ', regex=True)
+                    .str.replace(rules['strip_words'], ' ', regex=True)
+                    .str.replace(rules['non_letters'], '', regex=True))
+    family = stripped.str.extract(rules['leading_words'].pattern, expand=False)
+    family = family.str.split().str.join(' ')
+    return family.fillna(text)
+
+
+def refresh(conn, commit=True):
+    """
+    Compute the families of pending (new or renamed) items. Call it inside
+    a write path's transaction with commit=False. Returns the number of rows updated.
+    """
+    pending = conn.execute('SELECT item_id, item FROM item_families WHERE family IS NULL').fetchall()
+    if not pending:
+        return 0
+    families = [family_of(name) for _, name in pending]
+    # `item IS ?` skips a row renamed again since it was read; it stays pending
+    conn.executemany('UPDATE item_families SET family = ? WHERE item_id = ? AND item IS ?',
+                     [(family, item_id, name) for (item_id, name), family in zip(pending, families)])
+    bump_version(conn)
+    if commit:
+        conn.commit()
+    return len(pending)
+
+
+def rebuild(conn):
+    """Recompute every item's family with pandas (e.g. after changing the rules)."""
+    import pandas as pd
+
+    items = pd.read_sql_query('SELECT id, item FROM items', conn)
+    items['family'] = families_of(items['item'])
+    conn.execute('DELETE FROM item_families')
+    conn.executemany('INSERT INTO item_families (item_id, item, family) VALUES (?, ?, ?)',
+                     items[['id', 'item', 'family']].itertuples(index=False, name=None))
+    bump_version(conn)
+    conn.commit()
+    return len(items)
+
+
+def family_summary(conn):
+    """{family: {'frequency', 'total_quantity'}} in order of each family's first item."""
+    rows = conn.execute('''
+        SELECT f.family, COUNT(*), COALESCE(SUM(i.total_quantity_available), 0)
+        FROM item_families f
+        JOIN items i ON i.id = f.item_id
+        WHERE f.family IS NOT NULL
+        GROUP BY f.family
+        ORDER BY MIN(f.item_id)
+    ''').fetchall()
+    return {family: {'frequency': frequency, 'total_quantity': quantity} for family, frequency, quantity in rows}
+
+
+# Refresh pending families, or recompute them all: python families.py [--rebuild] [path/to/shop.db]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the product family table behind /substitutes.')
+    parser.add_argument('db_path', nargs='?')
+    parser.add_argument('--rebuild', action='store_true', help='recompute every family (after changing rules)')
+    args = parser.parse_args()
+    if args.db_path is None:
+        from app import DB_PATH as db_path
+    else:
+        db_path = args.db_path
+    conn = sqlite3.connect(db_path, timeout=5)
+    count = rebuild(conn) if args.rebuild else refresh(conn)
+    families = conn.execute('SELECT COUNT(DISTINCT family) FROM item_families').fetchone()[0]
+    print(f"{db_path}: {'rebuilt' if args.rebuild else 'refreshed'} {count} item(s), {families} families")
+    conn.close()
@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+# ------------------ GUNICORN SETTINGS ------------------
+# gunicorn -c gunicorn.conf.py   (the Procfile runs this)
+# Workers are separate processes sharing Database/shop.db. SQLite serializes
+# writers, so a few processes with a handful of threads each serve tills
+# better than many processes: WAL lets readers run alongside the one writer,
+# and writers wait up to SHOP_DB_BUSY_TIMEOUT seconds for the lock instead
+# of failing. wsgi.py grows each worker's connection pool to
+# SHOP_WEB_THREADS, so every thread keeps a warm connection.
+wsgi_app = 'wsgi:app'
+bind = f"{os.environ.get('SHOP_WEB_HOST', '0.0.0.0')}:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('SHOP_WEB_WORKERS', min(multiprocessing.cpu_count() * 2, 4)))
+threads = int(os.environ.get('SHOP_WEB_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.environ.get('SHOP_WEB_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers after this many requests (0 = never)
+max_requests = int(os.environ.get('SHOP_WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+# No preload: the master only migrates (below); each worker builds its own app after the
+# fork, with its own connection pool and threads
+preload_app = False
+accesslog = os.environ.get('SHOP_WEB_ACCESS_LOG')  # '-' logs requests to stdout
+errorlog = '-'
+
+
+def on_starting(server):
+    # Migrate once in the master before any worker exists; workers then find the schema up to date
+    import app
+    import db
+
+    app.init_schema()
+    db.close_all()
@@ -0,0 +1,98 @@
+import base64
+import json
+
+import item_search
+
+# ------------------ ITEM LISTINGS ------------------
+# /sales, /price-list and /api/items page through items with keyset
+# (cursor) pagination: each page continues from the (sort value, id) of the
+# last row of the previous page with a row-value comparison, so fetching
+# page 500 costs the same index seek as page 1, unlike OFFSET.
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Sortable columns; both are backed by an index ordered (column, id)
+SORTS = {
+    'id': 'id',
+    'item': 'item',
+}
+
+ITEM_COLUMNS = 'id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount'
+
+
+def encode_cursor(sort_value, item_id):
+    raw = json.dumps([sort_value, item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_value, int(item_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def list_items(conn, sort='id', direction='asc', cursor=None, limit=PAGE_SIZE, q=None, in_stock=False):
+    """
+    One page of item rows plus the cursor for the next page (None on the last page).
+    `q` filters by item/description words (FTS prefix match), `in_stock`
+    keeps only items with quantity left. Raises ValueError for a bad sort,
+    direction or cursor.
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort '{sort}', expected one of {sorted(SORTS)}")
+    if direction not in ('asc', 'desc'):
+        raise ValueError("dir must be 'asc' or 'desc'")
+    column = SORTS[sort]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    where, params = [], []
+    if cursor:
+        where.append(f"({column}, id) {'>' if direction == 'asc' else '<'} (?, ?)")
+        params.extend(decode_cursor(cursor))
+    if in_stock:
+        where.append('total_quantity_available > 0')
+    if q:
+        expression = item_search.match_expression(q)
+        if expression and item_search.fts_available(conn):
+            where.append('id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)')
+            params.append(expression)
+        else:
+            where.append('(item LIKE ? OR description LIKE ?)')
+            params.extend([f'%{q}%', f'%{q}%'])
+
+    rows = conn.execute(f'''
+        SELECT {ITEM_COLUMNS} FROM items
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {column} {direction}, id {direction}
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[1] if sort == 'item' else last[0], last[0])
+    return rows, next_cursor
+
+
+def listing_args(args):
+    """Listing parameters from a request's query string (sort, dir, cursor, limit, q, in_stock)."""
+    return {
+        'sort': args.get('sort', 'id'),
+        'direction': args.get('dir', 'asc'),
+        'cursor': args.get('cursor') or None,
+        'limit': args.get('limit', PAGE_SIZE, type=int),
+        'q': args.get('q', '').strip() or None,
+        'in_stock': args.get('in_stock') in ('1', 'true', 'on'),
+    }
+
+
+def listing_query(params):
+    """The query string for listing_args() `params`, minus cursor and q (which the page fetches set)."""
+    query = {'sort': params['sort'], 'dir': params['direction'], 'limit': params['limit']}
+    if params['in_stock']:
+        query['in_stock'] = '1'
+    return query
@@ -0,0 +1,66 @@
+import re
+
+# ------------------ ITEM SEARCH ------------------
+# Search and autocomplete go through the items_fts FTS5 index (migration 5):
+# every word typed becomes a prefix term ("sug 1k" -> "sug"* "1k"*), results
+# are ranked with bm25, and no query ever scans the items table. If the
+# SQLite build lacks FTS5 the old LIKE '%q%' path is used instead.
+ITEM_COLUMNS = 'i.id, i.item, i.description, i.price_per_pc_or_kg, i.total_quantity_available, i.total_stock_amount'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone() is not None
+
+
+def match_expression(text, column=None):
+    """Turn free text into an FTS5 prefix query, or None if it has no searchable words."""
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    return f'{column} : ({terms})' if column else terms
+
+
+def search_items(conn, text, limit=None):
+    """Full item rows matching `text` in item or description, best match first."""
+    expression = match_expression(text)
+    limit_sql = ' LIMIT ?' if limit else ''
+    limit_args = (limit,) if limit else ()
+    if expression and fts_available(conn):
+        return conn.execute(f'''
+            SELECT {ITEM_COLUMNS}
+            FROM items_fts JOIN items i ON i.id = items_fts.rowid
+            WHERE items_fts MATCH ?
+            ORDER BY bm25(items_fts, 10.0, 1.0)
+            {limit_sql}
+        ''', (expression,) + limit_args).fetchall()
+    return conn.execute(f'''
+        SELECT {ITEM_COLUMNS} FROM items i
+        WHERE i.item LIKE ? OR i.description LIKE ?
+        {limit_sql}
+    ''', (f'%{text}%', f'%{text}%') + limit_args).fetchall()
+
+
+# Autocomplete ranks only the first matches found, so a one-letter prefix
+# that matches half the catalogue still costs a bounded amount of work
+AUTOCOMPLETE_CANDIDATES = 200
+
+
+def autocomplete(conn, text, limit=10):
+    """(id, item, description) rows whose item name has words starting with the typed ones."""
+    expression = match_expression(text, column='item')
+    if expression and fts_available(conn):
+        return conn.execute('''
+            SELECT i.id, i.item, i.description
+            FROM (
+                SELECT rowid, bm25(items_fts) AS score FROM items_fts
+                WHERE items_fts MATCH ?
+                LIMIT ?
+            ) m
+            JOIN items i ON i.id = m.rowid
+            ORDER BY m.score
+            LIMIT ?
+        ''', (expression, AUTOCOMPLETE_CANDIDATES, limit)).fetchall()
+    return conn.execute("SELECT id, item, description FROM items WHERE item LIKE ? LIMIT ?",
+                        (f"%{text}%", limit)).fetchall()
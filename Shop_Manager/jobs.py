@@ -0,0 +1,207 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# ------------------ BACKGROUND JOBS ------------------
+# Heavy work (big uploads, reports) runs on a small thread pool instead of
+# the request thread. Every job is a row in the `jobs` table, so status,
+# progress and results survive restarts: on start() queued jobs are
+# resubmitted. Workers claim a job with a conditional UPDATE, so several
+# processes sharing shop.db never run the same job twice.
+# A running job records its owner (host:pid). A monitor thread in every
+# process heartbeats the jobs that process is running, whatever their kind,
+# and every HEARTBEAT_EVERY it requeues running jobs whose owner is dead:
+# a process on this host that no longer exists, or any job whose heartbeat
+# is older than STALE_AFTER. start() does the same sweep at once, so a job
+# cut off by a crash is picked up again on restart.
+WORKERS = int(os.environ.get('SHOP_JOB_WORKERS', '2'))
+HEARTBEAT_EVERY = float(os.environ.get('SHOP_JOB_HEARTBEAT_SECONDS', '30'))
+STALE_AFTER = timedelta(minutes=5)  # running job without a heartbeat for this long is requeued
+
+JOB_FIELDS = ['id', 'kind', 'status', 'params', 'progress', 'result', 'error', 'created', 'started',
+              'finished', 'heartbeat', 'owner']
+
+HOST = socket.gethostname()
+
+_handlers = {}
+_executor = None
+_connect = None
+_monitor_stop = None
+_running = set()  # ids of the jobs this process is running
+_running_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _owner():
+    return f'{HOST}:{os.getpid()}'
+
+
+def _orphaned(job_id, owner):
+    """True if `owner` is known to be dead: a process on this host that no longer runs the job."""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != HOST or not pid.isdigit() or os.name == 'nt':
+        return False  # cannot tell (os.kill would terminate on Windows); the heartbeat decides
+    if int(pid) == os.getpid():
+        with _running_lock:
+            return job_id not in _running  # an earlier process that had our pid
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False  # exists, owned by another user
+    return False
+
+
+def handler(kind):
+    """Register fn(conn, params, progress) as the handler for jobs of `kind`."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def start(connect, workers=None):
+    """
+    Start the worker pool. `connect()` must return a sqlite3 connection whose
+    close() releases it (app.get_connection outside a request does).
+    """
+    global _executor, _connect, _monitor_stop
+    if _executor is not None:
+        return
+    _connect = connect
+    _executor = ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix='shop-job')
+
+    conn = connect()
+    try:
+        requeue_orphans(conn)
+        pending = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id")]
+    finally:
+        conn.close()
+    for job_id in pending:
+        _executor.submit(_run, job_id)
+
+    _monitor_stop = threading.Event()
+    threading.Thread(target=_monitor, args=(_monitor_stop,), name='shop-job-monitor', daemon=True).start()
+
+
+def shutdown(wait=True):
+    global _executor, _monitor_stop
+    if _monitor_stop is not None:
+        _monitor_stop.set()
+        _monitor_stop = None
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def requeue_orphans(conn):
+    """Requeue running jobs whose owner is dead or whose heartbeat is stale; returns their ids."""
+    stale = (datetime.now() - STALE_AFTER).strftime("%Y-%m-%d %H:%M:%S")
+    requeued = []
+    for job_id, owner, heartbeat in conn.execute(
+            "SELECT id, owner, heartbeat FROM jobs WHERE status = 'running'").fetchall():
+        if (heartbeat or '') >= stale and not _orphaned(job_id, owner):
+            continue
+        # Only if nobody claimed or heartbeat it since we looked
+        if conn.execute('''
+            UPDATE jobs SET status = 'queued', owner = NULL
+            WHERE id = ? AND status = 'running' AND owner IS ? AND heartbeat IS ?
+        ''', (job_id, owner, heartbeat)).rowcount:
+            requeued.append(job_id)
+    conn.commit()
+    return requeued
+
+
+def _monitor(stop):
+    while not stop.wait(HEARTBEAT_EVERY):
+        with _running_lock:
+            running = list(_running)
+        try:
+            conn = _connect()
+            try:
+                if running:
+                    conn.execute(f'''
+                        UPDATE jobs SET heartbeat = ?
+                        WHERE status = 'running' AND owner = ? AND id IN ({', '.join('?' * len(running))})
+                    ''', [_now(), _owner(), *running])
+                    conn.commit()
+                requeued = requeue_orphans(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print("⚠️ job monitor failed:", e)
+            continue
+        executor = _executor
+        for job_id in requeued:
+            if executor is not None:
+                executor.submit(_run, job_id)
+
+
+def enqueue(conn, kind, params=None):
+    """Queue a job and return its id at once."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+    now = _now()
+    c = conn.execute("INSERT INTO jobs (kind, status, params, created, heartbeat) VALUES (?, 'queued', ?, ?, ?)",
+                     (kind, json.dumps(params or {}), now, now))
+    conn.commit()
+    if _executor is not None:
+        _executor.submit(_run, c.lastrowid)
+    return c.lastrowid
+
+
+def get_job(conn, job_id):
+    row = conn.execute(f'SELECT {", ".join(JOB_FIELDS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(JOB_FIELDS, row))
+    for key in ('params', 'progress', 'result'):
+        job[key] = json.loads(job[key]) if job[key] else None
+    return job
+
+
+def _run(job_id):
+    conn = _connect()
+    with _running_lock:
+        _running.add(job_id)  # before the claim, so the monitor never sees it as ours but unknown
+    try:
+        now = _now()
+        claimed = conn.execute('''
+            UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, owner = ?, error = NULL
+            WHERE id = ? AND status = 'queued'
+        ''', (now, now, _owner(), job_id)).rowcount
+        conn.commit()
+        if not claimed:
+            return  # another worker/process got it first
+
+        kind, params = conn.execute('SELECT kind, params FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        def progress(value):
+            conn.execute('UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ?',
+                         (json.dumps(value), _now(), job_id))
+            conn.commit()
+
+        try:
+            result = _handlers[kind](conn, json.loads(params or '{}'), progress)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            print(f"⚠️ job {job_id} ({kind}) failed:", e)
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                         (str(e) or type(e).__name__, _now(), job_id))
+        else:
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, finished = ? WHERE id = ?",
+                         (json.dumps(result), _now(), job_id))
+        conn.commit()
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+        conn.close()
@@ -0,0 +1,294 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# ------------------ METRICS ------------------
+# In-process counters and histograms for this worker process, exposed as
+# Prometheus text on /metrics and as a JSON summary on /api/metrics.
+#   - requests: latency histogram, status counts and statements per
+#     request for each route (init_app hooks before/after_request)
+#   - SQL: count and time per normalized statement and route, from the
+#     sqlite3 trace callback that get_connection() installs on its
+#     connections. The callback fires when a statement starts. Its time
+#     runs until the thread's next statement, a template render or the end
+#     of the request, so it includes fetching the rows (SQLite produces
+#     them lazily as they are fetched). Statements of background threads
+#     (jobs, activity-log writer) are counted but not timed.
+#   - database locks: get_connection() retries, time waited, give-ups, and
+#     "database is locked" errors shown to users
+# SHOP_METRICS=0 turns all of it off (and with it the slow-query log, see
+# profiling.py, which reads its statement times from here).
+ENABLED = os.environ.get('SHOP_METRICS', '1') != '0'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)  # statements per request
+MAX_STATEMENTS = 500  # distinct (route, statement) series; later ones are folded into 'other'
+STATEMENT_CHARS = 200
+SLOW_STATEMENT_SECONDS = None  # set by profiling.init_app; request statements this slow are kept for pop_slow()
+
+COUNTERS = {
+    'db_lock_retries': 'Connection attempts retried because the database was locked',
+    'db_lock_wait_seconds': 'Seconds spent sleeping between those retries',
+    'db_lock_failures': 'get_connection() calls that gave up after all retries',
+    'db_locked_errors': "Requests that showed the user a 'database is locked' message",
+    'request_exceptions': 'Requests that ended with an unhandled exception',
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_routes = {}       # (method, route) -> {'count', 'sum', 'max', 'buckets', 'statuses', 'queries', ...}
+_statements = {}   # (route, statement) -> [count, seconds, max seconds]
+_counters = dict.fromkeys(COUNTERS, 0)
+_started = time.time()
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WRITES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def normalize(sql):
+    """Statement text with literals replaced by ? and whitespace collapsed (one series per query shape)."""
+    return ' '.join(_LITERALS.sub('?', sql).split())[:STATEMENT_CHARS]
+
+
+def incr(name, amount=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] += amount
+
+
+# ------------------ SQL TRACING ------------------
+def instrument(conn):
+    """Install the statement trace callback on a connection (once per pooled connection)."""
+    if not ENABLED or getattr(conn, 'metrics_traced', False):
+        return
+    conn.set_trace_callback(_trace)
+    try:
+        conn.metrics_traced = True
+    except AttributeError:
+        pass  # a plain sqlite3.Connection is traced on every call instead
+
+
+def _trace(sql):
+    now = time.perf_counter()
+    if getattr(_local, 'paused', False) or sql.startswith('--'):
+        return  # '--' marks a virtual table's own statements (FTS5 shadow tables), not the app's
+    current = getattr(_local, 'statement', None)
+    # A trigger program reports the statement that fired it again
+    if current is not None and sql == current[0] and sql.lstrip()[:7].upper().startswith(_WRITES):
+        return
+    finish_statement(now)
+    _local.statement = (sql, now)
+    route = getattr(_local, 'route', None)
+    if route is not None:
+        _local.queries += 1
+
+
+def finish_statement(now=None):
+    """Stop the clock on this thread's current statement and record it."""
+    current = getattr(_local, 'statement', None)
+    if current is None:
+        return
+    _local.statement = None
+    route = getattr(_local, 'route', None)
+    elapsed = (now or time.perf_counter()) - current[1] if route is not None else 0.0
+    if SLOW_STATEMENT_SECONDS is not None and route is not None and elapsed >= SLOW_STATEMENT_SECONDS:
+        _local.slow = getattr(_local, 'slow', []) + [(current[0], elapsed)]
+    key = (route or 'background', normalize(current[0]))
+    with _lock:
+        stats = _statements.get(key)
+        if stats is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                key = (key[0], 'other')
+            stats = _statements.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def pop_slow():
+    """The (expanded SQL, seconds) of this thread's slow statements since the last call."""
+    slow, _local.slow = getattr(_local, 'slow', []), []
+    return slow
+
+
+@contextmanager
+def paused():
+    """Statements this thread runs inside the block are not traced (e.g. EXPLAIN for the slow-query log)."""
+    finish_statement()
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = False
+
+
+# ------------------ REQUEST HOOKS ------------------
+def init_app(app):
+    if not ENABLED:
+        return
+    from flask import before_render_template
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    # Rendering is not part of the last query's time
+    before_render_template.connect(lambda *args, **kwargs: finish_statement(), app, weak=False)
+
+
+def _start_request():
+    from flask import request
+
+    finish_statement()
+    _local.route = request.url_rule.rule if request.url_rule else 'unmatched'
+    _local.queries = 0
+    _local.request_start = time.perf_counter()
+
+
+def _finish_request(response):
+    from flask import request
+
+    if getattr(_local, 'route', None) is None:
+        return response
+    finish_statement()
+    elapsed = time.perf_counter() - _local.request_start
+    key = (request.method, _local.route)
+    with _lock:
+        stats = _routes.get(key)
+        if stats is None:
+            stats = _routes[key] = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS),
+                                    'statuses': {}, 'queries': 0, 'query_buckets': [0] * len(QUERY_BUCKETS)}
+        stats['count'] += 1
+        stats['sum'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                stats['buckets'][i] += 1
+        stats['statuses'][response.status_code] = stats['statuses'].get(response.status_code, 0) + 1
+        stats['queries'] += _local.queries
+        for i, bound in enumerate(QUERY_BUCKETS):
+            if _local.queries <= bound:
+                stats['query_buckets'][i] += 1
+    _local.route = None
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None:
+        incr('request_exceptions')
+    finish_statement()
+    _local.route = None
+
+
+# ------------------ EXPORT ------------------
+def _snapshot():
+    with _lock:
+        routes = {key: dict(stats, buckets=list(stats['buckets']), statuses=dict(stats['statuses']),
+                            query_buckets=list(stats['query_buckets'])) for key, stats in _routes.items()}
+        statements = {key: list(stats) for key, stats in _statements.items()}
+        counters = dict(_counters)
+    return routes, statements, counters
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    routes, statements, counters = _snapshot()
+    lines = [
+        '# HELP shop_request_duration_seconds Request latency per route.',
+        '# TYPE shop_request_duration_seconds histogram',
+    ]
+    for (method, route), stats in sorted(routes.items()):
+        labels = f'method="{method}",route="{_label(route)}"'
+        for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+            lines.append(f'shop_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'shop_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'shop_request_duration_seconds_sum{{{labels}}} {stats["sum"]:.6f}')
+        lines.append(f'shop_request_duration_seconds_count{{{labels}}} {stats["count"]}')
+
+    lines += ['# HELP shop_requests_total Requests per route and status.', '# TYPE shop_requests_total counter']
+    for (method, route), stats in sorted(routes.items()):
+        for status, count in sorted(stats['statuses'].items()):
+            lines.append(f'shop_requests_total{{method="{method}",route="{_label(route)}",status="{status}"}} {count}')
+
+    lines += ['# HELP shop_request_queries SQL statements issued per request.',
+              '# TYPE shop_request_queries histogram']
+    for (method, route), stats in sorted(routes.items()):
+        labels = f'method="{method}",route="{_label(route)}"'
+        for bound, count in zip(QUERY_BUCKETS, stats['query_buckets']):
+            lines.append(f'shop_request_queries_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'shop_request_queries_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'shop_request_queries_sum{{{labels}}} {stats["queries"]}')
+        lines.append(f'shop_request_queries_count{{{labels}}} {stats["count"]}')
+
+    lines += ['# HELP shop_sql_statements_total SQL statements executed, per route and statement.',
+              '# TYPE shop_sql_statements_total counter']
+    for (route, statement), (count, _, _) in sorted(statements.items()):
+        lines.append(f'shop_sql_statements_total{{route="{_label(route)}",statement="{_label(statement)}"}} {count}')
+    lines += ['# HELP shop_sql_statement_seconds_total Time spent in SQL statements, per route and statement.',
+              '# TYPE shop_sql_statement_seconds_total counter']
+    for (route, statement), (_, seconds, _) in sorted(statements.items()):
+        lines.append(f'shop_sql_statement_seconds_total{{route="{_label(route)}",statement="{_label(statement)}"}} '
+                     f'{seconds:.6f}')
+
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP shop_{name}_total {help_text}.', f'# TYPE shop_{name}_total counter',
+                  f'shop_{name}_total {counters[name]:g}']
+    lines += ['# HELP shop_process_start_time_seconds Start time of this worker process.',
+              '# TYPE shop_process_start_time_seconds gauge', f'shop_process_start_time_seconds {_started:.0f}']
+    return '\n'.join(lines) + '\n'
+
+
+def _percentile(buckets, count, pct):
+    """Upper bound (ms) of the latency bucket holding the pct-th percentile."""
+    target = count * pct / 100
+    for bound, cumulative in zip(LATENCY_BUCKETS, buckets):
+        if cumulative >= target:
+            return bound * 1000
+    return None  # above the largest bucket
+
+
+def summary(top=10):
+    """
+    JSON-friendly summary: per route request count, latency (avg/max and
+    bucketed p50/p95/p99), statements per request and its `top` statements
+    by total time; plus the lock/error counters.
+    """
+    routes, statements, counters = _snapshot()
+    by_route = {}
+    for (route, statement), (count, seconds, max_seconds) in statements.items():
+        by_route.setdefault(route, []).append({'statement': statement, 'count': count,
+                                               'total_ms': round(seconds * 1000, 2),
+                                               'max_ms': round(max_seconds * 1000, 2)})
+    result = {'pid': os.getpid(), 'uptime_seconds': round(time.time() - _started), 'enabled': ENABLED,
+              'counters': counters, 'routes': []}
+    for (method, route), stats in sorted(routes.items(), key=lambda item: -item[1]['sum']):
+        count = stats['count']
+        result['routes'].append({
+            'method': method,
+            'route': route,
+            'count': count,
+            'statuses': stats['statuses'],
+            'avg_ms': round(stats['sum'] * 1000 / count, 2),
+            'max_ms': round(stats['max'] * 1000, 2),
+            'p50_ms': _percentile(stats['buckets'], count, 50),
+            'p95_ms': _percentile(stats['buckets'], count, 95),
+            'p99_ms': _percentile(stats['buckets'], count, 99),
+            'queries_per_request': round(stats['queries'] / count, 2),
+            'top_statements': sorted(by_route.get(route, []), key=lambda s: -s['total_ms'])[:top],
+        })
+    background = sorted(by_route.get('background', []), key=lambda s: -s['count'])[:top]
+    if background:
+        result['background_statements'] = background
+    return result
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+        _statements.clear()
+        for name in _counters:
+            _counters[name] = 0
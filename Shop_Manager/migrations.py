@@ -0,0 +1,519 @@
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+# Timestamp columns filtered by reporting queries (see reports.py)
+TIMESTAMP_COLUMNS = [
+    ('items', 'date_added'),
+    ('sales', 'date'),
+    ('price_variations', 'change_date'),
+    ('activities', 'date'),
+]
+TS_SQL_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def normalize_timestamps(conn):
+    """
+    Rewrite every parseable timestamp to 'YYYY-MM-DD HH:MM:SS' (ISO 'T'
+    separators, fractional seconds, date-only values...) and add triggers that
+    keep later writes in that form, so range predicates compare correctly.
+    Values SQLite cannot parse are left untouched.
+    """
+    for table, column in TIMESTAMP_COLUMNS:
+        normalized = f"strftime('{TS_SQL_FORMAT}', {column})"
+        conn.execute(f'''
+            UPDATE {table} SET {column} = {normalized}
+            WHERE {column} IS NOT NULL AND {normalized} IS NOT NULL AND {column} <> {normalized}
+        ''')
+        for event in ('INSERT', f'UPDATE OF {column}'):
+            suffix = 'insert' if event == 'INSERT' else 'update'
+            new_normalized = f"strftime('{TS_SQL_FORMAT}', NEW.{column})"
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_normalize_{suffix}
+                AFTER {event} ON {table}
+                WHEN NEW.{column} <> {new_normalized}
+                BEGIN
+                    UPDATE {table} SET {column} = {new_normalized} WHERE id = NEW.id;
+                END
+            ''')
+
+
+def create_items_fts(conn):
+    """
+    FTS5 index over items.item/description (external content, so no copy of
+    the rows), kept in sync by triggers. Skipped on SQLite builds without
+    FTS5; item_search.py then falls back to LIKE.
+    """
+    if not conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0]:
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            item, description, content='items', content_rowid='id', prefix='1 2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, item, description) VALUES (NEW.id, NEW.item, NEW.description);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_delete AFTER DELETE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, item, description)
+            VALUES ('delete', OLD.id, OLD.item, OLD.description);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_update AFTER UPDATE OF item, description ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, item, description)
+            VALUES ('delete', OLD.id, OLD.item, OLD.description);
+            INSERT INTO items_fts (rowid, item, description) VALUES (NEW.id, NEW.item, NEW.description);
+        END
+    ''')
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+
+
+def version_triggers(*tables):
+    """Triggers bumping the response cache's data version on any write to `tables`."""
+    return [f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_data_version_{event.lower()}
+        AFTER {event} ON {table} BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+    ''' for table in tables for event in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+def fold_expiry_tables(conn):
+    """
+    Replace the name-keyed `expiry` table and the unused `expiry_data` table
+    with a single item_id-keyed `expiry` table. A legacy date stored against
+    an item name is kept for every item of that name.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'expiry' in tables:
+        # Its triggers (if any) move with it and are dropped with it below
+        conn.execute('ALTER TABLE expiry RENAME TO expiry_legacy')
+    conn.execute('''
+        CREATE TABLE expiry (
+            item_id INTEGER PRIMARY KEY,
+            expiry_date TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_expiry_date ON expiry(expiry_date)')
+    # foreign_keys is off, so deleting an item drops its expiry row via a trigger
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_items_expiry_delete AFTER DELETE ON items BEGIN
+            DELETE FROM expiry WHERE item_id = OLD.id;
+        END
+    ''')
+
+    # expiry_data first so the rows the app actually wrote (expiry) win
+    legacy = []
+    if 'expiry_data' in tables:
+        legacy.append(('expiry_data', 'item_name'))
+    if 'expiry' in tables:
+        legacy.append(('expiry_legacy', 'item'))
+    for table, name_column in legacy:
+        conn.execute(f'''
+            INSERT INTO expiry (item_id, expiry_date)
+            SELECT i.id, l.expiry_date FROM {table} l JOIN items i ON i.item = l.{name_column}
+            WHERE l.expiry_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            ON CONFLICT(item_id) DO UPDATE SET expiry_date = excluded.expiry_date
+        ''')
+        conn.execute(f'DROP TABLE {table}')
+
+
+# ------------------ SCHEMA MIGRATIONS ------------------
+# Each migration is (version, description, steps). A step is either a SQL
+# string or a callable taking the open connection. The applied version is
+# stored in PRAGMA user_version, so existing shop.db files upgrade in place.
+# A migration's steps are frozen once released: they spell out the schema
+# of that version here rather than calling the feature modules, so later
+# changes to those modules cannot alter what an old version upgrades to.
+# Schema changes go into a new migration.
+MIGRATIONS = [
+    (1, "indexes for item lookups, sales/price joins and activity counts", [
+        "CREATE INDEX IF NOT EXISTS idx_items_item ON items(item)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_item_date ON sales(item_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(date)",
+        "CREATE INDEX IF NOT EXISTS idx_price_variations_item_date ON price_variations(item_id, change_date)",
+        "CREATE INDEX IF NOT EXISTS idx_activities_action ON activities(action)",
+        "ANALYZE",
+    ]),
+    (2, "normalized timestamps for half-open date range filters", [
+        normalize_timestamps,
+        "CREATE INDEX IF NOT EXISTS idx_items_date_added ON items(date_added)",
+        "ANALYZE",
+    ]),
+    (3, "progress table for chunked, resumable uploads", [
+        '''
+        CREATE TABLE IF NOT EXISTS upload_imports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            file_hash TEXT,
+            chunk_rows INTEGER,
+            status TEXT,
+            chunks_done INTEGER DEFAULT 0,
+            rows_done INTEGER DEFAULT 0,
+            inserted INTEGER DEFAULT 0,
+            updated INTEGER DEFAULT 0,
+            price_changes INTEGER DEFAULT 0,
+            error TEXT,
+            started TEXT,
+            updated_at TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_upload_imports_hash ON upload_imports(file_hash, status)",
+    ]),
+    (4, "persistent background job queue", [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params TEXT,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            created TEXT,
+            started TEXT,
+            finished TEXT,
+            heartbeat TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, heartbeat)",
+    ]),
+    (5, "FTS5 full-text index for item search and autocomplete", [
+        create_items_fts,
+    ]),
+    (6, "trigger-maintained dashboard aggregates", [
+        '''
+        CREATE TABLE IF NOT EXISTS shop_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_items INTEGER NOT NULL DEFAULT 0,
+            total_stock_value REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            day TEXT PRIMARY KEY,
+            total_amount REAL NOT NULL DEFAULT 0,
+            sales_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS item_sales_totals (
+            item_id INTEGER PRIMARY KEY,
+            quantity_sold REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_item_sales_totals_revenue ON item_sales_totals(revenue)",
+
+        # items -> shop_summary
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_items_insert AFTER INSERT ON items BEGIN
+            UPDATE shop_summary SET total_items = total_items + 1,
+                total_stock_value = total_stock_value + COALESCE(NEW.total_stock_amount, 0) WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_items_delete AFTER DELETE ON items BEGIN
+            UPDATE shop_summary SET total_items = total_items - 1,
+                total_stock_value = total_stock_value - COALESCE(OLD.total_stock_amount, 0) WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_items_update AFTER UPDATE OF total_stock_amount ON items BEGIN
+            UPDATE shop_summary SET total_stock_value = total_stock_value
+                - COALESCE(OLD.total_stock_amount, 0) + COALESCE(NEW.total_stock_amount, 0) WHERE id = 1;
+        END
+        ''',
+
+        # sales -> daily_sales, item_sales_totals
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sales_insert AFTER INSERT ON sales BEGIN
+            INSERT INTO daily_sales (day, total_amount, sales_count)
+            VALUES (substr(NEW.date, 1, 10), COALESCE(NEW.total_amount, 0), 1)
+            ON CONFLICT(day) DO UPDATE SET total_amount = total_amount + excluded.total_amount,
+                                           sales_count = sales_count + 1;
+            INSERT INTO item_sales_totals (item_id, quantity_sold, revenue)
+            VALUES (NEW.item_id, COALESCE(NEW.quantity_sold, 0), COALESCE(NEW.total_amount, 0))
+            ON CONFLICT(item_id) DO UPDATE SET quantity_sold = quantity_sold + excluded.quantity_sold,
+                                               revenue = revenue + excluded.revenue;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sales_delete AFTER DELETE ON sales BEGIN
+            UPDATE daily_sales SET total_amount = total_amount - COALESCE(OLD.total_amount, 0),
+                                   sales_count = sales_count - 1
+            WHERE day = substr(OLD.date, 1, 10);
+            UPDATE item_sales_totals SET quantity_sold = quantity_sold - COALESCE(OLD.quantity_sold, 0),
+                                         revenue = revenue - COALESCE(OLD.total_amount, 0)
+            WHERE item_id = OLD.item_id;
+        END
+        ''',
+        # An update (including the timestamp-normalizing trigger) = delete old + insert new
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_summary_sales_update
+        AFTER UPDATE OF date, item_id, quantity_sold, total_amount ON sales BEGIN
+            UPDATE daily_sales SET total_amount = total_amount - COALESCE(OLD.total_amount, 0),
+                                   sales_count = sales_count - 1
+            WHERE day = substr(OLD.date, 1, 10);
+            UPDATE item_sales_totals SET quantity_sold = quantity_sold - COALESCE(OLD.quantity_sold, 0),
+                                         revenue = revenue - COALESCE(OLD.total_amount, 0)
+            WHERE item_id = OLD.item_id;
+            INSERT INTO daily_sales (day, total_amount, sales_count)
+            VALUES (substr(NEW.date, 1, 10), COALESCE(NEW.total_amount, 0), 1)
+            ON CONFLICT(day) DO UPDATE SET total_amount = total_amount + excluded.total_amount,
+                                           sales_count = sales_count + 1;
+            INSERT INTO item_sales_totals (item_id, quantity_sold, revenue)
+            VALUES (NEW.item_id, COALESCE(NEW.quantity_sold, 0), COALESCE(NEW.total_amount, 0))
+            ON CONFLICT(item_id) DO UPDATE SET quantity_sold = quantity_sold + excluded.quantity_sold,
+                                               revenue = revenue + excluded.revenue;
+        END
+        ''',
+        # Backfill from the existing rows (summary.rebuild)
+        "INSERT INTO shop_summary SELECT 1, COUNT(*), COALESCE(SUM(total_stock_amount), 0) FROM items",
+        '''
+        INSERT INTO daily_sales (day, total_amount, sales_count)
+        SELECT substr(date, 1, 10), SUM(COALESCE(total_amount, 0)), COUNT(*) FROM sales
+        GROUP BY substr(date, 1, 10)
+        ''',
+        '''
+        INSERT INTO item_sales_totals (item_id, quantity_sold, revenue)
+        SELECT item_id, SUM(COALESCE(quantity_sold, 0)), SUM(COALESCE(total_amount, 0)) FROM sales
+        GROUP BY item_id
+        ''',
+    ]),
+    (7, "data version counter for the response cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+        # expiry gets its triggers in migration 8, once it is keyed by item_id
+        *version_triggers('items', 'sales', 'activities', 'price_variations'),
+    ]),
+    (8, "item_id-keyed expiry table indexed on expiry_date (folds expiry and expiry_data)", [
+        fold_expiry_tables,
+        *version_triggers('expiry'),
+    ]),
+    (9, "per-day activity counts rollup and archive registry for activity retention", [
+        '''
+        CREATE TABLE IF NOT EXISTS activity_daily_counts (
+            day TEXT NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, action)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS activity_archives (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            month TEXT NOT NULL,
+            path TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            first_id INTEGER,
+            last_id INTEGER,
+            created TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_activities_date ON activities(date)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_counts_insert AFTER INSERT ON activities BEGIN
+            INSERT INTO activity_daily_counts (day, action, count)
+            VALUES (substr(NEW.date, 1, 10), COALESCE(NEW.action, ''), 1)
+            ON CONFLICT(day, action) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        # Covers the timestamp-normalizing trigger rewriting `date` right after the insert
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_counts_update AFTER UPDATE OF date, action ON activities BEGIN
+            UPDATE activity_daily_counts SET count = count - 1
+            WHERE day = substr(OLD.date, 1, 10) AND action = COALESCE(OLD.action, '');
+            INSERT INTO activity_daily_counts (day, action, count)
+            VALUES (substr(NEW.date, 1, 10), COALESCE(NEW.action, ''), 1)
+            ON CONFLICT(day, action) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        INSERT INTO activity_daily_counts (day, action, count)
+        SELECT substr(date, 1, 10), COALESCE(action, ''), COUNT(*) FROM activities
+        GROUP BY 1, 2
+        ''',
+    ]),
+    (10, "persisted product families for /substitutes", [
+        '''
+        CREATE TABLE IF NOT EXISTS item_families (
+            item_id INTEGER PRIMARY KEY,
+            item TEXT,
+            family TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_item_families_family ON item_families(family)",
+        "CREATE INDEX IF NOT EXISTS idx_item_families_pending ON item_families(item_id) WHERE family IS NULL",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_item_families_insert AFTER INSERT ON items BEGIN
+            INSERT OR REPLACE INTO item_families (item_id, item, family) VALUES (NEW.id, NEW.item, NULL);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_item_families_rename AFTER UPDATE OF item ON items
+        WHEN NEW.item IS NOT OLD.item BEGIN
+            UPDATE item_families SET item = NEW.item, family = NULL WHERE item_id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_item_families_delete AFTER DELETE ON items BEGIN
+            DELETE FROM item_families WHERE item_id = OLD.id;
+        END
+        ''',
+        # Every existing item starts out pending
+        "INSERT OR REPLACE INTO item_families (item_id, item, family) SELECT id, item, NULL FROM items",
+    ]),
+    (11, "reorder suggestions computed by the replenishment batch", [
+        '''
+        CREATE TABLE IF NOT EXISTS reorder_suggestions (
+            item_id INTEGER PRIMARY KEY,
+            item TEXT,
+            stock REAL,
+            avg_daily_7d REAL,
+            avg_daily_28d REAL,
+            demand_std_28d REAL,
+            forecast_daily REAL,
+            days_of_cover REAL,
+            reorder_point REAL,
+            order_quantity REAL,
+            needs_reorder INTEGER NOT NULL DEFAULT 0,
+            computed_at TEXT
+        )
+        ''',
+        # /api/reorder: items to reorder, least cover first
+        "CREATE INDEX IF NOT EXISTS idx_reorder_urgency ON reorder_suggestions(needs_reorder, days_of_cover, item_id)",
+    ]),
+    (12, "owner of a running upload import, so concurrent uploads of a file cannot share it", [
+        "ALTER TABLE upload_imports ADD COLUMN owner TEXT",
+    ]),
+    (13, "owner (host:pid) of a running job, so a restart reclaims jobs of a dead process", [
+        "ALTER TABLE jobs ADD COLUMN owner TEXT",
+    ]),
+    (14, "day number of each sale and a covering index to sum sales per item and day", [
+        # VIRTUAL: computed on read, and stored only in the index
+        "ALTER TABLE sales ADD COLUMN sale_day INTEGER "
+        "GENERATED ALWAYS AS (CAST(julianday(substr(date, 1, 10)) AS INTEGER)) VIRTUAL",
+        "CREATE INDEX IF NOT EXISTS idx_sales_item_day ON sales(item_id, sale_day, quantity_sold)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ------------------ STARTUP LOCK ------------------
+# Several server workers (or a worker and `python migrations.py`) may start
+# against the same shop.db at once. Schema creation and migrations run while
+# holding an exclusive OS file lock on <db>.migrate.lock, so the first
+# process migrates and the others wait, then find the schema up to date.
+# The OS drops the lock if the holder dies.
+LOCK_TIMEOUT = float(os.environ.get('SHOP_MIGRATION_LOCK_TIMEOUT', '120'))
+
+try:
+    import fcntl
+
+    def _try_lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _try_lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def startup_lock(db_path, timeout=None):
+    """Hold the database's migration lock; TimeoutError after `timeout` seconds of waiting."""
+    timeout = LOCK_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    with open(db_path + '.migrate.lock', 'a+b') as f:
+        while True:
+            try:
+                _try_lock(f)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for the migration lock on {db_path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """
+    Apply every pending migration up to `target` (default: latest).
+    Each migration runs in its own transaction together with the
+    user_version bump, so a failure leaves the database on the last good version.
+    Returns the list of versions applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    old_isolation = conn.isolation_level
+    conn.isolation_level = None  # we manage BEGIN/COMMIT ourselves
+    try:
+        for version, description, steps in MIGRATIONS:
+            if version > target:
+                break
+            # Re-read inside the loop: another process may have migrated meanwhile
+            if version <= current_version(conn):
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if version <= current_version(conn):
+                    conn.execute('ROLLBACK')
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = old_isolation
+    return applied
+
+
+# Upgrade a database file in place: python migrations.py [path/to/shop.db]
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        db_path = sys.argv[1]
+    else:
+        from app import DB_PATH as db_path
+    if not os.path.exists(db_path):
+        sys.exit(f"⚠️ {db_path} does not exist; start the app once to create a new database")
+    conn = sqlite3.connect(db_path, timeout=5)
+    with startup_lock(db_path):
+        before = current_version(conn)
+        versions = migrate(conn)
+    print(f"{db_path}: schema v{before} -> v{current_version(conn)} (applied: {versions or 'none'})")
+    conn.close()
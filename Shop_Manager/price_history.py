@@ -0,0 +1,156 @@
+import json
+from datetime import date, datetime
+
+from item_listing import decode_cursor, encode_cursor
+from reports import TS_FORMAT, range_window, to_day, utc_now
+
+# ------------------ PRICE HISTORY ------------------
+# Every price change is a price_variations row (old_price -> new_price at
+# change_date), indexed on (item_id, change_date) by migration 1. The price
+# an item had at a given moment is the new_price of its last change at or
+# before that moment: one index seek, newest first, LIMIT 1, however long
+# the history is. Before its first recorded change an item cost that
+# change's old_price, and an item that never changed has always cost its
+# current price. Changes within the same second are ordered by id.
+HISTORY_PAGE_SIZE = 100
+MAX_HISTORY_PAGE_SIZE = 1000
+
+# Price of item {item_id} at {ts} (NULL for an unknown item); fill in with .format()
+PRICE_AS_OF_SQL = '''
+    COALESCE(
+        (SELECT pv.new_price FROM price_variations pv
+         WHERE pv.item_id = {item_id} AND pv.change_date <= {ts}
+         ORDER BY pv.change_date DESC, pv.id DESC LIMIT 1),
+        (SELECT pv.old_price FROM price_variations pv
+         WHERE pv.item_id = {item_id} AND pv.change_date > {ts}
+         ORDER BY pv.change_date, pv.id LIMIT 1),
+        (SELECT i.price_per_pc_or_kg FROM items i WHERE i.id = {item_id})
+    )
+'''
+
+
+def to_ts(value=None):
+    """
+    'YYYY-MM-DD HH:MM:SS' for None (now, UTC), a datetime, or an ISO timestamp
+    string. A bare day (date or 'YYYY-MM-DD') means the end of that day,
+    i.e. the price the item closed the day at. Raises ValueError otherwise.
+    """
+    if value is None:
+        return utc_now().strftime(TS_FORMAT)
+    if isinstance(value, datetime):
+        return value.strftime(TS_FORMAT)
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d') + ' 23:59:59'
+    value = str(value).strip()
+    try:
+        if len(value) == 10:
+            return to_ts(datetime.strptime(value, '%Y-%m-%d').date())
+        return datetime.fromisoformat(value).strftime(TS_FORMAT)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp '{value}', expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+def price_as_of(conn, item_id, ts=None):
+    """The item's price at `ts` (default now); None if there is no such item or history."""
+    sql = 'SELECT ' + PRICE_AS_OF_SQL.format(item_id=':item_id', ts=':ts')
+    return conn.execute(sql, {'item_id': item_id, 'ts': to_ts(ts)}).fetchone()[0]
+
+
+def prices_as_of(conn, lookups):
+    """
+    price_as_of() for many (item_id, ts) pairs in one query, e.g. to price
+    every sale of a report at its own date. Returns prices in the order of `lookups`.
+    """
+    lookups = [(int(item_id), to_ts(ts)) for item_id, ts in lookups]
+    if not lookups:
+        return []
+    # The pairs travel as one JSON parameter, so any number fits in a single statement
+    rows = conn.execute(f'''
+        SELECT q.n, {PRICE_AS_OF_SQL.format(item_id='q.item_id', ts='q.ts')}
+        FROM (SELECT CAST(key AS INTEGER) AS n,
+                     json_extract(value, '$[0]') AS item_id,
+                     json_extract(value, '$[1]') AS ts
+              FROM json_each(?)) q
+    ''', (json.dumps(lookups),)).fetchall()
+    prices = [None] * len(lookups)
+    for n, price in rows:
+        prices[n] = price
+    return prices
+
+
+def price_history(conn, item_id, first_day=None, last_day=None, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of an item's price changes, newest first, optionally limited
+    to first_day..last_day, plus the cursor for the next page (None on the
+    last page). Each change carries its difference and percentage.
+    Raises ValueError for a bad range or cursor.
+    """
+    limit = max(1, min(int(limit), MAX_HISTORY_PAGE_SIZE))
+    where, params = ['item_id = ?'], [item_id]
+    if first_day is not None or last_day is not None:
+        last_day = to_day(last_day)
+        first_day = to_day(first_day) if first_day is not None else date(1970, 1, 1)
+        if first_day > last_day:
+            raise ValueError("'from' must not be after 'to'")
+        where.append('change_date >= ? AND change_date < ?')
+        params.extend(range_window(first_day, last_day))
+    if cursor:
+        where.append('(change_date, id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+
+    rows = conn.execute(f'''
+        SELECT id, change_date, old_price, new_price FROM price_variations
+        WHERE {' AND '.join(where)}
+        ORDER BY change_date DESC, id DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    history = [{
+        'id': variation_id,
+        'change_date': change_date,
+        'old_price': old_price,
+        'new_price': new_price,
+        'change': round(new_price - old_price, 2) if None not in (old_price, new_price) else None,
+        'change_pct': round((new_price - old_price) * 100 / old_price, 2)
+                      if old_price and new_price is not None else None,
+    } for variation_id, change_date, old_price, new_price in rows]
+    return history, next_cursor
+
+
+SUMMARY_FIELDS = ['item_id', 'changes', 'min_price', 'max_price', 'first_change', 'last_change',
+                  'last_old_price', 'last_new_price']
+
+
+def price_summaries(conn, item_ids=None):
+    """
+    Per-item change count, lowest and highest price seen, first and last
+    change date and the last change's prices, computed in one pass with
+    window functions (for every item with history, or just `item_ids`).
+    Returns {item_id: {...}}.
+    """
+    where, params = '', ()
+    if item_ids is not None:
+        item_ids = [int(item_id) for item_id in item_ids]
+        if not item_ids:
+            return {}
+        where, params = 'WHERE item_id IN (SELECT value FROM json_each(?))', (json.dumps(item_ids),)
+    rows = conn.execute(f'''
+        SELECT item_id, changes, min_price, max_price, first_change, change_date, old_price, new_price
+        FROM (
+            SELECT item_id, change_date, old_price, new_price,
+                   ROW_NUMBER() OVER (item ORDER BY change_date DESC, id DESC) AS newest,
+                   COUNT(*) OVER item AS changes,
+                   MIN(MIN(old_price, new_price)) OVER item AS min_price,
+                   MAX(MAX(old_price, new_price)) OVER item AS max_price,
+                   MIN(change_date) OVER item AS first_change
+            FROM price_variations
+            {where}
+            WINDOW item AS (PARTITION BY item_id)
+        )
+        WHERE newest = 1
+    ''', params).fetchall()
+    return {row[0]: dict(zip(SUMMARY_FIELDS, row)) for row in rows}
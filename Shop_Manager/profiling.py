@@ -0,0 +1,204 @@
+import cProfile
+import hmac
+import io
+import logging
+import logging.handlers
+import os
+import pstats
+import random
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+from flask import Response, g, request
+
+import metrics
+
+# ------------------ PROFILING ------------------
+# Two tools for "the sales page is slow":
+#   - Request profiler (opt-in): with SHOP_PROFILING=1, or PROFILING in the
+#     create_app config, and SHOP_PROFILE_TOKEN set, a request carrying
+#     ?_profile=1 or an `X-Shop-Profile: 1` header plus the token (header
+#     X-Shop-Profile-Token or ?_profile_token=) runs under cProfile. Without
+#     a token no request is profiled. Its stats are saved to
+#     Database/profiles/ (open them with `python -m pstats` or snakeviz), and
+#     the X-Shop-Profile-File response header names the file. `_profile=text`
+#     returns the slowest functions as plain text instead of the page.
+#     SHOP_PROFILE_SAMPLE profiles that fraction of all requests too, e.g.
+#     0.01, and saves the stats. Only the newest SHOP_PROFILE_KEEP files are
+#     kept. A streamed export is profiled up to its first chunk.
+#   - Slow-query log (opt-in): with SHOP_SLOW_QUERY_MS set, e.g. 500, a
+#     request's statement taking that long or longer is written, with its
+#     bound values inlined and its EXPLAIN QUERY PLAN, to
+#     Database/slow_queries.log. The log rotates at
+#     SHOP_SLOW_QUERY_LOG_BYTES. Statement times come from the trace that
+#     get_connection() installs for metrics.py, so they include fetching the
+#     rows, and the log is off when SHOP_METRICS=0. SHOP_SLOW_QUERY_SAMPLE
+#     logs only that fraction of slow statements.
+# Both are off by default, and then no hooks are registered. With profiling
+# on, a request that does not ask for a profile costs two dict lookups and,
+# when sampling, a random().
+PROFILING = os.environ.get('SHOP_PROFILING', '0') == '1'
+PROFILE_TOKEN = os.environ.get('SHOP_PROFILE_TOKEN', '')
+PROFILE_SAMPLE = float(os.environ.get('SHOP_PROFILE_SAMPLE', '0'))  # fraction of requests profiled unasked
+PROFILE_KEEP = int(os.environ.get('SHOP_PROFILE_KEEP', '50'))        # saved profiles
+PROFILE_LINES = 40  # functions listed by _profile=text
+SLOW_QUERY_MS = float(os.environ.get('SHOP_SLOW_QUERY_MS', '0'))     # e.g. 500; 0 leaves the slow-query log off
+SLOW_QUERY_SAMPLE = float(os.environ.get('SHOP_SLOW_QUERY_SAMPLE', '1'))
+SLOW_QUERY_LOG_BYTES = int(os.environ.get('SHOP_SLOW_QUERY_LOG_BYTES', str(1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = 5
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_connect = None
+_profile_dir = None
+_allow_requests = False
+_token = ''
+_sample = 0.0
+_logger = logging.getLogger('shop.slow_queries')
+_logger.propagate = False
+
+
+def init_app(app, connect, log_dir):
+    """
+    Register the profiler and slow-query hooks on `app` as configured
+    (PROFILING, PROFILE_TOKEN, PROFILE_SAMPLE, SLOW_QUERY_MS config keys
+    override the environment). `connect()` returns the request's connection
+    (app.get_connection), used to EXPLAIN slow statements. Profiles and the
+    log go under `log_dir`.
+    """
+    global _connect, _profile_dir, _allow_requests, _token, _sample
+    _connect = connect
+    _profile_dir = os.path.join(log_dir, 'profiles')
+    _token = app.config.get('PROFILE_TOKEN', PROFILE_TOKEN)
+    _allow_requests = bool(app.config.get('PROFILING', PROFILING))
+    if _allow_requests and not _token:
+        print("⚠️ Profiling is on but SHOP_PROFILE_TOKEN is not set; ?_profile requests are ignored")
+        _allow_requests = False
+    _sample = float(app.config.get('PROFILE_SAMPLE', PROFILE_SAMPLE))
+    if _allow_requests or _sample > 0:
+        app.before_request(_start_profile)
+        app.after_request(_finish_profile)
+        app.teardown_request(_drop_profile)
+
+    slow_ms = float(app.config.get('SLOW_QUERY_MS', SLOW_QUERY_MS))
+    if slow_ms > 0 and metrics.ENABLED:
+        metrics.SLOW_STATEMENT_SECONDS = slow_ms / 1000
+        _open_log(os.path.join(log_dir, 'slow_queries.log'))
+        app.teardown_request(_log_slow)
+    else:
+        metrics.SLOW_STATEMENT_SECONDS = None
+
+
+# ------------------ REQUEST PROFILER ------------------
+def _requested():
+    """'text' or 'save' if this request asked for (and may have) a profile, else None."""
+    if not _allow_requests:
+        return None
+    value = request.args.get('_profile') or request.headers.get('X-Shop-Profile')
+    if not value or value == '0':
+        return None
+    token = request.headers.get('X-Shop-Profile-Token') or request.args.get('_profile_token', '')
+    if not hmac.compare_digest(token.encode(), _token.encode()):
+        return None
+    return 'text' if value == 'text' else 'save'
+
+
+def _start_profile():
+    mode = _requested()
+    if mode is None:
+        if not (_sample and random.random() < _sample):
+            return
+        mode = 'save'
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return  # another profiler is already running (Python 3.12+ allows one per process)
+    g.profile = (profiler, mode, time.perf_counter())
+
+
+def _finish_profile(response):
+    entry = g.pop('profile', None)
+    if entry is None:
+        return response
+    profiler, mode, started = entry
+    profiler.disable()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    path = save_profile(profiler, elapsed_ms)
+    if mode == 'text':
+        out = io.StringIO()
+        out.write(f"{request.method} {request.full_path} took {elapsed_ms:.1f} ms (saved as {path})\n\n")
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        response = Response(out.getvalue(), mimetype='text/plain')
+    if path:
+        response.headers['X-Shop-Profile-File'] = os.path.basename(path)
+    return response
+
+
+def _drop_profile(exc):
+    # A view that raised never reaches _finish_profile
+    entry = g.pop('profile', None)
+    if entry is not None:
+        entry[0].disable()
+
+
+def save_profile(profiler, elapsed_ms):
+    """Write the stats to the profile directory, dropping the oldest beyond PROFILE_KEEP; returns the path."""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    name = '{:%Y%m%d-%H%M%S-%f}-{}-{}-{:.0f}ms.prof'.format(
+        datetime.now(), request.method, re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'index', elapsed_ms)
+    try:
+        os.makedirs(_profile_dir, exist_ok=True)
+        path = os.path.join(_profile_dir, name)
+        profiler.dump_stats(path)
+        saved = sorted(f for f in os.listdir(_profile_dir) if f.endswith('.prof'))
+        for old in saved[:max(len(saved) - PROFILE_KEEP, 0)]:
+            os.remove(os.path.join(_profile_dir, old))
+    except OSError as e:
+        print(f"⚠️ Could not save profile: {e}")
+        return None
+    return path
+
+
+# ------------------ SLOW-QUERY LOG ------------------
+def _open_log(path):
+    for handler in list(_logger.handlers):
+        if getattr(handler, 'baseFilename', None) == os.path.abspath(path):
+            return
+        _logger.removeHandler(handler)
+        handler.close()
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                                   backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8',
+                                                   delay=True)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN of `sql` as indented lines, one per plan step."""
+    depth, lines = {0: -1}, []
+    for node_id, parent, _, detail in conn.execute('EXPLAIN QUERY PLAN ' + sql):
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def _log_slow(exc):
+    metrics.finish_statement()
+    slow = [entry for entry in metrics.pop_slow() if random.random() < SLOW_QUERY_SAMPLE]
+    if not slow:
+        return
+    route = request.url_rule.rule if request.url_rule else request.path
+    with metrics.paused():
+        for sql, seconds in slow:
+            plan = ['(no plan)']
+            if sql.lstrip()[:7].upper().startswith(EXPLAINABLE):
+                try:
+                    plan = explain(_connect(), sql)
+                except sqlite3.Error as e:
+                    plan = [f'(EXPLAIN failed: {e})']
+            _logger.info('%s %s: %.1f ms\n    %s\n    plan:\n%s', request.method, route, seconds * 1000,
+                         ' '.join(sql.split()), '\n'.join('      ' + line for line in plan))
@@ -0,0 +1,203 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from reports import to_day
+
+# ------------------ REPLENISHMENT ------------------
+# refresh() reads the sales history once: SQLite sums it per item and day
+# (GROUP BY item_id, sale_day) in order along the covering index
+# idx_sales_item_day (migration 14), so it neither sorts nor touches the
+# table, and at most one row per item per day comes back. The rows become
+# NumPy arrays of (item, age, quantity) in one C-level conversion. It then
+# computes every item's demand figures at once with bincount over those
+# sparse rows:
+#   - 7- and 28-day average daily demand and the 28-day standard deviation
+#     (days without sales count as zero)
+#   - an exponentially weighted moving average of daily demand, the
+#     forecast. With days counted back from the last complete day, the
+#     EWMA is sum(alpha * (1 - alpha)**age * quantity), so it needs no
+#     per-day or per-item loop.
+#   - days of cover (stock / forecast), a reorder point (lead-time demand
+#     plus safety stock) and a suggested order quantity
+# The results replace the reorder_suggestions table in one transaction,
+# and /api/reorder reads it. Run it from cron / Task Scheduler
+# (`python replenishment.py`), or queue it with POST /api/reorder/refresh.
+# Today's partial sales are left out.
+HISTORY_DAYS = int(os.environ.get('SHOP_REORDER_HISTORY_DAYS', '730'))
+EWMA_SPAN = float(os.environ.get('SHOP_REORDER_EWMA_SPAN', '14'))  # days; alpha = 2 / (span + 1)
+LEAD_TIME_DAYS = float(os.environ.get('SHOP_REORDER_LEAD_DAYS', '7'))  # days from order to delivery
+TARGET_COVER_DAYS = float(os.environ.get('SHOP_REORDER_TARGET_DAYS', '14'))  # cover an order adds beyond the lead time
+SERVICE_Z = float(os.environ.get('SHOP_REORDER_SERVICE_Z', '1.65'))  # safety stock in std devs (~95% service)
+MIN_FORECAST = 0.01  # forecasts below one unit per 100 days count as no demand
+SHORT_WINDOW, LONG_WINDOW = 7, 28
+
+SUGGESTION_COLUMNS = ['item_id', 'item', 'stock', 'avg_daily_7d', 'avg_daily_28d', 'demand_std_28d',
+                      'forecast_daily', 'days_of_cover', 'reorder_point', 'order_quantity', 'needs_reorder',
+                      'computed_at']
+
+def load_history(conn, end_day, history_days=HISTORY_DAYS):
+    """
+    Items as (ids, names, stock) arrays sorted by id, and the sales of the
+    last `history_days` days up to end_day as (item_id, age in days before
+    end_day, quantity) arrays, one entry per item and day with sales.
+    """
+    import numpy as np
+
+    items = conn.execute('SELECT id, item, COALESCE(total_quantity_available, 0) FROM items ORDER BY id'
+                         ).fetchall()
+    item_ids = np.array([row[0] for row in items], dtype=np.int64)
+    names = np.array([row[1] for row in items], dtype=object)
+    stock = np.array([row[2] for row in items], dtype=np.float64)
+
+    # sale_day is the julianday number of the sale's date (a generated column)
+    end = conn.execute('SELECT CAST(julianday(?) AS INTEGER)', (end_day.strftime('%Y-%m-%d'),)).fetchone()[0]
+    daily = np.array(conn.execute('''
+        SELECT item_id, ? - sale_day, SUM(COALESCE(quantity_sold, 0))
+        FROM sales
+        WHERE sale_day > ? AND sale_day <= ? AND item_id IS NOT NULL
+        GROUP BY item_id, sale_day
+    ''', (end, end - history_days, end)).fetchall(), dtype=np.float64).reshape(-1, 3)
+    return (item_ids, names, stock,
+            daily[:, 0].astype(np.int64), daily[:, 1].astype(np.int64), daily[:, 2])
+
+
+def compute(item_ids, stock, sale_item_ids, ages, quantities, ewma_span=EWMA_SPAN, lead_time=LEAD_TIME_DAYS,
+            target_cover=TARGET_COVER_DAYS, service_z=SERVICE_Z):
+    """
+    Demand figures for every item (arrays aligned with the sorted `item_ids`)
+    from sales rows, individual or already summed per item and day. Pure
+    NumPy, no per-item loop.
+    """
+    import numpy as np
+
+    n = len(item_ids)
+    # Position of each sales row's item; rows of deleted items are dropped
+    index = np.searchsorted(item_ids, sale_item_ids)
+    known = index < n
+    known[known] = item_ids[index[known]] == sale_item_ids[known]
+    index, ages, quantities = index[known], ages[known], quantities[known]
+
+    def window_sum(days):
+        mask = ages < days
+        return np.bincount(index[mask], weights=quantities[mask], minlength=n)
+
+    avg_short = window_sum(SHORT_WINDOW) / SHORT_WINDOW
+    avg_long = window_sum(LONG_WINDOW) / LONG_WINDOW
+    # The deviation is over daily totals, so sum each item's sales per day of the window first
+    recent = ages < LONG_WINDOW
+    daily = np.bincount(index[recent] * LONG_WINDOW + ages[recent], weights=quantities[recent],
+                        minlength=n * LONG_WINDOW)
+    variance = np.bincount(np.arange(n * LONG_WINDOW) // LONG_WINDOW, weights=daily ** 2,
+                           minlength=n) / LONG_WINDOW - avg_long ** 2
+    std_long = np.sqrt(np.clip(variance, 0, None))
+
+    alpha = 2 / (ewma_span + 1)
+    forecast = np.bincount(index, weights=alpha * (1 - alpha) ** ages * quantities, minlength=n)
+    # Months-old sales leave a vanishing but non-zero EWMA
+    forecast[forecast < MIN_FORECAST] = 0.0
+
+    safety = service_z * std_long * np.sqrt(lead_time)
+    reorder_point = forecast * lead_time + safety
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(forecast > 0, stock / forecast, np.nan)
+    needs_reorder = (forecast > 0) & (stock <= reorder_point)
+    order_quantity = np.where(needs_reorder,
+                              np.clip(forecast * (lead_time + target_cover) + safety - stock, 0, None), 0.0)
+    return {
+        'avg_daily_7d': avg_short,
+        'avg_daily_28d': avg_long,
+        'demand_std_28d': std_long,
+        'forecast_daily': forecast,
+        'days_of_cover': days_of_cover,
+        'reorder_point': reorder_point,
+        'order_quantity': order_quantity,
+        'needs_reorder': needs_reorder,
+    }
+
+
+def refresh(conn, end_day=None, history_days=HISTORY_DAYS):
+    """
+    Recompute reorder_suggestions for every item from sales up to and
+    including `end_day` (default: yesterday, UTC). Returns counts and phase timings.
+    """
+    import numpy as np
+
+    end_day = end_day or (to_day() - timedelta(days=1))
+    started = time.perf_counter()
+    item_ids, names, stock, sale_item_ids, ages, quantities = load_history(conn, end_day, history_days)
+    loaded = time.perf_counter()
+    result = compute(item_ids, stock, sale_item_ids, ages, quantities)
+    computed = time.perf_counter()
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rounded = {key: np.round(values, 3) for key, values in result.items() if key != 'needs_reorder'}
+    rounded['days_of_cover'] = np.where(np.isnan(rounded['days_of_cover']), None, rounded['days_of_cover'])
+    rows = zip(item_ids.tolist(), names.tolist(), stock.tolist(), rounded['avg_daily_7d'].tolist(),
+               rounded['avg_daily_28d'].tolist(), rounded['demand_std_28d'].tolist(),
+               rounded['forecast_daily'].tolist(), rounded['days_of_cover'].tolist(),
+               rounded['reorder_point'].tolist(), rounded['order_quantity'].tolist(),
+               result['needs_reorder'].astype(int).tolist(), [now] * len(item_ids))
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM reorder_suggestions')
+        conn.executemany(f'''
+            INSERT INTO reorder_suggestions ({', '.join(SUGGESTION_COLUMNS)})
+            VALUES ({', '.join('?' * len(SUGGESTION_COLUMNS))})
+        ''', rows)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    written = time.perf_counter()
+    return {
+        'items': len(item_ids),
+        'sales_days': len(sale_item_ids),  # (item, day) rows with sales
+        'needs_reorder': int(result['needs_reorder'].sum()),
+        'end_day': end_day.strftime('%Y-%m-%d'),
+        'computed_at': now,
+        'load_ms': round((loaded - started) * 1000, 1),
+        'compute_ms': round((computed - loaded) * 1000, 1),
+        'write_ms': round((written - computed) * 1000, 1),
+    }
+
+
+def suggestions(conn, include_all=False, limit=100, offset=0):
+    """Stored suggestions, items to reorder first and least cover first; items without demand last."""
+    limit = max(1, min(int(limit), 1000))
+    where = '' if include_all else 'WHERE needs_reorder = 1'
+    rows = conn.execute(f'''
+        SELECT {', '.join(SUGGESTION_COLUMNS)} FROM reorder_suggestions
+        {where}
+        ORDER BY needs_reorder DESC, days_of_cover IS NULL, days_of_cover, item_id
+        LIMIT ? OFFSET ?
+    ''', (limit, max(int(offset), 0))).fetchall()
+    return [dict(zip(SUGGESTION_COLUMNS, row), needs_reorder=bool(row[10])) for row in rows]
+
+
+def reorder_status(conn):
+    """(items needing a reorder, when the suggestions were computed or None)."""
+    return conn.execute('SELECT COALESCE(SUM(needs_reorder), 0), MAX(computed_at) FROM reorder_suggestions'
+                        ).fetchone()
+
+
+# Recompute the suggestions (e.g. nightly from cron): python replenishment.py [path/to/shop.db]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute demand forecasts and reorder suggestions.')
+    parser.add_argument('db_path', nargs='?')
+    parser.add_argument('--history-days', type=int, default=HISTORY_DAYS)
+    args = parser.parse_args()
+    if args.db_path is None:
+        from app import DB_PATH as db_path
+    else:
+        db_path = args.db_path
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    from migrations import migrate, startup_lock
+    with startup_lock(db_path):
+        migrate(conn)  # reorder_suggestions may not exist yet if the app has not run since upgrading
+    stats = refresh(conn, history_days=args.history_days)
+    print(f"{db_path}: {stats['items']} items, {stats['needs_reorder']} to reorder "
+          f"(load {stats['load_ms']} ms, compute {stats['compute_ms']} ms, write {stats['write_ms']} ms)")
+    conn.close()
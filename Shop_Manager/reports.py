@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+from activity_retention import action_counts
+
+# ------------------ DATE WINDOWS ------------------
+# All timestamps are stored as sortable 'YYYY-MM-DD HH:MM:SS' text (see
+# migration 2), so a "day" or "last N days" filter becomes a half-open range
+#     col >= start AND col < end
+# which SQLite can answer with an index range scan. Wrapping the column in
+# date(...) would force a full table scan instead.
+# Sales, items and price changes are stamped by SQLite's CURRENT_TIMESTAMP,
+# which is UTC, and daily_sales buckets them by that UTC day. So the
+# windows use UTC too: "today" is the current UTC day, and a sale
+# always falls in the same day on the dashboard, in the chart and in exports.
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def utc_now():
+    """The current time on CURRENT_TIMESTAMP's clock (UTC), as a naive datetime."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_day(value=None):
+    """Coerce None (today, UTC), a 'YYYY-MM-DD' string, a datetime or a date to a date."""
+    if value is None:
+        return utc_now().date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], DAY_FORMAT).date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def day_start(day):
+    return to_day(day).strftime(DAY_FORMAT) + " 00:00:00"
+
+
+def day_window(day=None):
+    """(start, end) timestamps covering one calendar day (default: today, UTC)."""
+    day = to_day(day)
+    return day_start(day), day_start(day + timedelta(days=1))
+
+
+def range_window(first_day, last_day):
+    """(start, end) timestamps covering first_day..last_day inclusive."""
+    return day_start(first_day), day_start(to_day(last_day) + timedelta(days=1))
+
+
+# ------------------ SALES TIMESERIES ------------------
+# Reads the trigger-maintained daily_sales table (see summary.py), one row
+# per day, so a chart costs O(days) however many sales there are.
+# SQL expression mapping a 'YYYY-MM-DD' day to its bucket's first day
+BUCKET_SQL = {
+    'day': "day",
+    'week': "date(day, 'weekday 0', '-6 days')",  # Monday of that week
+    'month': "substr(day, 1, 7) || '-01'",
+}
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket that contains `day`."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def sales_timeseries(conn, first_day, last_day, bucket='day'):
+    """
+    Sales totals for first_day..last_day (inclusive) in day/week/month buckets,
+    computed with a single grouped query over daily_sales and zero-filled in Python.
+    Returns a list of {'bucket': 'YYYY-MM-DD', 'total': float, 'sales': int}.
+    """
+    if bucket not in BUCKET_SQL:
+        raise ValueError(f"Unknown bucket '{bucket}', expected one of {sorted(BUCKET_SQL)}")
+    first_day, last_day = to_day(first_day), to_day(last_day)
+    if first_day > last_day:
+        raise ValueError("'from' must not be after 'to'")
+
+    rows = conn.execute(f'''
+        SELECT {BUCKET_SQL[bucket]} AS bucket, SUM(total_amount), SUM(sales_count)
+        FROM daily_sales
+        WHERE day >= ? AND day <= ?
+        GROUP BY bucket
+    ''', (first_day.strftime(DAY_FORMAT), last_day.strftime(DAY_FORMAT))).fetchall()
+    totals = {row[0]: (row[1] or 0, row[2]) for row in rows}
+
+    series = []
+    day = bucket_start(first_day, bucket)
+    while day <= last_day:
+        key = day.strftime(DAY_FORMAT)
+        total, count = totals.get(key, (0, 0))
+        series.append({'bucket': key, 'total': total, 'sales': count})
+        day = next_bucket(day, bucket)
+    return series
+
+
+# ------------------ STATISTICS REPORT ------------------
+def statistics_report(conn):
+    """Everything the /statistics page charts, as JSON-serializable lists."""
+    c = conn.cursor()
+
+    # Activity logs (latest 200)
+    c.execute("SELECT date, action, details FROM activities ORDER BY id DESC LIMIT 200")
+    activities = [{'date': r[0], 'action': r[1], 'details': r[2]} for r in c.fetchall()]
+
+    # Action counts (for bar chart), from the daily rollup so archived history still counts
+    action_counts_rows = action_counts(conn)
+
+    # Sales last 14 days (for line chart)
+    trend = sales_timeseries(conn, to_day() - timedelta(days=13), to_day())
+
+    # Top selling items (sum by item), from the per-item running totals
+    c.execute('''
+        SELECT i.item, SUM(t.quantity_sold) as total_qty, SUM(t.revenue) as total_sales
+        FROM item_sales_totals t
+        JOIN items i ON t.item_id = i.id
+        GROUP BY i.item
+        ORDER BY total_sales DESC
+        LIMIT 10
+    ''')
+    top_rows = c.fetchall()
+
+    return {
+        'activities': activities,
+        'action_labels': [r[0] for r in action_counts_rows],
+        'action_counts': [r[1] for r in action_counts_rows],
+        'sales_dates': [point['bucket'] for point in trend],
+        'sales_values': [point['total'] for point in trend],
+        'top_labels': [r[0] for r in top_rows],
+        'top_sales_values': [r[2] for r in top_rows],  # total_sales
+    }
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+from reports import to_day
+
+# ------------------ RESPONSE CACHE ------------------
+# Read-heavy report pages are rendered once and then served from a bounded
+# in-process LRU cache until the data changes. The "data version" is a
+# single row bumped by triggers on every table those pages read (migrations
+# 7 and 8), so sells, edits, uploads, background jobs and even other processes
+# sharing shop.db invalidate it. A hit costs one primary-key read plus a
+# dict lookup. Each entry also carries an ETag, so a browser revalidating
+# with If-None-Match gets an empty 304.
+CACHE_ENABLED = os.environ.get('SHOP_CACHE', '1') != '0'
+CACHE_SIZE = int(os.environ.get('SHOP_CACHE_SIZE', '64'))     # entries
+CACHE_TTL = float(os.environ.get('SHOP_CACHE_TTL', '300'))   # seconds an entry may live
+
+_entries = OrderedDict()  # key -> (data_version, expires, etag, body, content_type)
+_lock = threading.Lock()
+_connect = None
+_counters = {'hits': 0, 'misses': 0, 'not_modified': 0, 'stale': 0, 'expired': 0, 'evictions': 0}
+
+
+def configure(connect):
+    """`connect()` returns the connection used to read the data version (app.get_connection)."""
+    global _connect
+    _connect = connect
+
+
+def data_version(conn):
+    row = conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+
+def bump_version(conn):
+    """Invalidate cached pages from a write to a table without version triggers (in the caller's transaction)."""
+    conn.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+
+
+def stats():
+    with _lock:
+        requests_ = _counters['hits'] + _counters['misses']
+        return dict(_counters, entries=len(_entries), max_entries=CACHE_SIZE, ttl_seconds=CACHE_TTL,
+                    hit_rate=_counters['hits'] / requests_ if requests_ else 0.0)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def _lookup(key, version):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _counters['misses'] += 1
+            return None
+        if entry[0] != version or entry[1] < time.monotonic():
+            del _entries[key]
+            _counters['stale' if entry[0] != version else 'expired'] += 1
+            _counters['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters['hits'] += 1
+        return entry
+
+
+def _store(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+            _counters['evictions'] += 1
+
+
+def _respond(entry, status):
+    _, _, etag, body, content_type = entry
+    response = make_response(body)
+    response.content_type = content_type
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # browsers must revalidate, cheaply via the ETag
+    response.headers['X-Cache'] = status
+    response = response.make_conditional(request)
+    if response.status_code == 304:
+        with _lock:
+            _counters['not_modified'] += 1
+    return response
+
+
+def cached(view):
+    """
+    Cache a GET view's 200 responses, keyed by path, query string and day
+    (reports relative to "today" roll over at midnight UTC, see reports.py).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not CACHE_ENABLED or request.method != 'GET' or _connect is None:
+            return view(*args, **kwargs)
+        version = data_version(_connect())
+        if version is None:
+            return view(*args, **kwargs)
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))), to_day().isoformat())
+        entry = _lookup(key, version)
+        if entry is not None:
+            return _respond(entry, 'HIT')
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        body = response.get_data()
+        entry = (version, time.monotonic() + CACHE_TTL, hashlib.sha1(body).hexdigest(), body,
+                 response.content_type)
+        _store(key, entry)
+        return _respond(entry, 'MISS')
+    return wrapper
@@ -0,0 +1,176 @@
+import json
+import math
+
+import activity_log
+
+# ------------------ SALE ENGINE ------------------
+# The stock check and decrement happen in one conditional UPDATE, inside a
+# BEGIN IMMEDIATE transaction that also writes the sales and activities rows.
+# Two tills selling the last unit can therefore never both succeed, and a
+# sale costs a single commit.
+
+
+class SaleError(Exception):
+    """A sale was rejected (unknown item, bad quantity or insufficient stock)."""
+
+    def __init__(self, message, problems=None):
+        super().__init__(message)
+        # Per-line reasons for a rejected basket: [{'item_id', 'error'}, ...]
+        self.problems = problems or []
+
+
+def sale_details(quantity, item_name, item_id, total_amount):
+    """Activity log text for a sale (same wording for single sales and baskets)."""
+    return f'Sold {quantity} units of "{item_name}" (id:{item_id}) for {total_amount:.2f} KSH'
+
+
+def record_sale(conn, item_id, quantity):
+    """
+    Sell `quantity` of `item_id` atomically. Returns a receipt dict
+    {'item_id', 'item', 'quantity', 'unit_price', 'total_amount', 'remaining'}.
+    Raises SaleError if the sale is rejected; nothing is written in that case.
+    sqlite3.OperationalError ('database is locked') propagates if the write
+    lock cannot be taken within the busy timeout.
+    """
+    if not math.isfinite(quantity) or quantity <= 0:
+        raise SaleError('Quantity must be a number greater than zero')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('''
+            UPDATE items
+            SET total_quantity_available = total_quantity_available - ?,
+                total_stock_amount = (total_quantity_available - ?) * price_per_pc_or_kg
+            WHERE id = ? AND total_quantity_available >= ?
+            RETURNING item, price_per_pc_or_kg, total_quantity_available
+        ''', (quantity, quantity, item_id, quantity)).fetchone()
+
+        if row is None:
+            exists = conn.execute('SELECT item, total_quantity_available FROM items WHERE id = ?',
+                                  (item_id,)).fetchone()
+            if exists is None:
+                raise SaleError(f'Item id {item_id} not found')
+            raise SaleError(f'Insufficient stock for "{exists[0]}": {exists[1]} available, {quantity} requested')
+
+        item_name, unit_price, remaining = row
+        total_amount = quantity * unit_price
+        conn.execute('INSERT INTO sales (item_id, quantity_sold, total_amount) VALUES (?, ?, ?)',
+                     (item_id, quantity, total_amount))
+        activity_log.record(conn, "SALE", sale_details(quantity, item_name, item_id, total_amount))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {
+        'item_id': item_id,
+        'item': item_name,
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total_amount': total_amount,
+        'remaining': remaining,
+    }
+
+
+def _item_id(value):
+    """A whole-number item id; 3.7 or True would otherwise silently become item 3 or 1."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'item_id must be a whole number, got {value!r}')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'item_id must be a whole number, got {value!r}')
+
+
+def merge_lines(lines):
+    """
+    Validate (item_id, quantity) pairs and merge repeated items, keeping
+    basket order. Raises ValueError for a malformed line (bad id, or a
+    quantity that is not a finite number) and SaleError for a quantity <= 0.
+    """
+    merged = {}
+    for item_id, quantity in lines:
+        item_id = _item_id(item_id)
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            raise ValueError(f'Quantity for item id {item_id} must be a number, got {quantity!r}')
+        if not math.isfinite(quantity):
+            raise ValueError(f'Quantity for item id {item_id} must be a finite number, got {quantity!r}')
+        if quantity <= 0:
+            raise SaleError(f'Quantity for item id {item_id} must be greater than zero',
+                            [{'item_id': item_id, 'error': 'quantity must be greater than zero'}])
+        merged[item_id] = merged.get(item_id, 0) + quantity
+    if not merged:
+        raise SaleError('Basket is empty')
+    return list(merged.items())
+
+
+def record_checkout(conn, lines):
+    """
+    Sell a whole basket of (item_id, quantity) lines in one transaction:
+    one query validates every line's stock, then executemany applies all
+    decrements, sales rows and activity rows, followed by a single commit.
+    Either every line is sold or nothing is; a rejected basket raises
+    SaleError whose .problems lists each failing line.
+    Returns {'lines': [...], 'total_amount': float, 'date': str}, where date
+    is the sales rows' timestamp (UTC CURRENT_TIMESTAMP, as record_sale and
+    the column default write it).
+    """
+    lines = merge_lines(lines)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # One clock for all sales rows: the same one record_sale and the daily buckets use
+        sale_time = conn.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+        # The write lock is held from here on, so stock cannot change under us
+        ids = json.dumps([item_id for item_id, _ in lines])
+        stock = {row[0]: row[1:] for row in conn.execute(
+            'SELECT id, item, price_per_pc_or_kg, total_quantity_available FROM items '
+            'WHERE id IN (SELECT value FROM json_each(?))', (ids,))}
+
+        problems = []
+        for item_id, quantity in lines:
+            if item_id not in stock:
+                problems.append({'item_id': item_id, 'error': 'not found'})
+            elif stock[item_id][2] < quantity:
+                problems.append({'item_id': item_id, 'item': stock[item_id][0],
+                                 'error': f'insufficient stock: {stock[item_id][2]} available, {quantity} requested'})
+        if problems:
+            raise SaleError(f'{len(problems)} basket line(s) cannot be sold', problems)
+
+        receipt_lines = []
+        for item_id, quantity in lines:
+            item_name, unit_price, available = stock[item_id]
+            receipt_lines.append({
+                'item_id': item_id,
+                'item': item_name,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_amount': quantity * unit_price,
+                'remaining': available - quantity,
+            })
+
+        c = conn.cursor()
+        c.executemany('''
+            UPDATE items
+            SET total_quantity_available = total_quantity_available - ?,
+                total_stock_amount = (total_quantity_available - ?) * price_per_pc_or_kg
+            WHERE id = ? AND total_quantity_available >= ?
+        ''', [(l['quantity'], l['quantity'], l['item_id'], l['quantity']) for l in receipt_lines])
+        if c.rowcount != len(receipt_lines):
+            raise SaleError('Stock changed during checkout, please retry')
+        c.executemany('INSERT INTO sales (item_id, quantity_sold, total_amount, date) VALUES (?, ?, ?, ?)',
+                      [(l['item_id'], l['quantity'], l['total_amount'], sale_time) for l in receipt_lines])
+        activity_log.record_many(conn, [("SALE", sale_details(l['quantity'], l['item'], l['item_id'],
+                                                               l['total_amount'])) for l in receipt_lines])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {
+        'lines': receipt_lines,
+        'total_amount': sum(l['total_amount'] for l in receipt_lines),
+        'date': sale_time,
+    }
@@ -0,0 +1,81 @@
+import argparse
+import sqlite3
+
+# ------------------ DASHBOARD AGGREGATES ------------------
+# shop_summary (one row), daily_sales and item_sales_totals are kept up to
+# date by triggers on items and sales (migration 6), so every write path -
+# sell_item, checkout, add/update/delete, uploads, even external scripts -
+# maintains them in the same transaction. The dashboard then reads a
+# handful of rows however large `sales` grows. check() compares them with
+# a full recomputation and rebuild() recomputes them from scratch.
+
+# Full recomputations the maintained tables must match
+EXPECTED_SQL = {
+    'shop_summary': '''
+        SELECT 1, COUNT(*), COALESCE(SUM(total_stock_amount), 0) FROM items
+    ''',
+    'daily_sales': '''
+        SELECT substr(date, 1, 10), SUM(COALESCE(total_amount, 0)), COUNT(*) FROM sales
+        GROUP BY substr(date, 1, 10)
+    ''',
+    'item_sales_totals': '''
+        SELECT item_id, SUM(COALESCE(quantity_sold, 0)), SUM(COALESCE(total_amount, 0)) FROM sales
+        GROUP BY item_id
+    ''',
+}
+ACTUAL_SQL = {
+    'shop_summary': 'SELECT id, total_items, total_stock_value FROM shop_summary',
+    'daily_sales': 'SELECT day, total_amount, sales_count FROM daily_sales WHERE sales_count != 0',
+    'item_sales_totals': '''
+        SELECT item_id, quantity_sold, revenue FROM item_sales_totals
+        WHERE quantity_sold != 0 OR revenue != 0
+    ''',
+}
+
+
+def rebuild(conn, commit=True):
+    """Recompute every aggregate from items and sales."""
+    for table, sql in EXPECTED_SQL.items():
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'INSERT INTO {table} {sql}')
+    if commit:
+        conn.commit()
+
+
+def check(conn, tolerance=0.005):
+    """
+    Compare the maintained aggregates with a full recomputation.
+    Returns a list of (table, key, maintained row, expected row) mismatches.
+    """
+    problems = []
+    for table, sql in EXPECTED_SQL.items():
+        expected = {row[0]: row[1:] for row in conn.execute(sql)}
+        actual = {row[0]: row[1:] for row in conn.execute(ACTUAL_SQL[table])}
+        for key in sorted(set(expected) | set(actual), key=str):
+            want, have = expected.get(key), actual.get(key)
+            if want is None or have is None or any(abs((a or 0) - (b or 0)) > tolerance
+                                                  for a, b in zip(want, have)):
+                problems.append((table, key, have, want))
+    return problems
+
+
+# Check (and optionally repair) a database: python summary.py [--rebuild] [path/to/shop.db]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or rebuild the dashboard aggregate tables.')
+    parser.add_argument('db_path', nargs='?')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the aggregates from scratch')
+    args = parser.parse_args()
+    if args.db_path is None:
+        from app import DB_PATH as db_path
+    else:
+        db_path = args.db_path
+    conn = sqlite3.connect(db_path, timeout=5)
+    if args.rebuild:
+        rebuild(conn)
+        print(f"{db_path}: aggregates rebuilt")
+    problems = check(conn)
+    for table, key, have, want in problems:
+        print(f"  {table}[{key}]: maintained {have}, expected {want}")
+    print(f"{db_path}: {'OK' if not problems else f'{len(problems)} mismatches (run with --rebuild)'}")
+    conn.close()
+    raise SystemExit(1 if problems else 0)
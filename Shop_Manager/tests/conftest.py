@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import activity_log  # noqa: E402
+import app as shop  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on an empty, fully migrated database of its own, without background workers."""
+    yield shop.create_app({'DB_PATH': str(tmp_path / 'shop.db'), 'START_JOBS': False})
+    # Queued activity events go to the current app's database: write them before the next test's app
+    activity_log.flush()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db(app):
+    conn = shop.get_connection(request_scoped=False)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def run_job(app, monkeypatch):
+    """Run a queued job synchronously on this thread, as a worker would (START_JOBS is off)."""
+    import jobs
+    monkeypatch.setattr(jobs, '_connect', lambda: shop.get_connection(request_scoped=False))
+    return jobs._run
@@ -0,0 +1,9 @@
+import activity_log
+
+
+def test_log_without_configure_writes_directly(app, db, monkeypatch):
+    # As in a script that imports the modules but never calls create_app()
+    monkeypatch.setattr(activity_log, '_connect', None)
+    activity_log.log('TEST', 'logged before configure()')
+    assert db.execute("SELECT action, details FROM activities WHERE action = 'TEST'").fetchall() == [
+        ('TEST', 'logged before configure()')]
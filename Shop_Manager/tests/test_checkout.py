@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def items(db):
+    db.executemany('INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available, '
+                   'total_stock_amount) VALUES (?, ?, ?, ?, ?, ?)',
+                   [(1, 'Bread', '', 50.0, 10, 500.0), (2, 'Rice 1KG', '', 120.0, 3, 360.0)])
+    db.commit()
+
+
+def stock(db):
+    return dict(db.execute('SELECT id, total_quantity_available FROM items'))
+
+
+def test_receipt_merges_lines_and_matches_the_stored_rows(client, db, items):
+    response = client.post('/api/checkout', json={'lines': [
+        {'item_id': 1, 'quantity': 2}, {'item_id': 2, 'quantity': 0.5}, {'item_id': 1, 'quantity': 1}]})
+    assert response.status_code == 200
+    receipt = response.get_json()
+    assert [(l['item_id'], l['quantity'], l['total_amount'], l['remaining']) for l in receipt['lines']] == [
+        (1, 3, 150.0, 7), (2, 0.5, 60.0, 2.5)]
+    assert receipt['total_amount'] == 210.0
+
+    assert stock(db) == {1: 7, 2: 2.5}
+    assert db.execute('SELECT total_stock_amount FROM items WHERE id = 2').fetchone() == (300.0,)
+    assert db.execute('SELECT item_id, quantity_sold, total_amount, date FROM sales ORDER BY id').fetchall() == [
+        (1, 3, 150.0, receipt['date']), (2, 0.5, 60.0, receipt['date'])]
+    assert db.execute("SELECT COUNT(*) FROM activities WHERE action = 'SALE'").fetchone() == (2,)
+
+
+def test_sales_are_stamped_in_utc_like_single_sales(client, db, items):
+    receipt = client.post('/api/checkout', json=[{'item_id': 1, 'quantity': 1}]).get_json()
+    client.post('/sell/1', data={'quantity_sold': '1'})
+    checkout_date, sell_date = [row[0] for row in db.execute('SELECT date FROM sales ORDER BY id')]
+    assert checkout_date == receipt['date']
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for stamp in (checkout_date, sell_date):
+        assert abs(datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S') - now) < timedelta(minutes=1)
+    # Both land in the same daily bucket of the dashboard aggregates
+    assert db.execute('SELECT day, sales_count FROM daily_sales').fetchall() == [(checkout_date[:10], 2)]
+
+
+def test_a_basket_with_one_bad_line_sells_nothing(client, db, items):
+    response = client.post('/api/checkout', json={'lines': [
+        {'item_id': 1, 'quantity': 2}, {'item_id': 2, 'quantity': 4}, {'item_id': 99, 'quantity': 1}]})
+    assert response.status_code == 409
+    problems = response.get_json()['problems']
+    assert [(p['item_id'], p['error'][:12]) for p in problems] == [(2, 'insufficient'), (99, 'not found')]
+    assert stock(db) == {1: 10, 2: 3}
+    assert db.execute('SELECT COUNT(*) FROM sales').fetchone() == (0,)
+
+
+@pytest.mark.parametrize('body', [
+    {'lines': [{'item_id': 1}]},
+    {'lines': [{'item_id': 1.5, 'quantity': 1}]},
+    {'lines': [{'item_id': 1, 'quantity': 'NaN'}]},
+    {'lines': [{'item_id': 'one', 'quantity': 1}]},
+])
+def test_malformed_lines_are_rejected(client, db, items, body):
+    assert client.post('/api/checkout', json=body).status_code == 400
+    assert stock(db) == {1: 10, 2: 3}
+
+
+def test_empty_or_non_positive_baskets_are_refused(client, items):
+    assert client.post('/api/checkout', json={'lines': []}).status_code == 409
+    assert client.post('/api/checkout', json={'lines': [{'item_id': 1, 'quantity': 0}]}).status_code == 409
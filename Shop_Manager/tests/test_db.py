@@ -0,0 +1,67 @@
+import io
+import sqlite3
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Every connection db.acquire() opens, with the pool turned off (SHOP_DB_POOL=0)."""
+    monkeypatch.setattr(db, 'POOL_ENABLED', False)
+    connections = []
+    acquire = db.acquire
+
+    def tracked(db_path):
+        conn = acquire(db_path)
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, 'acquire', tracked)
+    return connections
+
+
+def is_closed(conn):
+    try:
+        conn.execute('SELECT 1')
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+@pytest.mark.parametrize('path', ['/api/jobs/1', '/api/expiry', '/expiry-status', '/sales'])
+def test_unpooled_request_connection_is_closed_at_teardown(client, opened, path):
+    response = client.get(path)
+    assert response.status_code in (200, 404)
+    assert len(opened) == 1  # every get_connection() in the request shares it
+    assert is_closed(opened[0])
+
+
+def test_unpooled_sell_closes_its_connection(client, db, opened):
+    db.execute("INSERT INTO items (id, item, price_per_pc_or_kg, total_quantity_available) VALUES (1, 'Salt', 1, 5)")
+    db.commit()
+    client.post('/sell/1', data={'quantity_sold': '1'})
+    assert opened and all(is_closed(conn) for conn in opened)
+
+
+def test_unpooled_upload_closes_its_connection(client, opened):
+    response = client.post('/upload', data={'file': (io.BytesIO(b'ITEM\n'), 'stock.csv')})
+    assert response.status_code == 302
+    assert opened and all(is_closed(conn) for conn in opened)
+
+
+def test_fit_pool_grows_to_the_thread_count(monkeypatch):
+    monkeypatch.delenv('SHOP_DB_POOL_SIZE', raising=False)
+    monkeypatch.setattr(db, 'POOL_SIZE', 8)
+    db.fit_pool(16)
+    assert db.POOL_SIZE == 16
+    db.fit_pool(4)  # never shrinks below the default
+    assert db.POOL_SIZE == 16
+
+
+def test_fit_pool_leaves_an_explicit_size(monkeypatch):
+    monkeypatch.setenv('SHOP_DB_POOL_SIZE', '2')
+    monkeypatch.setattr(db, 'POOL_SIZE', 2)
+    db.fit_pool(16)
+    assert db.POOL_SIZE == 2
@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+import expiry
+
+TODAY = date(2025, 6, 10)
+
+
+@pytest.fixture
+def stocked(db):
+    db.executemany('INSERT INTO items (id, item, price_per_pc_or_kg) VALUES (?, ?, 1)',
+                   [(1, 'Milk'), (2, 'Yoghurt'), (3, 'Salt')])
+    db.commit()
+    return db
+
+
+def dates(db):
+    return db.execute('SELECT item_id, expiry_date FROM expiry ORDER BY item_id').fetchall()
+
+
+def test_form_sets_changes_and_clears_dates(client, stocked):
+    response = client.post('/update-expiry', data={
+        'expiry_date_1': '2025-06-12', 'expiry_date_2': ' 2025-06-01 ', 'expiry_date_3': '',
+        'expiry_date_99': '2025-07-01',  # unknown item: skipped
+        'expiry_date_x': 'junk', 'csrf': 'ignored',
+    })
+    assert response.status_code == 302
+    assert dates(stocked) == [(1, '2025-06-12'), (2, '2025-06-01')]
+
+    client.post('/update-expiry', data={'expiry_date_1': '', 'expiry_date_2': '2025-06-30'})
+    assert dates(stocked) == [(2, '2025-06-30')]
+
+
+def test_an_invalid_date_saves_nothing(client, stocked):
+    client.post('/update-expiry', data={'expiry_date_1': '2025-06-12'})
+    client.post('/update-expiry', data={'expiry_date_1': '', 'expiry_date_2': '12/06/2025'})
+    with client.session_transaction() as session:
+        assert 'Invalid expiry date' in session['_flashes'][-1][1]
+    assert dates(stocked) == [(1, '2025-06-12')]
+
+
+def test_only_changed_rows_are_counted(stocked):
+    assert expiry.save_expiry_dates(stocked, [(1, '2025-06-12'), (2, ''), (3, '2025-07-01')]) == 2
+    assert expiry.save_expiry_dates(stocked, [(1, '2025-06-12'), (3, '2025-07-02'), (2, '')]) == 1
+
+
+def test_status_is_derived_from_the_date(stocked):
+    expiry.save_expiry_dates(stocked, [(1, '2025-06-10'), (2, '2025-06-11')])
+    assert [(row['id'], row['expiry_date'], row['expiry_status'])
+            for row in expiry.expiry_listing(stocked, today=TODAY)] == [
+        (1, '2025-06-10', 'Expired'), (2, '2025-06-11', 'Valid'), (3, '', 'N/A')]
+    assert expiry.expired_count(stocked, today=TODAY) == 1
+    assert expiry.expired_count(stocked, today=date(2025, 6, 11)) == 2
+
+
+def test_expiring_within(stocked):
+    expiry.save_expiry_dates(stocked, [(1, '2025-06-01'), (2, '2025-06-17'), (3, '2025-06-12')])
+    soon = expiry.expiring_within(stocked, 7, today=TODAY)
+    assert [(row['item_id'], row['days_left'], row['status']) for row in soon] == [(3, 2, 'Valid'), (2, 7, 'Valid')]
+    assert [row['item_id'] for row in expiry.expiring_within(stocked, 2, include_expired=True, today=TODAY)] == [1, 3]
+    with pytest.raises(ValueError):
+        expiry.expiring_within(stocked, -1)
+
+
+def test_api_expiry_rejects_a_negative_window(client):
+    assert client.get('/api/expiry?within_days=-1').status_code == 400
+    assert client.get('/api/expiry?within_days=5').get_json() == {'within_days': 5, 'count': 0, 'items': []}
+
+
+def test_deleting_an_item_drops_its_expiry_date(stocked):
+    expiry.save_expiry_dates(stocked, [(1, '2025-06-12'), (2, '2025-06-13')])
+    stocked.execute('DELETE FROM items WHERE id = 1')
+    stocked.commit()
+    assert dates(stocked) == [(2, '2025-06-13')]
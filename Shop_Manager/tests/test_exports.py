@@ -0,0 +1,60 @@
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+import exports
+
+
+@pytest.fixture
+def items(db):
+    db.executemany('INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available) '
+                   'VALUES (?, ?, ?, ?)', [(f'Item {n}', 'a & <b>' if n == 1 else None, n * 1.5, n)
+                                           for n in range(1, 8)])
+    db.commit()
+
+
+def test_csv_streams_header_then_one_chunk_per_fetch(client, items, monkeypatch):
+    monkeypatch.setattr(exports, 'FETCH_ROWS', 3)
+    response = client.get('/export/items.csv', buffered=False)
+    chunks = list(response.response)
+    response.close()
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=items.csv'
+    assert len(chunks) == 3  # 7 rows fetched 3 at a time, the header riding on the first chunk
+    rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+    assert rows[0] == exports.EXPORTS['items'][1]
+    assert [row[1] for row in rows[1:]] == [f'Item {n}' for n in range(1, 8)]
+
+
+def test_xlsx_starts_before_the_query_and_rolls_over_sheets(client, items, monkeypatch):
+    monkeypatch.setattr(exports, 'XLSX_SHEET_ROWS', 5)
+    response = client.get('/export/items.xlsx', buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    assert first.startswith(b'PK')  # the first sheet's zip header, sent before any row is read
+    data = first + b''.join(chunks)
+    response.close()
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    header = exports.EXPORTS['items'][1]
+    sheets = [list(sheet.values) for sheet in workbook.worksheets]
+    assert [len(rows) for rows in sheets] == [6, 3]  # header + 5 rows, header + 2 rows
+    assert all(list(rows[0]) == header for rows in sheets)
+    assert sheets[0][1][:5] == (1, 'Item 1', 'a & <b>', 1.5, 1)
+    assert sheets[1][-1][1] == 'Item 7'
+
+
+def test_empty_xlsx_has_the_header(client):
+    response = client.get('/export/activities.xlsx')
+    workbook = load_workbook(io.BytesIO(response.data), read_only=True)
+    assert [list(row) for row in workbook.active.values] == [exports.EXPORTS['activities'][1]]
+
+
+@pytest.mark.parametrize('path', ['/export/nope.csv', '/export/items.pdf',
+                                  '/export/sales.csv?from=2025-02-01&to=2025-01-01'])
+def test_bad_exports_are_400(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
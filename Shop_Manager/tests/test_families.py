@@ -0,0 +1,30 @@
+import families
+import response_cache
+
+
+def test_substitutes_groups_items_added_through_the_app(client, db):
+    for name in ('TOSS BLUE 20G', 'Toss yellow 500g', 'OMO 1KG'):
+        client.post('/add', data={'item': name, 'description': '', 'price_per_pc_or_kg': '10',
+                                  'total_quantity_available': '2'})
+    assert families.family_summary(db) == {
+        'TOSS': {'frequency': 2, 'total_quantity': 4.0},
+        'OMO': {'frequency': 1, 'total_quantity': 2.0},
+    }
+
+
+def test_substitutes_get_does_not_write(client, db):
+    db.execute("INSERT INTO items (item, price_per_pc_or_kg, total_quantity_available) VALUES ('OMO 1KG', 1, 1)")
+    db.commit()
+    version = response_cache.data_version(db)
+    assert client.get('/substitutes').status_code == 200
+    # Added outside the app: pending until refresh() runs, and the GET leaves it so
+    assert db.execute('SELECT family FROM item_families').fetchall() == [(None,)]
+    assert response_cache.data_version(db) == version
+
+
+def test_rebuild_bumps_the_data_version(app, db):
+    db.execute("INSERT INTO items (item, price_per_pc_or_kg) VALUES ('OMO 1KG', 1)")
+    db.commit()
+    version = response_cache.data_version(db)
+    assert families.rebuild(db) == 1
+    assert response_cache.data_version(db) == version + 1
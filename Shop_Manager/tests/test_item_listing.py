@@ -0,0 +1,35 @@
+import json
+import re
+
+# Items named so that sorting by name runs opposite to sorting by id; every
+# third one is out of stock
+NAMES = ['Zucchini', 'Yam', 'Walnut', 'Tomato', 'Spinach', 'Rice', 'Pepper', 'Onion', 'Mango']
+
+
+def add_items(db):
+    db.executemany('INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available) '
+                   'VALUES (?, ?, 1.0, ?)', [(name, '', 0 if i % 3 == 0 else 5) for i, name in enumerate(NAMES)])
+    db.commit()
+
+
+def next_page(client, html):
+    """Fetch page two the way the template's fetchPage() does: its listing query plus the cursor."""
+    query = json.loads(re.search(r'const listingQuery = (\{.*?\});', html).group(1))
+    cursor = json.loads(re.search(r'let nextCursor = (".*?");', html).group(1))
+    assert cursor, 'the first page should not be the last'
+    response = client.get('/api/items', query_string={**query, 'q': '', 'cursor': cursor})
+    assert response.status_code == 200
+    return [item['item'] for item in response.get_json()['items']]
+
+
+def test_page_two_keeps_a_non_default_sort(client, db):
+    add_items(db)
+    html = client.get('/price-list?sort=item&dir=desc&limit=3').get_data(as_text=True)
+    assert next_page(client, html) == sorted(NAMES, reverse=True)[3:6]
+
+
+def test_page_two_keeps_in_stock(client, db):
+    add_items(db)
+    html = client.get('/sales?in_stock=1&limit=3').get_data(as_text=True)
+    in_stock = [name for i, name in enumerate(NAMES) if i % 3 != 0]
+    assert next_page(client, html) == in_stock[3:6]
@@ -0,0 +1,68 @@
+import pytest
+
+import item_search
+
+
+@pytest.fixture
+def catalogue(db):
+    db.executemany('INSERT INTO items (id, item, description, price_per_pc_or_kg) VALUES (?, ?, ?, 1)', [
+        (1, 'Sugar 1KG', 'brown'),
+        (2, 'Kabras Sugar 2KG', 'white'),
+        (3, 'Salt 500G', 'sugar-free'),
+        (4, 'Café Touch', 'coffee, 50%-off'),
+    ])
+    db.commit()
+    return db
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Sug 1k', '"sug"* "1k"*'),
+    ('  "sugar" OR salt*', '"sugar"* "or"* "salt"*'),  # FTS syntax is quoted away
+    ('CAFÉ', '"café"*'),
+    ('%- !', None),
+])
+def test_match_expression(text, expected):
+    assert item_search.match_expression(text) == expected
+
+
+def test_match_expression_for_a_column():
+    assert item_search.match_expression('sug 1k', column='item') == 'item : ("sug"* "1k"*)'
+
+
+def test_search_ranks_name_matches_above_description_matches(catalogue):
+    assert ids(item_search.search_items(catalogue, 'sug')) == [1, 2, 3]
+    assert ids(item_search.search_items(catalogue, 'sugar 2')) == [2]
+    assert ids(item_search.search_items(catalogue, 'sug', limit=1)) == [1]
+
+
+def test_index_follows_renames_and_deletes(catalogue):
+    catalogue.execute("UPDATE items SET item = 'Honey 1KG', description = '' WHERE id = 1")
+    catalogue.execute('DELETE FROM items WHERE id = 2')
+    catalogue.commit()
+    assert ids(item_search.search_items(catalogue, 'sugar')) == [3]
+    assert ids(item_search.search_items(catalogue, 'hon')) == [1]
+
+
+def test_autocomplete_matches_item_names_only(catalogue):
+    assert sorted(ids(item_search.autocomplete(catalogue, 'sug'))) == [1, 2]
+    assert ids(item_search.autocomplete(catalogue, 'kab sug')) == [2]
+
+
+def test_like_fallback_without_fts(catalogue, monkeypatch):
+    monkeypatch.setattr(item_search, 'fts_available', lambda conn: False)
+    assert ids(item_search.search_items(catalogue, 'ugar 2')) == [2]  # substring, not word prefix
+    assert ids(item_search.autocomplete(catalogue, 'alt')) == [3]
+
+
+def test_punctuation_only_query_falls_back_to_like(catalogue):
+    assert ids(item_search.search_items(catalogue, '%-')) == [3, 4]  # 'sugar-free', '50%-off'
+
+
+def test_search_routes(client, catalogue):
+    assert [row['id'] for row in client.get('/api/search-items?q=kab').get_json()] == [2]
+    page = client.get('/search?query=salt')
+    assert page.status_code == 200 and b'Salt 500G' in page.data
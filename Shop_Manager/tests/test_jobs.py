@@ -0,0 +1,80 @@
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Register an 'echo' job kind; returns the list of params it was called with."""
+    seen = []
+
+    def echo(conn, params, progress):
+        seen.append(params)
+        progress({'step': 1})
+        if params.get('fail'):
+            raise RuntimeError('boom')
+        return {'echo': params['value']}
+
+    monkeypatch.setitem(jobs._handlers, 'echo', echo)
+    return seen
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def running_job(db, owner, heartbeat):
+    return db.execute('''
+        INSERT INTO jobs (kind, status, params, created, heartbeat, owner)
+        VALUES ('echo', 'running', '{"value": 1}', ?, ?, ?)
+    ''', (heartbeat, heartbeat, owner)).lastrowid
+
+
+def test_job_runs_once_and_stores_its_result(db, calls, run_job):
+    job_id = jobs.enqueue(db, 'echo', {'value': 42})
+    assert jobs.get_job(db, job_id)['status'] == 'queued'
+    run_job(job_id)
+    run_job(job_id)  # already claimed: a second worker does nothing
+    job = jobs.get_job(db, job_id)
+    assert (job['status'], job['result'], job['progress'], job['owner']) == (
+        'done', {'echo': 42}, {'step': 1}, jobs._owner())
+    assert calls == [{'value': 42}]
+
+
+def test_failed_job_records_the_error(db, calls, run_job):
+    job_id = jobs.enqueue(db, 'echo', {'fail': True})
+    run_job(job_id)
+    job = jobs.get_job(db, job_id)
+    assert (job['status'], job['error']) == ('failed', 'boom')
+
+
+def test_unknown_kind_is_refused(db):
+    with pytest.raises(ValueError):
+        jobs.enqueue(db, 'no-such-kind')
+
+
+def test_requeue_orphans_reclaims_dead_and_stale_jobs_only(db, calls, run_job, monkeypatch):
+    fresh = jobs._now()
+    stale = (datetime.now() - jobs.STALE_AFTER * 2).strftime('%Y-%m-%d %H:%M:%S')
+    dead = running_job(db, f'{jobs.HOST}:{dead_pid()}', fresh)
+    silent = running_job(db, 'other-host:123', stale)
+    elsewhere = running_job(db, 'other-host:123', fresh)
+    ours = running_job(db, jobs._owner(), fresh)
+    forgotten = running_job(db, jobs._owner(), fresh)  # an earlier process that had our pid
+    db.commit()
+    monkeypatch.setattr(jobs, '_running', {ours})
+
+    assert sorted(jobs.requeue_orphans(db)) == sorted([dead, silent, forgotten])
+    statuses = dict(db.execute('SELECT id, status FROM jobs'))
+    assert [statuses[i] for i in (dead, silent, elsewhere, ours, forgotten)] == [
+        'queued', 'queued', 'running', 'running', 'queued']
+
+    # A requeued job runs again on the next worker that claims it
+    run_job(dead)
+    assert jobs.get_job(db, dead)['result'] == {'echo': 1}
@@ -0,0 +1,100 @@
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import app as shop
+import migrations
+import summary
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    """A pre-migration shop.db: the original tables plus the name-keyed expiry tables, with some rows."""
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    shop.create_base_tables(conn)
+    conn.execute('CREATE TABLE expiry (item TEXT PRIMARY KEY, expiry_date TEXT, expiry_status TEXT)')
+    conn.execute('CREATE TABLE expiry_data (item_name TEXT, expiry_date TEXT)')
+    conn.executemany('INSERT INTO items (id, item, price_per_pc_or_kg, total_stock_amount, date_added) '
+                     'VALUES (?, ?, 1, ?, ?)',
+                     [(1, 'Milk', 10, '2024-03-01T08:00:00'), (2, 'Jam', 5, '2024-03-02'), (3, 'Jam', 2, None)])
+    conn.executemany('INSERT INTO sales (item_id, quantity_sold, total_amount, date) VALUES (?, ?, ?, ?)',
+                     [(1, 2, 2, '2024-03-05T10:00:00.123'), (1, 1, 1, '2024-03-05 18:00:00'),
+                      (2, 3, 6, '2024-03-06 09:00:00')])
+    conn.execute("INSERT INTO activities (action, details, date) VALUES ('SALE', 'x', '2024-03-05T10:00:00')")
+    conn.executemany('INSERT INTO expiry (item, expiry_date) VALUES (?, ?)',
+                     [('Milk', '2024-04-01'), ('Jam', 'soon')])
+    conn.executemany('INSERT INTO expiry_data (item_name, expiry_date) VALUES (?, ?)',
+                     [('Milk', '2024-01-01'), ('Jam', '2024-05-01')])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_new_database_is_on_the_latest_version(db):
+    assert migrations.current_version(db) == migrations.LATEST_VERSION
+    assert migrations.migrate(db) == []
+
+
+def test_legacy_database_upgrades_in_place(legacy):
+    assert migrations.migrate(legacy) == list(range(1, migrations.LATEST_VERSION + 1))
+    assert migrations.current_version(legacy) == migrations.LATEST_VERSION
+
+    assert legacy.execute('SELECT date FROM sales ORDER BY id').fetchall()[0] == ('2024-03-05 10:00:00',)
+    # expiry is keyed by item_id; the app's own rows win over expiry_data and bad dates are dropped
+    assert legacy.execute('SELECT item_id, expiry_date FROM expiry ORDER BY item_id').fetchall() == [
+        (1, '2024-04-01'), (2, '2024-05-01'), (3, '2024-05-01')]
+    tables = {row[0] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not {'expiry_legacy', 'expiry_data'} & tables
+
+    # Backfills of the trigger-maintained tables
+    assert summary.check(legacy) == []
+    assert legacy.execute('SELECT day, action, count FROM activity_daily_counts').fetchall() == [
+        ('2024-03-05', 'SALE', 1)]
+    assert legacy.execute('SELECT COUNT(*) FROM item_families WHERE family IS NULL').fetchone() == (3,)
+    assert legacy.execute('SELECT sale_day FROM sales WHERE id = 3').fetchone() == (
+        legacy.execute("SELECT CAST(julianday('2024-03-06') AS INTEGER)").fetchone())
+
+    version = legacy.execute('SELECT version FROM data_version').fetchone()[0]
+    legacy.execute("INSERT INTO expiry (item_id, expiry_date) VALUES (9, '2025-01-01')")
+    assert legacy.execute('SELECT version FROM data_version').fetchone()[0] == version + 1
+
+
+def test_migrate_stops_at_target_and_resumes(legacy):
+    assert migrations.migrate(legacy, target=7) == list(range(1, 8))
+    # Migration 7 leaves the name-keyed expiry table alone; 8 folds it and adds its triggers
+    assert 'trg_expiry_data_version_insert' not in {
+        row[0] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert migrations.migrate(legacy) == list(range(8, migrations.LATEST_VERSION + 1))
+    triggers = dict(legacy.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'trigger'"))
+    assert triggers['trg_expiry_data_version_insert'] == 'expiry'
+
+
+def test_failed_migration_leaves_the_last_good_version(legacy, monkeypatch):
+    broken = migrations.MIGRATIONS + [(migrations.LATEST_VERSION + 1, "broken", [
+        "CREATE TABLE half_done (id INTEGER)",
+        "SELECT * FROM no_such_table",
+    ])]
+    monkeypatch.setattr(migrations, 'MIGRATIONS', broken)
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(legacy, target=migrations.LATEST_VERSION + 1)
+    assert migrations.current_version(legacy) == migrations.LATEST_VERSION
+    assert legacy.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'").fetchone() == (0,)
+
+
+def test_cli_refuses_a_missing_database(tmp_path):
+    path = tmp_path / 'missing.db'
+    result = subprocess.run([sys.executable, 'migrations.py', str(path)], capture_output=True, text=True,
+                            cwd=Path(migrations.__file__).parent)
+    assert result.returncode != 0 and 'does not exist' in result.stderr
+    assert not path.exists()
+
+
+def test_cli_upgrades_an_existing_database(legacy, tmp_path):
+    legacy.close()
+    result = subprocess.run([sys.executable, 'migrations.py', str(tmp_path / 'old.db')], capture_output=True,
+                            text=True, cwd=Path(migrations.__file__).parent)
+    assert result.returncode == 0, result.stderr
+    assert f"v0 -> v{migrations.LATEST_VERSION}" in result.stdout
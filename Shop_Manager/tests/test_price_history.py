@@ -0,0 +1,88 @@
+import pytest
+
+import price_history
+
+CHANGES = [  # (id, change_date, old_price, new_price)
+    (1, '2025-01-05 09:00:00', 100, 110),
+    (2, '2025-02-10 12:00:00', 110, 105),
+    (3, '2025-02-10 12:00:00', 105, 120),  # same second: ordered by id
+    (4, '2025-03-01 08:30:00', 120, 90),
+    (5, '2025-03-20 17:00:00', 90, 95),
+]
+
+
+@pytest.fixture
+def history(db):
+    db.executemany('INSERT INTO items (id, item, price_per_pc_or_kg) VALUES (?, ?, ?)',
+                   [(1, 'Coffee', 95), (2, 'Tea', 40)])
+    db.executemany('INSERT INTO price_variations (id, item_id, change_date, old_price, new_price) '
+                   'VALUES (?, 1, ?, ?, ?)', CHANGES)
+    db.commit()
+    return db
+
+
+def walk(conn, item_id, **kwargs):
+    """Every page's ids, following next_cursor to the end."""
+    pages, cursor = [], None
+    while True:
+        page, cursor = price_history.price_history(conn, item_id, cursor=cursor, **kwargs)
+        pages.append([change['id'] for change in page])
+        if cursor is None:
+            return pages
+
+
+def test_pages_follow_the_keyset_cursor(history):
+    assert walk(history, 1, limit=2) == [[5, 4], [3, 2], [1]]
+    assert walk(history, 1, limit=5) == [[5, 4, 3, 2, 1]]
+    assert walk(history, 2) == [[]]
+
+
+def test_new_changes_do_not_shift_later_pages(history):
+    first, cursor = price_history.price_history(history, 1, limit=2)
+    history.execute("INSERT INTO price_variations (item_id, change_date, old_price, new_price) "
+                    "VALUES (1, '2025-04-01 10:00:00', 95, 99)")
+    history.commit()
+    second, _ = price_history.price_history(history, 1, cursor=cursor, limit=2)
+    assert [c['id'] for c in first + second] == [5, 4, 3, 2]
+
+
+def test_range_filter_and_change_figures(history):
+    page, cursor = price_history.price_history(history, 1, first_day='2025-02-10', last_day='2025-03-01')
+    assert cursor is None
+    assert [(c['id'], c['change'], c['change_pct']) for c in page] == [
+        (4, -30, -25.0), (3, 15, 14.29), (2, -5, -4.55)]
+    assert walk(history, 1, first_day='2025-01-01', last_day='2025-03-01', limit=1) == [[4], [3], [2], [1]]
+    with pytest.raises(ValueError):
+        price_history.price_history(history, 1, first_day='2025-03-02', last_day='2025-03-01')
+    with pytest.raises(ValueError):
+        price_history.price_history(history, 1, cursor='not-a-cursor')
+
+
+@pytest.mark.parametrize('ts, price', [
+    ('2025-01-01', 100),             # before the first change: its old price
+    ('2025-01-05 09:00:00', 110),    # at a change: the new price
+    ('2025-02-10', 120),             # end of a day with two changes: the last one
+    ('2025-02-10 11:59:59', 110),
+    ('2025-03-10T12:00:00', 90),
+    (None, 95),
+])
+def test_price_as_of(history, ts, price):
+    assert price_history.price_as_of(history, 1, ts) == price
+
+
+def test_prices_as_of_in_one_query(history):
+    lookups = [(1, '2025-03-01'), (2, '2025-03-01'), (9, '2025-03-01'), (1, '2024-12-31')]
+    assert price_history.prices_as_of(history, lookups) == [90, 40, None, 100]
+    assert price_history.prices_as_of(history, []) == []
+
+
+def test_price_history_api(client, history):
+    body = client.get('/api/items/1/price-history?limit=3&as_of=2025-02-11').get_json()
+    assert [c['id'] for c in body['history']] == [5, 4, 3] and body['price_as_of'] == 120
+    assert (body['summary']['changes'], body['summary']['min_price'], body['summary']['max_price']) == (5, 90, 120)
+    older = client.get(f"/api/items/1/price-history?limit=3&cursor={body['next_cursor']}").get_json()
+    assert [c['id'] for c in older['history']] == [2, 1] and older['next_cursor'] is None
+
+    assert client.get('/api/items/99/price-history').status_code == 404
+    assert client.get('/api/items/1/price-history?cursor=bogus').status_code == 400
+    assert client.get('/api/items/1/price-history?as_of=yesterday').status_code == 400
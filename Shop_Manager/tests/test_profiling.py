@@ -0,0 +1,39 @@
+import pytest
+
+import app as shop
+import metrics
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    def make(**config):
+        return shop.create_app({'DB_PATH': str(tmp_path / 'shop.db'), 'START_JOBS': False, **config})
+    return make
+
+
+def test_everything_is_off_by_default(make_app, tmp_path):
+    client = make_app().test_client()
+    response = client.get('/api/items?_profile=text')
+    assert response.is_json and 'X-Shop-Profile-File' not in response.headers
+    assert metrics.SLOW_STATEMENT_SECONDS is None
+    assert not (tmp_path / 'profiles').exists()
+
+
+def test_profiling_without_a_token_ignores_requests(make_app):
+    client = make_app(PROFILING=True).test_client()
+    assert client.get('/api/items?_profile=text').is_json
+
+
+def test_profiling_needs_the_token(make_app):
+    client = make_app(PROFILING=True, PROFILE_TOKEN='s3cret').test_client()
+    assert client.get('/api/items?_profile=text&_profile_token=wrong').is_json
+
+    response = client.get('/api/items?_profile=text', headers={'X-Shop-Profile-Token': 's3cret'})
+    assert response.mimetype == 'text/plain'
+    assert response.get_data(as_text=True).startswith('GET /api/items?_profile=text took ')
+    assert response.headers['X-Shop-Profile-File'].endswith('.prof')
+
+
+def test_slow_query_log_is_opt_in(make_app, tmp_path):
+    make_app(SLOW_QUERY_MS=250)
+    assert metrics.SLOW_STATEMENT_SECONDS == 0.25
@@ -0,0 +1,67 @@
+import math
+from datetime import date
+
+import numpy as np
+import pytest
+
+import replenishment
+
+END_DAY = date(2025, 1, 10)
+
+
+@pytest.fixture
+def history(db):
+    """Item 1 sells 4 on the last day and 1 + 1 the day before; item 2 never sells; item 3 once, 10 days back."""
+    db.executemany('INSERT INTO items (id, item, price_per_pc_or_kg, total_quantity_available) VALUES (?, ?, 1, ?)',
+                   [(1, 'Milk', 3), (2, 'Salt', 5), (3, 'Jam', 2)])
+    db.executemany('INSERT INTO sales (item_id, quantity_sold, total_amount, date) VALUES (?, ?, ?, ?)', [
+        (1, 4, 4, '2025-01-10 09:00:00'),
+        (1, 1, 1, '2025-01-09 08:00:00'),
+        (1, 1, 1, '2025-01-09 17:30:00'),
+        (3, 1, 1, '2024-12-31 12:00:00'),
+        (1, 9, 9, '2025-01-11 08:00:00'),  # after end_day: left out
+    ])
+    db.commit()
+    return replenishment.load_history(db, END_DAY)
+
+
+def test_history_is_summed_per_item_and_day(history):
+    item_ids, names, stock, sale_item_ids, ages, quantities = history
+    assert item_ids.tolist() == [1, 2, 3] and names.tolist() == ['Milk', 'Salt', 'Jam']
+    assert stock.tolist() == [3.0, 5.0, 2.0]
+    assert sorted(zip(sale_item_ids.tolist(), ages.tolist(), quantities.tolist())) == [
+        (1, 0, 4.0), (1, 1, 2.0), (3, 10, 1.0)]
+
+
+def test_compute_matches_hand_figures(history):
+    item_ids, _, stock, sale_item_ids, ages, quantities = history
+    # span 3 -> alpha 0.5; lead time 2 days, 4 more days of cover, one std dev of safety stock
+    result = replenishment.compute(item_ids, stock, sale_item_ids, ages, quantities, ewma_span=3, lead_time=2,
+                                   target_cover=4, service_z=1)
+
+    # Milk: EWMA = 0.5 * 4 + 0.5 * 0.5 * 2 = 2.5
+    # 28-day daily series [4, 2, 0 x 26]: mean 6/28, variance 20/28 - (6/28)**2
+    std = math.sqrt(20 / 28 - (6 / 28) ** 2)
+    safety = std * math.sqrt(2)
+    assert result['avg_daily_7d'][0] == pytest.approx(6 / 7)
+    assert result['avg_daily_28d'][0] == pytest.approx(6 / 28)
+    assert result['demand_std_28d'][0] == pytest.approx(std)
+    assert result['forecast_daily'][0] == pytest.approx(2.5)
+    assert result['reorder_point'][0] == pytest.approx(2.5 * 2 + safety)  # ~6.16, above the stock of 3
+    assert result['days_of_cover'][0] == pytest.approx(3 / 2.5)
+    assert result['needs_reorder'][0]
+    assert result['order_quantity'][0] == pytest.approx(2.5 * (2 + 4) + safety - 3)
+
+    # Salt never sold; Jam's one sale 10 days back leaves 0.5 * 0.5**10 ~ 0.0005 < MIN_FORECAST
+    for i in (1, 2):
+        assert result['forecast_daily'][i] == 0
+        assert np.isnan(result['days_of_cover'][i])
+        assert not result['needs_reorder'][i] and result['order_quantity'][i] == 0
+    assert result['avg_daily_28d'][2] == pytest.approx(1 / 28)
+
+
+def test_refresh_stores_the_suggestions(db, history):
+    stats = replenishment.refresh(db, end_day=END_DAY)
+    assert stats['items'] == 3 and stats['sales_days'] == 3
+    assert [row['item_id'] for row in replenishment.suggestions(db)] == [1]
+    assert replenishment.reorder_status(db)[0] == 1
@@ -0,0 +1,42 @@
+import time
+from datetime import date, datetime, timezone
+
+import pytest
+
+import reports
+
+
+@pytest.fixture
+def far_from_utc(monkeypatch):
+    """A local zone 12 hours behind or 14 ahead of UTC, whichever puts the local clock on another day."""
+    monkeypatch.setenv('TZ', 'Etc/GMT+12' if datetime.now(timezone.utc).hour < 12 else 'Etc/GMT-14')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_windows_are_half_open_day_ranges():
+    assert reports.day_window('2025-03-09') == ('2025-03-09 00:00:00', '2025-03-10 00:00:00')
+    assert reports.range_window(date(2025, 2, 27), datetime(2025, 3, 1, 15, 0)) == (
+        '2025-02-27 00:00:00', '2025-03-02 00:00:00')
+
+
+def test_today_is_the_day_of_current_timestamp(db, far_from_utc):
+    stamp = db.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+    assert reports.to_day().isoformat() == stamp[:10]
+    start, end = reports.day_window()
+    assert start <= stamp < end
+
+
+def test_a_sale_counts_today_everywhere(client, db, far_from_utc):
+    db.execute("INSERT INTO items (id, item, price_per_pc_or_kg, total_quantity_available) VALUES (1, 'Milk', 60, 5)")
+    db.commit()
+    client.post('/sell/1', data={'quantity_sold': '2'})
+
+    assert client.get('/sales-today').data.count(b'Milk') == 1
+    trend = reports.sales_timeseries(db, reports.to_day(), reports.to_day())
+    assert [(p['total'], p['sales']) for p in trend] == [(120, 1)]
+    assert reports.statistics_report(db)['sales_values'][-1] == 120
+    today = client.get(f'/api/sales/timeseries?from={reports.to_day()}').get_json()
+    assert today['series'][-1]['total'] == 120
@@ -0,0 +1,81 @@
+import pytest
+
+import response_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    response_cache.clear()
+    monkeypatch.setattr(response_cache, '_counters', dict.fromkeys(response_cache._counters, 0))
+
+
+def get(client, path='/price-variation', **headers):
+    response = client.get(path, headers=headers)
+    return response.status_code, response.headers.get('X-Cache'), response
+
+
+def change_price(db):
+    item_id = db.execute("INSERT INTO items (item, price_per_pc_or_kg) VALUES ('Milk', 2)").lastrowid
+    db.execute('INSERT INTO price_variations (item_id, old_price, new_price) VALUES (?, 1, 2)', (item_id,))
+    db.commit()
+
+
+def test_second_request_is_a_hit_with_the_same_etag(client):
+    status, cache, first = get(client)
+    assert (status, cache) == (200, 'MISS') and first.headers['ETag']
+    status, cache, second = get(client)
+    assert (status, cache) == (200, 'HIT')
+    assert second.data == first.data and second.headers['ETag'] == first.headers['ETag']
+    assert second.headers['Cache-Control'] == 'no-cache'
+
+
+def test_matching_etag_gets_an_empty_304(client):
+    etag = get(client)[2].headers['ETag']
+    status, cache, response = get(client, **{'If-None-Match': etag})
+    assert (status, cache, response.data) == (304, 'HIT', b'')
+    assert get(client, **{'If-None-Match': '"other"'})[0] == 200
+    assert client.get('/api/cache').get_json()['not_modified'] == 1
+
+
+def test_any_write_invalidates_through_the_data_version(client, db):
+    etag = get(client)[2].headers['ETag']
+    version = response_cache.data_version(db)
+    db.execute("INSERT INTO activities (action, details, date) VALUES ('TEST', '', '2025-01-01 00:00:00')")
+    db.commit()
+    assert response_cache.data_version(db) == version + 1
+    # Rendered again, but the page did not change, so the browser's copy is still good
+    assert get(client, **{'If-None-Match': etag})[:2] == (304, 'MISS')
+
+    change_price(db)
+    status, cache, response = get(client, **{'If-None-Match': etag})
+    assert (status, cache) == (200, 'MISS') and response.headers['ETag'] != etag
+
+    response_cache.bump_version(db)
+    db.commit()
+    assert get(client)[1] == 'MISS'
+    assert client.get('/api/cache').get_json()['stale'] == 3
+
+
+def test_query_strings_are_cached_separately(client):
+    assert get(client, '/price-variation?item_id=1')[1] == 'MISS'
+    assert get(client, '/price-variation')[1] == 'MISS'
+    assert get(client, '/price-variation?item_id=1')[1] == 'HIT'
+
+
+def test_entries_expire_and_are_evicted(client, monkeypatch):
+    monkeypatch.setattr(response_cache, 'CACHE_TTL', -1)
+    get(client)
+    assert get(client)[1] == 'MISS'
+
+    monkeypatch.setattr(response_cache, 'CACHE_TTL', 300)
+    monkeypatch.setattr(response_cache, 'CACHE_SIZE', 1)
+    get(client, '/price-variation?page=1')
+    get(client, '/price-variation?page=2')
+    assert get(client, '/price-variation?page=1')[1] == 'MISS'
+    stats = client.get('/api/cache').get_json()
+    assert (stats['expired'], stats['entries']) == (1, 1) and stats['evictions'] >= 2
+
+
+def test_cache_can_be_switched_off(client, monkeypatch):
+    monkeypatch.setattr(response_cache, 'CACHE_ENABLED', False)
+    assert get(client)[1] is None and get(client)[1] is None
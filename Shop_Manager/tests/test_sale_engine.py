@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+
+import pytest
+
+import app as shop
+from sale_engine import SaleError, merge_lines, record_checkout, record_sale
+
+STOCK = 8
+THREADS = 20
+
+
+def add_item(db, quantity=STOCK, price=10.0):
+    c = db.execute('INSERT INTO items (item, description, price_per_pc_or_kg, total_quantity_available, '
+                   'total_stock_amount) VALUES (?, ?, ?, ?, ?)', ('Sugar 1KG', '', price, quantity, price * quantity))
+    db.commit()
+    return c.lastrowid
+
+
+def run_threads(target):
+    """Run target() on THREADS threads released at the same moment; returns their results."""
+    barrier = threading.Barrier(THREADS)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        result = target()
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def stock_and_sales(db, item_id):
+    stock = db.execute('SELECT total_quantity_available FROM items WHERE id = ?', (item_id,)).fetchone()[0]
+    sales = db.execute('SELECT COUNT(*) FROM sales WHERE item_id = ?', (item_id,)).fetchone()[0]
+    return stock, sales
+
+
+def test_concurrent_record_sale_never_oversells(app, db):
+    item_id = add_item(db)
+
+    def sell_one():
+        conn = shop.get_connection(request_scoped=False)
+        try:
+            record_sale(conn, item_id, 1)
+            return 'sold'
+        except SaleError:
+            return 'rejected'
+        finally:
+            conn.close()
+
+    results = run_threads(sell_one)
+    stock, sales = stock_and_sales(db, item_id)
+    assert stock >= 0
+    assert results.count('sold') == STOCK == sales
+    assert results.count('rejected') == THREADS - STOCK
+
+
+def test_concurrent_checkout_never_oversells(app, db):
+    item_id = add_item(db)
+
+    def checkout_one():
+        response = app.test_client().post('/api/checkout', json={'lines': [{'item_id': item_id, 'quantity': 1}]})
+        return response.status_code
+
+    statuses = run_threads(checkout_one)
+    stock, sales = stock_and_sales(db, item_id)
+    assert stock >= 0
+    assert statuses.count(200) == STOCK == sales
+    assert statuses.count(409) == THREADS - STOCK
+
+
+def test_rejected_basket_writes_nothing(app, db):
+    plenty, scarce = add_item(db), add_item(db, quantity=1)
+    with pytest.raises(SaleError) as rejected:
+        record_checkout(db, [(plenty, 2), (scarce, 3)])
+    assert [problem['item_id'] for problem in rejected.value.problems] == [scarce]
+    assert stock_and_sales(db, plenty) == (STOCK, 0)
+    assert db.execute("SELECT COUNT(*) FROM activities WHERE action = 'SALE'").fetchone()[0] == 0
+
+
+def test_checkout_logs_one_activity_per_line(app, db):
+    first, second = add_item(db), add_item(db)
+    receipt = record_checkout(db, [(first, 1), (second, 2), (first, 1)])
+    assert [(line['item_id'], line['quantity']) for line in receipt['lines']] == [(first, 2), (second, 2)]
+    assert db.execute("SELECT COUNT(*) FROM activities WHERE action = 'SALE'").fetchone()[0] == 2
+
+
+@pytest.mark.parametrize('line', [(1.5, 1), (True, 1), (1, float('nan')), (1, 'x')])
+def test_malformed_lines_are_rejected(line):
+    with pytest.raises(ValueError):
+        merge_lines([line])
+
+
+def test_locked_database_propagates(app, db):
+    item_id = add_item(db)
+    blocker = sqlite3.connect(shop.DB_PATH)
+    blocker.execute('BEGIN IMMEDIATE')
+    conn = sqlite3.connect(shop.DB_PATH, timeout=0.05)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            record_sale(conn, item_id, 1)
+    finally:
+        blocker.rollback()
+        blocker.close()
+        conn.close()
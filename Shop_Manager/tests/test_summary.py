@@ -0,0 +1,74 @@
+from datetime import date
+
+import pytest
+
+import reports
+import summary
+
+
+@pytest.fixture
+def shop(db):
+    db.executemany('INSERT INTO items (id, item, price_per_pc_or_kg, total_quantity_available, total_stock_amount) '
+                   'VALUES (?, ?, ?, ?, ?)', [(1, 'Milk', 60, 10, 600), (2, 'Bread', 55, 4, 220)])
+    db.executemany('INSERT INTO sales (item_id, quantity_sold, total_amount, date) VALUES (?, ?, ?, ?)', [
+        (1, 2, 120, '2025-03-03 09:00:00'),
+        (2, 1, 55, '2025-03-03T18:30:00.250'),  # normalized by its trigger, still one bucket
+        (1, 1, 60, '2025-03-05 10:00:00'),
+        (2, 3, 165, '2025-04-01 08:00:00'),
+    ])
+    db.commit()
+    return db
+
+
+def rows(db, sql):
+    return db.execute(sql).fetchall()
+
+
+def test_triggers_maintain_the_aggregates(shop):
+    assert rows(shop, 'SELECT total_items, total_stock_value FROM shop_summary') == [(2, 820)]
+    assert rows(shop, 'SELECT day, total_amount, sales_count FROM daily_sales ORDER BY day') == [
+        ('2025-03-03', 175, 2), ('2025-03-05', 60, 1), ('2025-04-01', 165, 1)]
+    assert rows(shop, 'SELECT item_id, quantity_sold, revenue FROM item_sales_totals ORDER BY item_id') == [
+        (1, 3, 180), (2, 4, 220)]
+    assert summary.check(shop) == []
+
+
+def test_edits_and_deletes_move_the_totals(shop):
+    shop.execute("UPDATE sales SET date = '2025-03-04 12:00:00', item_id = 2 WHERE id = 1")
+    shop.execute('DELETE FROM sales WHERE id = 3')
+    shop.execute('UPDATE items SET total_stock_amount = 300 WHERE id = 1')
+    shop.execute("INSERT INTO items (item, price_per_pc_or_kg, total_stock_amount) VALUES ('Tea', 80, 80)")
+    shop.execute('DELETE FROM items WHERE id = 2')
+    shop.commit()
+    assert rows(shop, 'SELECT total_items, total_stock_value FROM shop_summary') == [(2, 380)]
+    assert rows(shop, 'SELECT day, total_amount, sales_count FROM daily_sales WHERE sales_count != 0 '
+                      'ORDER BY day') == [('2025-03-03', 55, 1), ('2025-03-04', 120, 1), ('2025-04-01', 165, 1)]
+    assert summary.check(shop) == []
+
+
+def test_check_reports_drift_and_rebuild_repairs_it(shop):
+    shop.execute("UPDATE daily_sales SET total_amount = 1 WHERE day = '2025-03-05'")
+    shop.execute('DELETE FROM item_sales_totals WHERE item_id = 2')
+    shop.commit()
+    assert [(table, key) for table, key, _, _ in summary.check(shop)] == [
+        ('daily_sales', '2025-03-05'), ('item_sales_totals', 2)]
+    summary.rebuild(shop)
+    assert summary.check(shop) == []
+
+
+def test_timeseries_buckets_and_zero_fills(shop):
+    series = reports.sales_timeseries(shop, date(2025, 3, 2), date(2025, 3, 5))
+    assert [(p['bucket'], p['total'], p['sales']) for p in series] == [
+        ('2025-03-02', 0, 0), ('2025-03-03', 175, 2), ('2025-03-04', 0, 0), ('2025-03-05', 60, 1)]
+    weeks = reports.sales_timeseries(shop, date(2025, 3, 1), date(2025, 3, 10), bucket='week')
+    assert [(p['bucket'], p['total']) for p in weeks] == [('2025-02-24', 0), ('2025-03-03', 235), ('2025-03-10', 0)]
+    # Buckets only count days inside the range
+    months = reports.sales_timeseries(shop, date(2025, 3, 4), date(2025, 4, 30), bucket='month')
+    assert [(p['bucket'], p['total'], p['sales']) for p in months] == [('2025-03-01', 60, 1), ('2025-04-01', 165, 1)]
+    with pytest.raises(ValueError):
+        reports.sales_timeseries(shop, date(2025, 3, 5), date(2025, 3, 1))
+
+
+def test_dashboard_reads_the_summary_row(client, shop):
+    page = client.get('/')
+    assert page.status_code == 200 and b'Ksh 820' in page.data
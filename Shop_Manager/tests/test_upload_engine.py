@@ -0,0 +1,138 @@
+import io
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import upload_engine
+
+
+def sheet(*rows):
+    return pd.DataFrame(list(rows), columns=upload_engine.REQUIRED_COLUMNS)
+
+
+@pytest.fixture
+def stocked(db):
+    """Two items named 'Salt': an upload updates the older one."""
+    db.executemany('INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available, '
+                   'total_stock_amount) VALUES (?, ?, ?, ?, ?, ?)',
+                   [(1, 'Salt', 'old', 20.0, 5, 100.0), (2, 'Sugar', '', 150.0, 2, 300.0),
+                    (3, 'Salt', 'twin', 25.0, 1, 25.0)])
+    db.commit()
+    return db
+
+
+def items(db):
+    return db.execute('SELECT id, item, description, price_per_pc_or_kg, total_quantity_available, '
+                      'total_stock_amount FROM items ORDER BY id').fetchall()
+
+
+def test_upload_inserts_updates_and_records_price_changes(stocked):
+    result = upload_engine.apply_upload(stocked, sheet(
+        (' Salt ', 'iodized', 22, 10),
+        ('Sugar', None, 150, 4),
+        ('Tea', 'green', '80.5', 3),
+        ('Tea', 'black', 90, 1),  # last row of a repeated item wins
+    ))
+    assert {k: result[k] for k in ('rows', 'inserted', 'updated', 'price_changes')} == {
+        'rows': 3, 'inserted': 1, 'updated': 2, 'price_changes': 1}
+    assert items(stocked) == [
+        (1, 'Salt', 'iodized', 22.0, 10.0, 220.0),
+        (2, 'Sugar', '', 150.0, 4.0, 600.0),
+        (3, 'Salt', 'twin', 25.0, 1.0, 25.0),
+        (4, 'Tea', 'black', 90.0, 1.0, 90.0),
+    ]
+    assert stocked.execute('SELECT item_id, old_price, new_price FROM price_variations').fetchall() == [
+        (1, 20.0, 22.0)]
+    assert [row[0] for row in stocked.execute('SELECT action FROM activities ORDER BY id')] == [
+        'PRICE CHANGE', 'UPDATE ITEM (UPLOAD)', 'UPDATE ITEM (UPLOAD)', 'ADD ITEM (UPLOAD)']
+
+
+def test_reapplying_the_same_sheet_changes_no_prices(stocked):
+    upload = sheet(('Salt', 'iodized', 22, 10), ('Tea', 'green', 80, 3))
+    upload_engine.apply_upload(stocked, upload)
+    result = upload_engine.apply_upload(stocked, upload)
+    assert (result['inserted'], result['updated'], result['price_changes']) == (0, 2, 0)
+    assert stocked.execute("SELECT COUNT(*) FROM items WHERE item = 'Tea'").fetchone() == (1,)
+
+
+def test_a_bad_value_rolls_back_the_whole_sheet(stocked):
+    before = items(stocked)
+    with pytest.raises(ValueError):
+        upload_engine.apply_upload(stocked, sheet(('Salt', '', 22, 10), ('Tea', '', 'cheap', 3)))
+    assert items(stocked) == before
+    assert stocked.execute('SELECT COUNT(*) FROM activities').fetchone() == (0,)
+
+
+def test_upload_route_imports_a_csv_in_the_background(client, stocked, run_job):
+    data = sheet(('Salt', 'iodized', 22, 10), ('Tea', 'green', 80, 3)).to_csv(index=False).encode()
+    response = client.post('/upload', data={'file': (io.BytesIO(data), 'stock.csv')})
+    assert response.status_code == 302
+    job_id = int(response.headers['Location'].rsplit('job=', 1)[1])
+    run_job(job_id)
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'done' and (job['result']['inserted'], job['result']['updated']) == (1, 1)
+    assert stocked.execute("SELECT price_per_pc_or_kg FROM items WHERE id = 1").fetchone() == (22.0,)
+    assert stocked.execute("SELECT COUNT(*) FROM items WHERE item = 'Tea'").fetchone() == (1,)
+
+
+def running_import(db, owner, updated_at, status='running', chunks_done=2):
+    return db.execute('''
+        INSERT INTO upload_imports (filename, file_hash, chunk_rows, status, chunks_done, owner, started, updated_at)
+        VALUES ('stock.csv', 'abc', 100, ?, ?, ?, ?, ?)
+    ''', (status, chunks_done, owner, updated_at, updated_at)).lastrowid
+
+
+def now(offset_seconds=0):
+    return (datetime.now() + timedelta(seconds=offset_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def test_start_import_resumes_a_failed_import(db):
+    import_id = running_import(db, 'spool-a', now(), status='failed')
+    assert upload_engine.start_import(db, 'stock.csv', 'abc', 100, owner='spool-b') == (import_id, 2)
+    assert db.execute('SELECT status, owner FROM upload_imports').fetchone() == ('running', 'spool-b')
+    # Another chunk size splits the file differently: a fresh import
+    assert upload_engine.start_import(db, 'stock.csv', 'abc', 50, owner='spool-c')[1] == 0
+
+
+def test_start_import_refuses_a_live_import_of_the_same_file(db):
+    import_id = running_import(db, 'spool-a', now())
+    with pytest.raises(upload_engine.ImportInProgress):
+        upload_engine.start_import(db, 'stock.csv', 'abc', 100, owner='spool-b')
+    # The same upload, retried, takes it back
+    assert upload_engine.start_import(db, 'stock.csv', 'abc', 100, owner='spool-a') == (import_id, 2)
+
+
+def test_start_import_takes_over_a_stale_import(db):
+    stale = -upload_engine.STALE_AFTER.total_seconds() - 60
+    import_id = running_import(db, 'spool-a', now(stale))
+    assert upload_engine.start_import(db, 'stock.csv', 'abc', 100, owner='spool-b') == (import_id, 2)
+    assert db.execute('SELECT owner FROM upload_imports').fetchone() == ('spool-b',)
+
+
+def test_interrupted_import_resumes_after_the_last_committed_chunk(db, tmp_path):
+    path = tmp_path / 'stock.csv'
+    sheet(*[(f'Item {n}', '', n + 1, n) for n in range(7)]).to_csv(path, index=False)
+
+    def stop_after_first_chunk(status):
+        if status['chunks_done'] == 1:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        upload_engine.import_file(db, str(path), chunk_rows=3, owner='spool-a', progress=stop_after_first_chunk)
+    assert db.execute('SELECT status, chunks_done, rows_done FROM upload_imports').fetchone() == ('failed', 1, 3)
+    assert db.execute('SELECT COUNT(*) FROM items').fetchone() == (3,)
+
+    result = upload_engine.import_file(db, str(path), chunk_rows=3, owner='spool-b')
+    assert (result['status'], result['resumed_from_chunk'], result['chunks_done'], result['rows_done'],
+            result['inserted']) == ('done', 1, 3, 7, 7)
+    assert db.execute('SELECT COUNT(*), SUM(total_stock_amount) FROM items').fetchone() == (
+        7, sum((n + 1) * n for n in range(7)))
+
+
+def test_import_without_required_columns_fails(db, tmp_path):
+    path = tmp_path / 'stock.csv'
+    path.write_text('ITEM,PRICE\nSalt,20\n')
+    with pytest.raises(upload_engine.UploadError):
+        upload_engine.import_file(db, str(path))
+    assert db.execute('SELECT status FROM upload_imports').fetchone() == ('failed',)
@@ -0,0 +1,297 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+# ------------------ UPLOAD ENGINE ------------------
+# A spreadsheet is cleaned with vectorized pandas operations, loaded into a
+# temp staging table with one executemany, and applied with set-based SQL in
+# a single transaction: bulk price-variation and activity inserts, then one
+# INSERT ... ON CONFLICT(id) DO UPDATE upsert into items.
+REQUIRED_COLUMNS = ['ITEM', 'DESCRIPTION', 'PRICE_PER_PC_OR_KG', 'TOTAL_QUANTITY_AVAILABLE']
+
+# Rows per chunk (and per transaction) for streaming imports
+CHUNK_ROWS = int(os.environ.get('SHOP_UPLOAD_CHUNK_ROWS', '5000'))
+
+# A 'running' import whose last chunk committed longer ago than this is taken
+# to belong to a dead worker and may be resumed by another upload of the file
+STALE_AFTER = timedelta(seconds=float(os.environ.get('SHOP_UPLOAD_STALE_SECONDS', '300')))
+
+
+class UploadError(ValueError):
+    """The uploaded file cannot be imported (e.g. missing required columns)."""
+
+
+class ImportInProgress(UploadError):
+    """The same file is already being imported by another upload."""
+
+
+def missing_columns(df):
+    return [col for col in REQUIRED_COLUMNS if col not in df.columns]
+
+
+def prepare_rows(df):
+    """
+    Clean an upload DataFrame into (item, description, price, qty, total) tuples.
+    Blank descriptions become '', and when an item appears more than once the
+    last row wins (the final state the old row-by-row loop ended up in).
+    """
+    import pandas as pd
+
+    df = df[REQUIRED_COLUMNS].copy()
+    df['ITEM'] = df['ITEM'].astype(str).str.strip()
+    df['DESCRIPTION'] = df['DESCRIPTION'].fillna('').astype(str).str.strip()
+    df['PRICE_PER_PC_OR_KG'] = pd.to_numeric(df['PRICE_PER_PC_OR_KG'], errors='raise').astype(float)
+    df['TOTAL_QUANTITY_AVAILABLE'] = pd.to_numeric(df['TOTAL_QUANTITY_AVAILABLE'], errors='raise').astype(float)
+    df['TOTAL_STOCK_AMOUNT'] = df['PRICE_PER_PC_OR_KG'] * df['TOTAL_QUANTITY_AVAILABLE']
+    df = df.drop_duplicates('ITEM', keep='last')
+    return list(df.itertuples(index=False, name=None))
+
+
+def stage_rows(conn, rows):
+    """Load cleaned rows into the temp staging table and match them to existing items."""
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS upload_staging (
+            item TEXT PRIMARY KEY,
+            description TEXT,
+            price REAL,
+            qty REAL,
+            total REAL,
+            item_id INTEGER,
+            old_price REAL
+        )
+    ''')
+    conn.execute('DELETE FROM upload_staging')
+    conn.executemany('INSERT INTO upload_staging (item, description, price, qty, total) VALUES (?, ?, ?, ?, ?)',
+                     rows)
+    # Existing item = lowest id with that name (uses idx_items_item)
+    conn.execute('''
+        UPDATE upload_staging SET (item_id, old_price) = (
+            SELECT id, price_per_pc_or_kg FROM items
+            WHERE items.item = upload_staging.item
+            ORDER BY id LIMIT 1
+        )
+    ''')
+
+
+def apply_staged(conn, now):
+    """Apply the staged rows; returns (inserted, updated, price_changes)."""
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO price_variations (item_id, old_price, new_price)
+        SELECT item_id, old_price, price FROM upload_staging
+        WHERE item_id IS NOT NULL AND old_price != price
+        ORDER BY rowid
+    ''')
+    price_changes = c.rowcount
+
+    c.execute('''
+        INSERT INTO activities (action, details, date)
+        SELECT action, details, ? FROM (
+            SELECT rowid AS seq, 0 AS step, 'PRICE CHANGE' AS action,
+                   printf('%s (id:%d) changed price %.2f → %.2f', item, item_id, old_price, price) AS details
+            FROM upload_staging WHERE item_id IS NOT NULL AND old_price != price
+            UNION ALL
+            SELECT rowid, 1, 'UPDATE ITEM (UPLOAD)',
+                   printf('Updated "%s" — qty: %s, price: %.2f', item, qty, price)
+            FROM upload_staging WHERE item_id IS NOT NULL
+            UNION ALL
+            SELECT rowid, 1, 'ADD ITEM (UPLOAD)',
+                   printf('Inserted "%s" — qty: %s, price: %.2f', item, qty, price)
+            FROM upload_staging WHERE item_id IS NULL
+        )
+        ORDER BY seq, step
+    ''', (now,))
+
+    updated = c.execute('SELECT COUNT(*) FROM upload_staging WHERE item_id IS NOT NULL').fetchone()[0]
+    # New rows have item_id NULL and get a fresh id; matched rows conflict on id and update
+    c.execute('''
+        INSERT INTO items (id, item, description, price_per_pc_or_kg, total_quantity_available, total_stock_amount)
+        SELECT item_id, item, description, price, qty, total FROM upload_staging WHERE true
+        ORDER BY rowid
+        ON CONFLICT(id) DO UPDATE SET
+            description = excluded.description,
+            price_per_pc_or_kg = excluded.price_per_pc_or_kg,
+            total_quantity_available = excluded.total_quantity_available,
+            total_stock_amount = excluded.total_stock_amount,
+            date_added = CURRENT_TIMESTAMP
+    ''')
+    inserted = c.rowcount - updated
+    c.execute('DELETE FROM upload_staging')
+    return inserted, updated, price_changes
+
+
+def apply_upload(conn, df):
+    """
+    Upsert a whole spreadsheet in one transaction.
+    Returns {'rows', 'inserted', 'updated', 'price_changes', 'seconds', 'rows_per_second'}.
+    """
+    start = time.perf_counter()
+    rows = prepare_rows(df)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        stage_rows(conn, rows)
+        inserted, updated, price_changes = apply_staged(conn, now)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': len(rows),
+        'inserted': inserted,
+        'updated': updated,
+        'price_changes': price_changes,
+        'seconds': seconds,
+        'rows_per_second': len(rows) / seconds if seconds else 0,
+    }
+
+
+# ------------------ STREAMING IMPORT ------------------
+# Files are read in chunks (pandas chunksize for CSV, openpyxl read-only
+# mode for XLSX) and every chunk is applied in its own transaction together
+# with its progress row in upload_imports. Memory stays flat, and re-running
+# a failed import of the same file resumes after the last committed chunk.
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_chunks(path, chunk_rows):
+    """Yield DataFrames of at most chunk_rows rows from a .csv or .xlsx file."""
+    import pandas as pd
+
+    if path.lower().endswith('.csv'):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col) if col is not None else '' for col in next(rows, ())]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch or not header:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def start_import(conn, filename, digest, chunk_rows, owner=None):
+    """
+    Return (import_id, chunks already committed), resuming an unfinished import
+    of the same file. A 'failed' import is resumed, and so is a 'running' one
+    whose worker is gone: it belongs to `owner` (the same upload, retried), or
+    has not committed a chunk for STALE_AFTER. The row is claimed with a
+    conditional UPDATE, so of two concurrent uploads of a file only one gets
+    it; the other raises ImportInProgress.
+    """
+    now_dt = datetime.now()
+    now = now_dt.strftime("%Y-%m-%d %H:%M:%S")
+    stale = (now_dt - STALE_AFTER).strftime("%Y-%m-%d %H:%M:%S")
+    row = conn.execute('''
+        SELECT id, chunks_done FROM upload_imports
+        WHERE file_hash = ? AND status IN ('running', 'failed') AND chunk_rows = ?
+        ORDER BY id DESC LIMIT 1
+    ''', (digest, chunk_rows)).fetchone()
+    if row:
+        claimed = conn.execute('''
+            UPDATE upload_imports SET status = 'running', owner = ?, error = NULL, updated_at = ?
+            WHERE id = ? AND (status = 'failed' OR owner = ? OR updated_at < ?)
+        ''', (owner, now, row[0], owner, stale)).rowcount
+        conn.commit()
+        if not claimed:
+            raise ImportInProgress(f'This file is already being imported (import {row[0]}); '
+                                   'wait for it to finish or fail before uploading it again.')
+        return row
+    c = conn.execute('''
+        INSERT INTO upload_imports (filename, file_hash, chunk_rows, status, owner, started, updated_at)
+        VALUES (?, ?, ?, 'running', ?, ?, ?)
+    ''', (filename, digest, chunk_rows, owner, now, now))
+    conn.commit()
+    return c.lastrowid, 0
+
+
+IMPORT_FIELDS = ['id', 'filename', 'status', 'chunks_done', 'rows_done', 'inserted', 'updated',
+                 'price_changes', 'error', 'started', 'updated_at']
+
+
+def import_status(conn, import_id):
+    row = conn.execute(f'SELECT {", ".join(IMPORT_FIELDS)} FROM upload_imports WHERE id = ?',
+                       (import_id,)).fetchone()
+    return dict(zip(IMPORT_FIELDS, row)) if row else None
+
+
+def import_file(conn, path, filename=None, chunk_rows=None, progress=None, owner=None):
+    """
+    Stream a .csv/.xlsx file into items chunk by chunk. `progress`, if given,
+    is called with the import_status() dict after every committed chunk.
+    `owner` identifies this upload to start_import (a retry passes the same).
+    Raises UploadError for a file without the required columns, and
+    ImportInProgress while another upload is importing the same file.
+    Returns the final import_status() dict plus 'resumed_from_chunk',
+    'seconds' and 'rows_per_second' (for the rows applied by this call).
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    start = time.perf_counter()
+    import_id, skip = start_import(conn, filename or os.path.basename(path), file_hash(path), chunk_rows, owner)
+    applied_rows = 0
+
+    try:
+        for number, chunk in enumerate(iter_chunks(path, chunk_rows)):
+            if number == 0 and missing_columns(chunk):
+                raise UploadError(f'Missing required columns. Required: {REQUIRED_COLUMNS}')
+            if number < skip:
+                continue
+
+            rows = prepare_rows(chunk)
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                stage_rows(conn, rows)
+                inserted, updated, price_changes = apply_staged(conn, now)
+                conn.execute('''
+                    UPDATE upload_imports
+                    SET chunks_done = ?, rows_done = rows_done + ?, inserted = inserted + ?,
+                        updated = updated + ?, price_changes = price_changes + ?, updated_at = ?
+                    WHERE id = ?
+                ''', (number + 1, len(rows), inserted, updated, price_changes, now, import_id))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied_rows += len(rows)
+            if progress:
+                progress(import_status(conn, import_id))
+    except BaseException as e:
+        conn.execute("UPDATE upload_imports SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                     (str(e) or type(e).__name__, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), import_id))
+        conn.commit()
+        raise
+
+    conn.execute("UPDATE upload_imports SET status = 'done', updated_at = ? WHERE id = ?",
+                 (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), import_id))
+    conn.commit()
+
+    seconds = time.perf_counter() - start
+    result = import_status(conn, import_id)
+    result.update({
+        'resumed_from_chunk': skip,
+        'seconds': seconds,
+        'rows_per_second': applied_rows / seconds if seconds else 0,
+    })
+    return result
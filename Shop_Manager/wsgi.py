@@ -0,0 +1,27 @@
+import os
+
+import db
+from app import create_app
+
+# ------------------ PRODUCTION ENTRY POINT ------------------
+# gunicorn (Linux/macOS):  gunicorn -c gunicorn.conf.py wsgi:app
+# waitress (any OS):       python wsgi.py
+# Each server process builds its own app here: its own connection pool,
+# activity-log writer and job threads. Schema setup runs under the
+# migration startup lock (see migrations.py), so workers starting together
+# against one shop.db do not race each other.
+HOST = os.environ.get('SHOP_WEB_HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '8000'))
+THREADS = int(os.environ.get('SHOP_WEB_THREADS', '8'))
+
+# One warm pooled connection per server thread (waitress, or each gunicorn
+# worker: gunicorn.conf.py reads the same SHOP_WEB_THREADS). Sized before
+# create_app() opens the process's first connection.
+db.fit_pool(THREADS)
+
+app = create_app()
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    serve(app, host=HOST, port=PORT, threads=THREADS)